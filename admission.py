@@ -0,0 +1,236 @@
+"""Admission control for model requests: token buckets and a bounded priority queue.
+
+Every model call is admitted against two token buckets, measured in
+estimated tokens (prompt plus maximum output):
+
+* a per-session bucket, so one session generating in a loop cannot use up
+  the quota. A session without tokens is denied right away;
+* a global bucket for the whole deployment. When it is empty, requests wait
+  in a bounded priority queue (interactive before batch before background)
+  for up to ``max_wait`` seconds.
+
+A denied request is not an error: the generator answers it from the
+response cache or with the local fallback. Bucket levels live in
+``MemoryBuckets`` for one process, or in ``SQLiteBuckets`` shared by every
+worker process on the host; the waiting queue is per process.
+"""
+import contextvars
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import ADMISSIONS, QUEUE_SECONDS
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+GLOBAL = "global"
+
+_request = contextvars.ContextVar("admission_request", default=(None, INTERACTIVE))
+
+
+@contextmanager
+def request_scope(session: str = None, priority: int = INTERACTIVE):
+    """Attribute model calls made inside the block to ``session`` at ``priority``."""
+    token = _request.set((session, priority))
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def current_request() -> tuple:
+    """``(session, priority)`` of the request being handled on this thread."""
+    return _request.get()
+
+
+def _refill(level: float, updated: float, now: float, rate: float, capacity: float) -> float:
+    return min(capacity, level + (now - updated) * rate)
+
+
+def _wait(levels: list, specs: list) -> float:
+    """Seconds until every bucket holds its amount; 0 if they all do now."""
+    return max(((amount - level) / rate if rate > 0 else float("inf")
+                for level, (_, amount, rate, _) in zip(levels, specs) if level < amount), default=0.0)
+
+
+class MemoryBuckets:
+    """Bucket levels in this process: name -> (level, updated)."""
+
+    def __init__(self):
+        self._levels = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, specs: list, dry_run: bool = False) -> float:
+        """Take ``amount`` from every ``(name, amount, rate, capacity)`` bucket at once, or from none.
+
+        Returns 0 when taken, otherwise the seconds until all would have enough.
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = [_refill(*self._levels.get(name, (capacity, now)), now, rate, capacity)
+                      for name, _, rate, capacity in specs]
+            wait = _wait(levels, specs)
+            if wait == 0 and not dry_run:
+                for (name, amount, _, _), level in zip(specs, levels):
+                    self._levels[name] = (level - amount, now)
+            return wait
+
+    def prune(self, idle_seconds: float) -> int:
+        cutoff = time.monotonic() - idle_seconds
+        with self._lock:
+            idle = [name for name, (_, updated) in self._levels.items() if updated < cutoff and name != GLOBAL]
+            for name in idle:
+                del self._levels[name]
+        return len(idle)
+
+
+class SQLiteBuckets:
+    """Bucket levels in a SQLite file, so every worker process draws from the same buckets."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def acquire(self, specs: list, dry_run: bool = False) -> float:
+        # Wall-clock time, since monotonic clocks are not comparable between processes
+        now = time.time()
+        names = [name for name, _, _, _ in specs]
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so the read-modify-write is atomic across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = dict((name, (level, updated)) for name, level, updated in self._conn.execute(
+                    f"SELECT name, level, updated FROM buckets WHERE name IN ({','.join('?' * len(names))})", names))
+                levels = [_refill(*rows.get(name, (capacity, now)), now, rate, capacity)
+                          for name, _, rate, capacity in specs]
+                wait = _wait(levels, specs)
+                if wait == 0 and not dry_run:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO buckets (name, level, updated) VALUES (?, ?, ?)",
+                        [(name, level - amount, now) for (name, amount, _, _), level in zip(specs, levels)])
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return wait
+
+    def prune(self, idle_seconds: float) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM buckets WHERE updated < ? AND name != ?",
+                                      (time.time() - idle_seconds, GLOBAL)).rowcount
+
+
+class AdmissionController:
+    def __init__(self, buckets=None, global_rate: float = 250000 / 60, global_capacity: float = 250000,
+                 session_rate: float = 20000 / 60, session_capacity: float = 20000, max_queue: int = 32,
+                 max_wait: float = 10.0):
+        """Rates are tokens per second; capacities are the largest burst in tokens."""
+        self.buckets = buckets if buckets is not None else MemoryBuckets()
+        self.global_rate = global_rate
+        self.global_capacity = global_capacity
+        self.session_rate = session_rate
+        self.session_capacity = session_capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.stats = {"admitted": 0, "queued": 0, "denied_session": 0, "denied_queue_full": 0,
+                      "denied_timeout": 0}
+        self._queue = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._admissions = 0
+
+    def _specs(self, tokens: float, session: str) -> list:
+        # A request larger than a whole bucket is admitted once the bucket is full
+        specs = [(GLOBAL, min(tokens, self.global_capacity), self.global_rate, self.global_capacity)]
+        if session is not None:
+            specs.append((f"session:{session}", min(tokens, self.session_capacity), self.session_rate,
+                          self.session_capacity))
+        return specs
+
+    def admit(self, tokens: float, session: str = None, priority: int = INTERACTIVE):
+        """Admit a request of ``tokens`` estimated tokens: None if admitted, else the reason it was denied."""
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        specs = self._specs(tokens, session)
+        if session is not None and self.buckets.acquire(specs[1:], dry_run=True) > 0:
+            return self._deny("session", name)
+
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                return self._deny("queue_full", name)
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._queue, ticket)
+        try:
+            queued = False
+            while True:
+                with self._cond:
+                    while self._queue[0] != ticket:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return self._deny("timeout", name)
+                        if not queued:
+                            queued = True
+                            self.stats["queued"] += 1
+                        self._cond.wait(remaining)
+                # At the head of the queue; the buckets (a SQLite file, possibly) are read without the
+                # condition lock, so requests joining or leaving the queue are not held up meanwhile
+                wait = self.buckets.acquire(specs)
+                if wait == 0:
+                    break
+                if session is not None and self.buckets.acquire(specs[1:], dry_run=True) > 0:
+                    # Another request from this session took its tokens while this one waited
+                    return self._deny("session", name)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return self._deny("timeout", name)
+                with self._cond:
+                    if not queued:
+                        queued = True
+                        self.stats["queued"] += 1
+                    # Other processes draw from the same buckets, so re-check at least every 50 ms
+                    self._cond.wait(min(remaining, wait, 0.05))
+        finally:
+            with self._cond:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+        with self._cond:
+            self.stats["admitted"] += 1
+            self._admissions += 1
+            prune = self._admissions % 1000 == 0
+        QUEUE_SECONDS.observe(time.monotonic() - started, priority=name)
+        ADMISSIONS.inc(result="admitted", priority=name)
+        if prune:
+            # Forget sessions whose buckets have long since refilled
+            self.buckets.prune(max(3600.0, self.session_capacity / self.session_rate if self.session_rate else 0))
+        return None
+
+    def _deny(self, reason: str, priority: str) -> str:
+        with self._cond:
+            self.stats["denied_" + reason] += 1
+        ADMISSIONS.inc(result="denied_" + reason, priority=priority)
+        return reason
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def summary(self) -> dict:
+        return {**self.stats, "queue_depth": self.queue_depth()}
+
+
+def create_buckets(kind: str = "sqlite", path: str = "admission.sqlite3"):
+    if kind == "sqlite":
+        return SQLiteBuckets(path)
+    if kind == "memory":
+        return MemoryBuckets()
+    raise ValueError(f"Unknown admission store: {kind}")
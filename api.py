@@ -0,0 +1,142 @@
+"""Headless JSON HTTP API for the generator.
+
+Endpoints:
+
+* ``POST /generate`` - body ``{"text": "...", "settings": {...}}``; settings
+  are optional and use the names of ``GenerationSettings`` (mode, tone,
+  length, num_quotes, model, creativity, personalization_strength). The
+  ``X-Session-Id`` header (default: the client address) picks the token
+  bucket that admission control charges.
+* ``POST /generate/batch`` - body ``{"items": [<generate body>, ...]}``;
+  items run concurrently and each gets its own result or error. Every item
+  is charged to the same session bucket as a single request.
+* ``GET /healthz`` - liveness; ``GET /readyz`` - 503 until a generator is
+  configured and while the upstream circuit breaker is open.
+* ``GET /metrics`` - stage latencies and counters in the Prometheus text
+  format (per worker process).
+
+Serve it with a production worker pool, e.g.:
+
+    gunicorn --workers 4 --threads 8 --bind 0.0.0.0:8000 "api:create_app()"
+
+Each worker process builds one ``Generator``, so connections to the model
+backend are reused across requests.
+"""
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+from flask import Flask, Response, jsonify, request
+from flask_cors import CORS
+
+from generation import GenerationError, GenerationSettings, Generator
+from metrics import CONTENT_TYPE, REGISTRY
+
+MAX_TEXT_LENGTH = int(os.getenv("API_MAX_TEXT_LENGTH", "5000"))
+MAX_BATCH_SIZE = int(os.getenv("API_MAX_BATCH_SIZE", "50"))
+
+
+def parse_item(item) -> tuple:
+    """Validate one request body and return ``(text, settings)``; raises ValueError."""
+    if not isinstance(item, dict):
+        raise ValueError("Request body must be a JSON object")
+    text = item.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text is required")
+    if len(text) > MAX_TEXT_LENGTH:
+        raise ValueError(f"text must be at most {MAX_TEXT_LENGTH} characters")
+    settings = item.get("settings") or {}
+    if not isinstance(settings, dict):
+        raise ValueError("settings must be an object")
+    return text, GenerationSettings.from_dict(settings)
+
+
+def create_app(generator: Generator = None) -> Flask:
+    load_dotenv()
+    app = Flask(__name__)
+    CORS(app)
+
+    lock = threading.Lock()
+    state = {"generator": generator}
+
+    def get_generator() -> Generator:
+        # Built lazily, once per worker process, after the server has forked
+        with lock:
+            if state["generator"] is None:
+                state["generator"] = Generator.from_env()
+            return state["generator"]
+
+    def session() -> str:
+        # Admission control budgets tokens per client
+        return request.headers.get("X-Session-Id") or request.remote_addr
+
+    def error(status: int, message: str):
+        return jsonify({"error": message}), status
+
+    @app.post("/generate")
+    def generate():
+        started = time.perf_counter()
+        try:
+            text, settings = parse_item(request.get_json(silent=True))
+        except ValueError as e:
+            return error(400, str(e))
+        try:
+            gen = get_generator()
+        except GenerationError as e:
+            return error(503, str(e))
+        try:
+            result = gen.generate(text, settings, session=session())
+        except GenerationError as e:
+            return error(502, str(e))
+        return jsonify({"result": result, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    @app.post("/generate/batch")
+    def generate_batch():
+        started = time.perf_counter()
+        body = request.get_json(silent=True) or {}
+        items = body.get("items") if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            return error(400, "items must be a non-empty list")
+        if len(items) > MAX_BATCH_SIZE:
+            return error(400, f"at most {MAX_BATCH_SIZE} items per batch")
+
+        results = [None] * len(items)
+        valid = []
+        for i, item in enumerate(items):
+            try:
+                valid.append((i, parse_item(item)))
+            except ValueError as e:
+                results[i] = {"error": str(e)}
+        try:
+            generated = get_generator().generate_many([parsed for _, parsed in valid], session=session())
+        except GenerationError as e:
+            return error(503, str(e))
+        for (i, _), outcome in zip(valid, generated):
+            results[i] = {"error": str(outcome)} if isinstance(outcome, Exception) else {"result": outcome}
+        return jsonify({"results": results, "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    @app.get("/healthz")
+    def healthz():
+        return jsonify({"status": "ok"})
+
+    @app.get("/readyz")
+    def readyz():
+        try:
+            ready = get_generator().ready()
+        except GenerationError as e:
+            return error(503, str(e))
+        if not ready:
+            return error(503, "upstream circuit breaker is open")
+        return jsonify({"status": "ready"})
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype=None, content_type=CONTENT_TYPE)
+
+    return app
+
+
+if __name__ == "__main__":
+    # Development server only; use gunicorn (see module docstring) in production
+    create_app().run(host="0.0.0.0", port=int(os.getenv("PORT", "8000")), threaded=True)
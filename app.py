@@ -1,19 +1,29 @@
-import os, json, re
-from string import Template
-import random
-from datetime import datetime
-import hashlib
+import time
+_rerun_started = time.perf_counter()
+
+import logging
+import os
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+import uuid
+from datetime import date
 
 import streamlit as st
-import streamlit.components.v1 as components
-from dotenv import load_dotenv
 
-# Google Gen AI SDK (Gemini)
-from google import genai
-from google.genai import types
+from digest import latest_digest
+from emotion import analyze_user_emotion
+from generation import (LENGTHS, MODELS, MODES, TONES, GenerationCancelled, GenerationError, GenerationSettings,
+                        Generator, genai_sdk, load_asset)
+from history import ResponseHistory
+from jobs import Job
+from metrics import counter_summary, latency_summary, recent_traces, span, start_http_server
+from rendering import render_sections, result_hash, speech, speech_payload
 
 # -------------------- Setup --------------------
-load_dotenv()
+# The Gemini SDK, dotenv and the components module are imported on first use
+# rather than above, so the first page renders before the model client exists.
+_imports_seconds = time.perf_counter() - _rerun_started
+logger = logging.getLogger(__name__)
+
 st.set_page_config(
     page_title="✨ AI Motivator & Quote Generator", 
     page_icon="✨", 
@@ -21,58 +31,75 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Everything below that is decorated with st.cache_resource is built once per
+# process and reused by every rerun and session, instead of being rebuilt on
+# each widget interaction.
+@st.cache_resource(show_spinner=False)
+def load_environment() -> float:
+    """Load .env once per process and remember when the process started serving."""
+    from dotenv import load_dotenv
+    load_dotenv()
+    return time.time()
+
+@st.cache_resource(show_spinner=False)
+def startup_report() -> dict:
+    """Cold-start timings for this process, filled in by the first rerun and the pre-warm."""
+    return {}
+
+@st.cache_resource(show_spinner=False)
+def prewarm(api_key: str) -> Future:
+    """Build the generation core in a background thread, once per process.
+
+    Called after the first page has rendered, so importing the SDK and
+    constructing the client never delay first paint. The generator is shared
+    across reruns and sessions so its client, caches and pools are reused.
+    """
+    report = startup_report()
+
+    def build() -> Generator:
+        started = time.perf_counter()
+        genai_sdk()
+        report["sdk_import_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        started = time.perf_counter()
+        generator = Generator.from_env(api_key)
+        report["client_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("startup: %s", report)
+        return generator
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prewarm")
+    future = executor.submit(build)
+    executor.shutdown(wait=False)
+    return future
+
+def get_generator() -> Generator:
+    """The shared generator, waiting for the pre-warm if it is still running."""
+    future = prewarm(_api_key)
+    if future.done() and future.exception() is not None:
+        # Retry on the next call instead of keeping the failure for the life of the process
+        prewarm.clear()
+    return future.result()
+
+@st.cache_resource(show_spinner=False)
+def get_job_pool() -> ThreadPoolExecutor:
+    """Runs every session's generation jobs, so reruns never wait on the model."""
+    return ThreadPoolExecutor(max_workers=int(os.getenv("JOB_WORKERS", "16")), thread_name_prefix="generation-job")
+
+@st.cache_resource(show_spinner=False, ttl=600)
+def get_digest(day: str):
+    """The daily digest (see digest.py) for ``day``; re-checked every 10 minutes in case it was still being built."""
+    return latest_digest(date.fromisoformat(day))
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server(port: int):
+    """Prometheus scrape endpoint for this process, started once."""
+    return start_http_server(port)
+
+_process_started = load_environment()
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
+
 # Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        text-align: center;
-        background: linear-gradient(90deg, #667eea 0%, #764ba2 100%);
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        margin-bottom: 2rem;
-    }
-    .motivation-box {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        color: white;
-        margin: 1rem 0;
-    }
-    .quote-box {
-        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        padding: 1.5rem;
-        border-radius: 10px;
-        color: white;
-        margin: 0.5rem 0;
-    }
-    .step-box {
-        background: rgba(255, 255, 255, 0.1);
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 0.5rem 0;
-        border-left: 4px solid #fff;
-    }
-    .mantra-box {
-        background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        padding: 1.5rem;
-        border-radius: 10px;
-        text-align: center;
-        font-size: 1.2rem;
-        font-weight: bold;
-        color: white;
-        margin: 1rem 0;
-    }
-    .reflection-box {
-        background: linear-gradient(135deg, #a8edea 0%, #fed6e3 100%);
-        padding: 1.5rem;
-        border-radius: 10px;
-        color: #333;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(load_asset("style.css"), unsafe_allow_html=True)
 
 st.markdown('<h1 class="main-header">✨ AI Personal Motivator & Quote Generator</h1>', unsafe_allow_html=True)
 
@@ -81,62 +108,7 @@ if not _api_key:
     st.error("⚠ No GEMINI_API_KEY found. Please add it to your .env file and restart the app.")
     st.stop()
 
-client = genai.Client(api_key=_api_key)
-DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-
-# Enhanced system prompt with stronger personalization instructions
-SYSTEM_PROMPT = """
-You are a caring friend and motivational coach with a deep understanding of human emotions. The user will share something with you - analyze their EXACT words, tone, and emotional state.
-
-CRITICAL RULES FOR PERSONALIZATION:
-1. NEVER use generic templates or standard responses
-2. Reference their SPECIFIC words and situation in your response
-3. Match their emotional energy level (calm for sad, energetic for excited, etc.)
-4. Use their exact language style and vocabulary level
-5. Address their SPECIFIC concerns, not general ones
-6. Create responses that feel like you know them personally
-
-EMOTIONAL ANALYSIS REQUIRED:
-- Identify their primary emotion (sad, excited, anxious, angry, confused, etc.)
-- Determine their energy level (high, medium, low)
-- Note any specific triggers or situations they mention
-- Assess what type of support they need (comfort, celebration, guidance, etc.)
-
-PERSONALIZATION CHECKLIST:
-✓ Reference specific words/phrases they used
-✓ Mirror their communication style  
-✓ Address their exact situation
-✓ Match their emotional tone
-✓ Provide situation-specific advice
-✓ Use relevant metaphors for their context
-✓ Give actionable steps for THEIR specific challenge
-
-You MUST return a single valid JSON object ONLY (no backticks, markdown, or extra text).
-
-Two output shapes:
-
-1) For mode="message":
-{
-  "type": "message",
-  "motivation": "<Write a deeply personalized response that directly quotes or references their specific words. Mirror their tone - if they're excited, be excited with them. If they're sad, be gentle and comforting. Make them feel truly seen and understood.>",
-  "steps": ["<Give them 4 specific, actionable steps that directly address their EXACT situation and challenges>"],
-  "mantra": "<Create a mantra using words or themes from their message - make it personal to their situation>",
-  "quotes": [{"quote":"<Choose quotes that directly relate to their specific emotion and situation>", "author":"<author>", "context":"<Explain why THIS quote is perfect for THEIR specific situation>"}, ...],
-  "reflection_questions": ["<Ask questions that dig into their specific situation and help them process their exact feelings>"],
-  "daily_affirmation": "<Create an affirmation that directly addresses their situation and uses language that resonates with their message>"
-}
-
-2) For mode="quote":
-{
-  "type": "quote",
-  "quotes": [{"quote":"<Select quotes that match their emotional state and specific situation>", "author":"<author>", "context":"<Why this quote speaks to their exact circumstances>", "category":"<category that fits their need>"}, ...],
-  "reflection": "<Write about how these quotes specifically relate to what they shared - use their words and reference their situation>",
-  "theme": "<Identify a theme that emerges from THEIR specific message>",
-  "application": "<Give specific ways they can apply these quotes to their exact situation>"
-}
-
-REMEMBER: Every word should feel like it was written specifically for this person's unique situation. NO GENERIC ADVICE ALLOWED.
-"""
+_setup_seconds = time.perf_counter() - _rerun_started
 
 # -------------------- UI Controls --------------------
 with st.sidebar:
@@ -144,21 +116,21 @@ with st.sidebar:
     
     model = st.selectbox(
         "AI Model", 
-        ["gemini-2.5-flash", "gemini-1.5-flash", "gemini-1.5-pro"], 
+        MODELS, 
         index=0,
-        help="Choose the AI model for generation"
+        help="Choose the AI model for generation; auto picks one per request to keep responses fast"
     )
     
     tone = st.selectbox(
         "Tone & Style", 
-        ["adaptive", "inspiring", "empathetic", "energetic", "calm", "practical", "philosophical"], 
+        TONES, 
         index=0,
         help="Adaptive automatically matches the user's emotional state"
     )
     
     length = st.select_slider(
         "Response Length",
-        options=["concise", "detailed", "comprehensive", "extensive"],
+        options=LENGTHS,
         value="detailed",
         help="Controls the depth and length of responses"
     )
@@ -171,6 +143,7 @@ with st.sidebar:
     include_reflection_questions = st.checkbox("Include reflection questions", value=True)
     include_daily_affirmation = st.checkbox("Include daily affirmation", value=True)
     auto_speak = st.checkbox("Auto-speak responses", value=False)
+    stream_responses = st.checkbox("Stream responses as they are written", value=True)
     
     st.header("📊 Response Quality")
     creativity = st.slider("Creativity Level", 0.1, 1.0, 0.9, 0.1, help="Higher values create more unique responses")
@@ -188,7 +161,7 @@ col1, col2 = st.columns([2, 1])
 with col1:
     mode = st.radio(
         "Choose your experience:",
-        ["message", "quote", "both"],
+        MODES,
         horizontal=True,
         help="Message: Detailed motivation with steps. Quote: Curated quotes with reflection. Both: Complete experience."
     )
@@ -203,433 +176,248 @@ with col1:
 
 with col2:
     st.info("💡 **Tips for better responses:**\n\n• Be specific about your situation\n• Share your emotions honestly\n• Mention what you're struggling with\n• Include context about your goals")
+    todays = st.button("🌅 Today's inspiration", use_container_width=True,
+                       help="A daily inspiration written ahead of time for how you feel; shown instantly")
     
 
 if "result" not in st.session_state:
     st.session_state.result = {}
 
-if "response_history" not in st.session_state:
-    st.session_state.response_history = {}
-
-# -------------------- Enhanced Prompt Building --------------------
-def create_context_hash(user_text: str) -> str:
-    """Create a unique hash based on user input to track response uniqueness"""
-    return hashlib.md5(user_text.lower().strip().encode()).hexdigest()[:8]
+if "session_id" not in st.session_state:
+    # Admission control gives each browser session its own token budget
+    st.session_state.session_id = uuid.uuid4().hex
 
-def analyze_user_emotion(user_text: str) -> dict:
-    """Analyze user's emotional state and context"""
-    text = user_text.lower().strip()
-    
-    emotion_indicators = {
-        'excited': ['excited', 'thrilled', 'amazing', 'fantastic', 'awesome', 'great news', 'celebration', 'happy', 'joy'],
-        'sad': ['sad', 'depressed', 'down', 'crying', 'hurt', 'heartbroken', 'devastated', 'miserable'],
-        'anxious': ['anxious', 'worried', 'nervous', 'stress', 'fear', 'panic', 'overwhelmed', 'scared'],
-        'angry': ['angry', 'frustrated', 'mad', 'upset', 'annoyed', 'furious', 'irritated'],
-        'confused': ['confused', 'lost', 'unsure', 'doubt', 'uncertain', 'don\'t know', 'unclear'],
-        'tired': ['tired', 'exhausted', 'burnout', 'drained', 'worn out'],
-        'hopeful': ['hopeful', 'optimistic', 'looking forward', 'positive', 'motivated'],
-        'grateful': ['grateful', 'thankful', 'blessed', 'appreciate', 'lucky']
-    }
-    
-    detected_emotions = []
-    for emotion, indicators in emotion_indicators.items():
-        if any(indicator in text for indicator in indicators):
-            detected_emotions.append(emotion)
-    
-    # Determine primary emotion
-    primary_emotion = detected_emotions[0] if detected_emotions else 'neutral'
-    
-    # Determine energy level
-    high_energy_words = ['excited', 'thrilled', 'amazing', 'fantastic', 'angry', 'furious', 'panic']
-    low_energy_words = ['tired', 'exhausted', 'sad', 'down', 'drained']
-    
-    if any(word in text for word in high_energy_words):
-        energy_level = 'high'
-    elif any(word in text for word in low_energy_words):
-        energy_level = 'low'
-    else:
-        energy_level = 'medium'
-    
-    # Extract key themes
-    themes = []
-    if any(word in text for word in ['work', 'job', 'career', 'boss', 'colleague']):
-        themes.append('work')
-    if any(word in text for word in ['relationship', 'partner', 'family', 'friend']):
-        themes.append('relationships')
-    if any(word in text for word in ['health', 'sick', 'medical', 'doctor']):
-        themes.append('health')
-    if any(word in text for word in ['money', 'financial', 'debt', 'expensive']):
-        themes.append('finances')
-    if any(word in text for word in ['school', 'study', 'exam', 'college', 'university']):
-        themes.append('education')
-    
-    return {
-        'primary_emotion': primary_emotion,
-        'all_emotions': detected_emotions,
-        'energy_level': energy_level,
-        'themes': themes,
-        'text_length': len(user_text),
-        'is_greeting': len(text) < 20 and any(greeting in text for greeting in ['hi', 'hello', 'hey', 'good morning', 'good afternoon'])
-    }
-
-def build_instruction(user_text: str) -> str:
-    requested_mode = "message" if mode in ("message", "both") else "quote"
-    
-    # Analyze user's emotional context
-    emotion_analysis = analyze_user_emotion(user_text)
-    
-    # Create unique context hash
-    context_hash = create_context_hash(user_text)
-    
-    # Add randomization seed
-    random_seed = random.randint(1000, 9999)
-    
-    # Build highly personalized context
-    personalization_context = f"""
-UNIQUE RESPONSE ID: {context_hash}-{random_seed}
-USER'S EXACT WORDS: "{user_text}"
-EMOTIONAL ANALYSIS:
-- Primary emotion: {emotion_analysis['primary_emotion']}
-- Energy level: {emotion_analysis['energy_level']}
-- Key themes: {', '.join(emotion_analysis['themes']) if emotion_analysis['themes'] else 'general'}
-- Message type: {'greeting' if emotion_analysis['is_greeting'] else 'substantive'}
-
-PERSONALIZATION REQUIREMENTS:
-1. Quote or reference their EXACT words: "{user_text[:50]}{'...' if len(user_text) > 50 else ''}"
-2. Match their emotional energy ({emotion_analysis['energy_level']})
-3. Address their primary emotion ({emotion_analysis['primary_emotion']})
-4. Focus on themes: {emotion_analysis['themes']}
-5. Personalization level: {personalization_strength}/5
-
-RESPONSE STYLE ADAPTATION:
-- Tone: {tone if tone != 'adaptive' else f"match their {emotion_analysis['primary_emotion']} energy"}
-- Length: {length}
-- Creativity boost: {creativity}
-
-CRITICAL: This response must be COMPLETELY DIFFERENT from any previous response. Use their specific situation, words, and emotional state to create something unique.
-"""
-
-    return (
-        SYSTEM_PROMPT.strip()
-        + "\n\n"
-        + personalization_context
-        + f"\nMODE: {requested_mode}\n"
-        + f"NUMBER OF QUOTES: {num_quotes}\n"
-        + "\n"
-        + "Create a response that feels like you're their close friend who truly understands their specific situation. NO GENERIC RESPONSES ALLOWED."
-    )
-
-def parse_loose_json(s: str):
-    """Enhanced JSON parsing with better error handling."""
-    if not s:
-        return None
-    try:
-        return json.loads(s)
-    except Exception:
-        pass
-    
-    # Try to extract JSON from markdown code blocks
-    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', s, re.DOTALL)
-    if json_match:
-        try:
-            return json.loads(json_match.group(1))
-        except Exception:
-            pass
-    
-    # Try to find the largest JSON object
-    start = s.find("{")
-    end = s.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        try:
-            return json.loads(s[start:end+1])
-        except Exception:
-            pass
-    return None
-
-def call_gemini(user_text: str):
-    requested_mode = "message" if mode in ("message", "both") else "quote"
-    
-    # Enhanced temperature calculation for more variety
-    base_temp = max(0.8, creativity)
-    
-    # Add randomization based on content
-    content_hash = hash(user_text) % 100
-    temp_variance = (content_hash / 100) * 0.2  # 0.0 to 0.2 variance
-    
-    emotion_analysis = analyze_user_emotion(user_text)
-    
-    # Adjust temperature based on emotional context
-    if emotion_analysis['primary_emotion'] in ['excited', 'happy']:
-        temp = min(1.0, base_temp + 0.1 + temp_variance)
-    elif emotion_analysis['primary_emotion'] in ['sad', 'anxious']:
-        temp = max(0.7, base_temp - 0.1 + temp_variance)
-    else:
-        temp = base_temp + temp_variance
-    
-    prompt = build_instruction(user_text)
-    
-    # Enhanced generation config
-    cfg = types.GenerateContentConfig(
-        temperature=temp,
-        max_output_tokens=2500,
-        candidate_count=1,
-        top_p=0.95,
-        top_k=40,  # Add top_k for more variety
+if "response_history" not in st.session_state:
+    st.session_state.response_history = ResponseHistory(
+        per_key=int(os.getenv("HISTORY_PER_INPUT", "5")),
+        byte_budget=int(os.getenv("HISTORY_BYTE_BUDGET", str(64 * 1024))),
     )
 
-    try:
-        resp = client.models.generate_content(
-            model=model,
-            contents=prompt,
-            config=cfg,
-        )
-
-        raw = (getattr(resp, "text", None) or "").strip()
-        data = parse_loose_json(raw)
-
-        # Store response to avoid repetition
-        context_hash = create_context_hash(user_text)
-        if context_hash not in st.session_state.response_history:
-            st.session_state.response_history[context_hash] = []
-        st.session_state.response_history[context_hash].append(data)
-
-        if not data:
-            # Create truly personalized fallback based on user's actual input
-            emotion_analysis = analyze_user_emotion(user_text)
-            
-            if requested_mode == "message":
-                # Personalized fallback based on their input
-                motivation_text = f"I hear you when you say '{user_text[:100]}{'...' if len(user_text) > 100 else ''}'. "
-                
-                if emotion_analysis['primary_emotion'] == 'excited':
-                    motivation_text += "Your excitement is contagious! This energy you're feeling is powerful - it's the fuel of achievement."
-                elif emotion_analysis['primary_emotion'] == 'sad':
-                    motivation_text += "I can feel the heaviness in your words, and I want you to know that it's okay to feel this way."
-                elif emotion_analysis['primary_emotion'] == 'anxious':
-                    motivation_text += "I understand that anxiety can feel overwhelming, but you're stronger than you realize."
-                elif emotion_analysis['is_greeting']:
-                    motivation_text = "Hello there! I'm so glad you reached out today. How are you really feeling right now?"
-                else:
-                    motivation_text += "Your situation is unique, and you deserve support that truly understands what you're going through."
-                
-                data = {
-                    "type": "message",
-                    "motivation": motivation_text,
-                    "steps": [
-                        f"Reflect on what you just shared: '{user_text[:50]}{'...' if len(user_text) > 50 else ''}'",
-                        f"Focus on your {emotion_analysis['primary_emotion']} feelings and what they're telling you",
-                        "Take one small action that aligns with your current emotional state",
-                        "Practice self-compassion as you navigate this moment"
-                    ],
-                    "mantra": f"I honor my {emotion_analysis['primary_emotion']} feelings and trust my journey",
-                    "quotes": [
-                        {"quote": "The only way to do great work is to love what you do.", "author": "Steve Jobs", "context": f"This resonates with your {emotion_analysis['primary_emotion']} energy"},
-                        {"quote": "Success is not final, failure is not fatal: it is the courage to continue that counts.", "author": "Winston Churchill", "context": "Speaks to the resilience I see in your message"}
-                    ],
-                    "reflection_questions": [
-                        f"What does your {emotion_analysis['primary_emotion']} feeling tell you about what you need right now?",
-                        f"How can you honor the situation you described: '{user_text[:30]}{'...' if len(user_text) > 30 else ''}'?",
-                        "What would self-compassion look like in this moment?"
-                    ],
-                    "daily_affirmation": f"I trust my {emotion_analysis['primary_emotion']} feelings and my ability to navigate this situation"
-                }
-            else:
-                data = {
-                    "type": "quote",
-                    "quotes": [
-                        {"quote": "The future belongs to those who believe in the beauty of their dreams.", "author": "Eleanor Roosevelt", "context": f"This speaks to the {emotion_analysis['primary_emotion']} energy in your message", "category": "motivation"},
-                        {"quote": "It does not matter how slowly you go as long as you do not stop.", "author": "Confucius", "context": "Perfectly fits your current situation", "category": "wisdom"}
-                    ],
-                    "reflection": f"Your words '{user_text[:100]}{'...' if len(user_text) > 100 else ''}' reveal someone who is {emotion_analysis['primary_emotion']} and seeking guidance. These quotes speak directly to your emotional state.",
-                    "theme": f"Navigating {emotion_analysis['primary_emotion']} feelings with wisdom",
-                    "application": f"Use these quotes to guide you through your current {emotion_analysis['primary_emotion']} experience"
-                }
-        
-        return data
-        
-    except Exception as e:
-        st.error(f"Error calling AI: {str(e)}")
-        return None
+settings = GenerationSettings(
+    model=model,
+    mode=mode,
+    tone=tone,
+    length=length,
+    num_quotes=num_quotes,
+    creativity=creativity,
+    personalization_strength=personalization_strength,
+)
 
 # -------------------- Enhanced Rendering --------------------
-def render_message(data: dict):
-    st.markdown('<div class="motivation-box">', unsafe_allow_html=True)
-    st.markdown("### 💫 Your Personalized Motivation")
-    st.write(data.get("motivation", ""))
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    if include_steps and data.get("steps"):
-        st.markdown("### 🎯 Action Steps")
-        for i, step in enumerate(data["steps"], 1):
-            st.markdown(f'<div class="step-box"><strong>{i}.</strong> {step}</div>', unsafe_allow_html=True)
-
-    if data.get("mantra"):
-        st.markdown(f'<div class="mantra-box">🎭 Your Mantra: "{data["mantra"]}"</div>', unsafe_allow_html=True)
-
-    if data.get("daily_affirmation"):
-        st.markdown(f'<div class="mantra-box">✨ Daily Affirmation: "{data["daily_affirmation"]}"</div>', unsafe_allow_html=True)
-
-    if data.get("reflection_questions"):
-        st.markdown("### 🤔 Reflection Questions")
-        for i, question in enumerate(data["reflection_questions"], 1):
-            st.markdown(f"**{i}.** {question}")
-
-    if data.get("quotes"):
-        st.markdown("### 📚 Inspiring Quotes")
-        for q in data["quotes"]:
-            quote_text = f'"{q.get("quote", "")}" — *{q.get("author", "")}*'
-            if q.get("context"):
-                quote_text += f"\n💡 {q.get('context')}"
-            st.markdown(f'<div class="quote-box">{quote_text}</div>', unsafe_allow_html=True)
-
-def render_quotes(data: dict):
-    quotes = data.get("quotes", [])
-    if quotes:
-        st.markdown("### 📚 Curated Quotes for You")
-        for i, q in enumerate(quotes, 1):
-            quote_text = f'**{i}.** "{q.get("quote", "")}" — *{q.get("author", "")}*'
-            if q.get("context"):
-                quote_text += f"\n💡 {q.get('context')}"
-            if q.get("category"):
-                quote_text += f"\n🏷️ Category: {q.get('category')}"
-            st.markdown(f'<div class="quote-box">{quote_text}</div>', unsafe_allow_html=True)
-    
-    if data.get("theme"):
-        st.markdown(f"### 🎯 Theme: {data['theme']}")
-    
-    if data.get("reflection"):
-        st.markdown("### 💭 Deep Reflection")
-        st.markdown(f'<div class="reflection-box">{data["reflection"]}</div>', unsafe_allow_html=True)
-    
-    if data.get("application"):
-        st.markdown("### 🚀 How to Apply This Wisdom")
-        st.write(data["application"])
-
-def speak_and_copy_widget(text: str, title: str = "Response"):
-    if not text:
-        return
-    
-    escaped = json.dumps(text)
-    html = Template("""
-      <div style="background: rgba(255,255,255,0.1); padding: 1rem; border-radius: 10px; margin: 1rem 0;">
-        <h4 style="color: white; margin-bottom: 0.5rem;">🔊 $title</h4>
-        <div style="display:flex;gap:8px;align-items:center;flex-wrap:wrap;">
-          <button id="speakBtn" style="background: #4CAF50; color: white; border: none; padding: 8px 16px; border-radius: 5px; cursor: pointer;">🔊 Speak</button>
-          <button id="copyBtn" style="background: #2196F3; color: white; border: none; padding: 8px 16px; border-radius: 5px; cursor: pointer;">📋 Copy</button>
-          <button id="pauseBtn" style="background: #FF9800; color: white; border: none; padding: 8px 16px; border-radius: 5px; cursor: pointer;">⏸️ Pause</button>
-        </div>
-      </div>
-      <script>
-        const TEXT = $text;
-        const auto = $autospeak;
-        let speaking = false;
-        
-        function speak(t){
-          if (speaking) {
-            window.speechSynthesis.cancel();
-            speaking = false;
-            return;
-          }
-          window.speechSynthesis.cancel();
-          const u = new SpeechSynthesisUtterance(t);
-          u.rate = 0.9; u.pitch = 1; u.volume = 1;
-          u.onstart = () => { speaking = true; };
-          u.onend = () => { speaking = false; };
-          window.speechSynthesis.speak(u);
-        }
-        
-        function pause() {
-          window.speechSynthesis.pause();
-        }
-        
-        document.getElementById('speakBtn').onclick = () => speak(TEXT);
-        document.getElementById('copyBtn').onclick = () => {
-          navigator.clipboard.writeText(TEXT).then(()=>{
-            const b = document.getElementById('copyBtn');
-            b.textContent='✅ Copied!'; 
-            setTimeout(()=>b.textContent='📋 Copy', 2000);
-          });
-        };
-        document.getElementById('pauseBtn').onclick = () => pause();
-        
-        if (auto && TEXT.length>0){ 
-          setTimeout(() => speak(TEXT), 1000); 
-        }
-      </script>
-    """).substitute(text=escaped, autospeak=str(auto_speak).lower(), title=title)
-    components.html(html, height=120)
+# Results render into fixed slots below the inputs, so the speech component
+# keeps its place (and its iframe) from one rerun to the next.
+result_slot = st.container()
+speech_slot = st.empty()
+
+def render_result(data: dict, final: bool = True) -> str:
+    """Render a result with one markdown call per section; returns the kind rendered."""
+    kind = data.get("type") or mode
+    for section in render_sections(data, kind, include_steps, cache=final):
+        st.markdown(section, unsafe_allow_html=True)
+    return kind
+
+def speak_and_copy_widget(data: dict, kind: str):
+    import streamlit.components.v1 as components
+    title, text = speech(data, kind)
+    if text:
+        st.markdown(speech_payload(title, text, result_hash(data), auto_speak), unsafe_allow_html=True)
+    with speech_slot:
+        components.html(load_asset("tts.html"), height=120 if text else 0)
 
 # -------------------- Main Execution --------------------
+# Generation runs as a background job stored in the session; the fragment
+# below polls it, so widget interactions stay responsive while the model
+# writes and changing the inputs cancels the request in flight.
+job_key = (mood, settings)
+job = st.session_state.get("job")
+if job is not None and job.key != job_key and not go:
+    job.cancel()
+    st.session_state.job = job = None
+    st.session_state.job_notice = ("info", "Stopped the previous response because the inputs changed.")
+
 if go:
     if not mood.strip():
-        st.error("⚠ Please share your thoughts or feelings first.")
+        col1.error("⚠ Please share your thoughts or feelings first.")
     else:
-        with st.spinner("🤔 Crafting your personalized inspiration..."):
-            try:
-                data = call_gemini(mood)
-                if data:
-                    st.session_state.result = data
-                    st.success("✨ Your inspiration is ready!")
-                else:
-                    st.error("⚠ Unable to generate response. Please try again.")
-            except Exception as e:
-                st.error(f"⚠ Error: {e}")
+        if job is not None:
+            job.cancel()
+        history = st.session_state.response_history
+        session_id = st.session_state.session_id
+        st.session_state.job = job = Job(
+            get_job_pool(),
+            lambda on_update, cancel: get_generator().generate(
+                mood,
+                settings,
+                history=history,
+                on_update=on_update,
+                stream=stream_responses,
+                cancel=cancel,
+                session=session_id,
+            ),
+            key=job_key,
+        )
+
+if todays:
+    # Served from the pre-generated daily digest: no model call
+    digest = get_digest(date.today().isoformat())
+    data = digest.inspiration(mood, mode, seed=st.session_state.session_id) if digest else None
+    if data:
+        if job is not None:
+            job.cancel()
+            st.session_state.job = job = None
+        st.session_state.result = data
+    else:
+        st.session_state.job_notice = ("info", "Today's inspiration isn't ready yet. Generate a personalized one instead.")
+
+if job is not None and col1.button("✋ Cancel", help="Stop writing this response"):
+    job.cancel()
+    st.session_state.job = job = None
+    st.session_state.job_notice = ("info", "Request cancelled.")
+
+notice = st.session_state.pop("job_notice", None)
+if notice:
+    getattr(col1, notice[0])(notice[1])
+
+@st.fragment(run_every=float(os.getenv("JOB_POLL_SECONDS", "0.5")))
+def job_status():
+    job = st.session_state.get("job")
+    if job is None:
+        return
+    if not job.done:
+        st.caption(f"🤔 Crafting your personalized inspiration... ({job.elapsed:.0f}s)")
+        # Sections are filled in here as they stream or finish
+        if job.partial:
+            render_result(job.partial, final=False)
+        return
+    st.session_state.job = None
+    try:
+        data = job.result()
+        if data:
+            st.session_state.result = data
+            st.session_state.job_notice = ("success", "✨ Your inspiration is ready!")
+        else:
+            st.session_state.job_notice = ("error", "⚠ Unable to generate response. Please try again.")
+    except (CancelledError, GenerationCancelled):
+        pass
+    except GenerationError as e:
+        st.session_state.job_notice = ("error", f"Error calling AI: {str(e)}")
+    except Exception as e:
+        st.session_state.job_notice = ("error", f"⚠ Error: {e}")
+    # Render the result with the full page, which also stops this fragment's timer
+    st.rerun()
 
 res = st.session_state.get("result", {})
 
-if res:
-    t = res.get("type")
-    
-    if mode == "message":
-        render_message(res)
-        full_text = res.get("motivation", "") + " " + res.get("mantra", "") + " " + res.get("daily_affirmation", "")
-        speak_and_copy_widget(full_text, "Motivational Message")
-        
-    elif mode == "quote":
-        render_quotes(res)
-        # Speak first quote + reflection
-        first_q = ""
-        if res.get("quotes"):
-            q0 = res["quotes"][0]
-            first_q = f"{q0.get('quote','')} — {q0.get('author','')}"
-        speak_and_copy_widget(first_q + " " + res.get("reflection",""), "Quote Collection")
-        
-    else:  # both
-        render_message(res)
-        if res.get("quotes"):
-            st.markdown("---")
-            render_quotes(res)
-        full_text = res.get("motivation","") + " " + res.get("mantra","") + " " + res.get("daily_affirmation","")
-        speak_and_copy_widget(full_text, "Complete Experience")
-else:
-    st.info("💡 **Welcome!** Share your thoughts, choose your experience, and let AI create personalized inspiration for you.")
-    
-    # Show example
-    with st.expander("💡 Try these different inputs to see unique responses"):
-        st.markdown("""
-        **Simple greetings:**
-        - "Hi"
-        - "Hello there"
-        - "Good morning"
-        
-        **Different emotions:**
-        - "I'm feeling really sad today"
-        - "I'm so excited about my new job!"
-        - "I'm anxious about my presentation tomorrow"
-        - "I'm angry at my boss"
-        - "I'm confused about what to do next"
-        
-        **Different situations:**
-        - "I just broke up with my partner"
-        - "I got promoted at work!"
-        - "I'm tired of everything"
-        - "I don't know what I want in life"
-        
-        **Each response will be completely different and personalized!**
-        """)
+with result_slot:
+    if job is not None:
+        job_status()
+        speak_and_copy_widget({}, mode)
+    elif res:
+        with span("render", kind=res.get("type")):
+            kind = render_result(res)
+        with span("render_audio", kind=kind):
+            speak_and_copy_widget(res, kind)
+    else:
+        speak_and_copy_widget({}, mode)
+        st.info("💡 **Welcome!** Share your thoughts, choose your experience, and let AI create personalized inspiration for you.")
+
+        # Show example
+        with st.expander("💡 Try these different inputs to see unique responses"):
+            st.markdown("""
+            **Simple greetings:**
+            - "Hi"
+            - "Hello there"
+            - "Good morning"
+
+            **Different emotions:**
+            - "I'm feeling really sad today"
+            - "I'm so excited about my new job!"
+            - "I'm anxious about my presentation tomorrow"
+            - "I'm angry at my boss"
+            - "I'm confused about what to do next"
+
+            **Different situations:**
+            - "I just broke up with my partner"
+            - "I got promoted at work!"
+            - "I'm tired of everything"
+            - "I don't know what I want in life"
+
+            **Each response will be completely different and personalized!**
+            """)
+
+# -------------------- Startup --------------------
+# The page is up: warm the generator in the background (a no-op after the first run)
+_startup = startup_report()
+if "first_paint_ms" not in _startup:
+    _startup["imports_ms"] = round(_imports_seconds * 1000, 1)
+    _startup["first_paint_ms"] = round((time.perf_counter() - _rerun_started) * 1000, 1)
+_warm = prewarm(_api_key)
+
+# -------------------- Rerun Timing --------------------
+if "rerun_timings" not in st.session_state:
+    st.session_state.rerun_timings = []
+st.session_state.rerun_timings.append({
+    "setup_ms": round(_setup_seconds * 1000, 2),
+    "total_ms": round((time.perf_counter() - _rerun_started) * 1000, 2),
+})
+del st.session_state.rerun_timings[:-50]
 
 # Display debug info in sidebar during development
 if st.sidebar.checkbox("Show Debug Info", value=False):
     if mood:
         emotion_analysis = analyze_user_emotion(mood)
-        st.sidebar.json(emotion_analysis)
\ No newline at end of file
+        st.sidebar.json(emotion_analysis)
+    st.sidebar.caption("Startup")
+    st.sidebar.json({**_startup, "generator": "ready" if _warm.done() else "starting"})
+    generator = get_generator()
+    st.sidebar.caption("Response cache")
+    st.sidebar.json(generator.response_cache.stats())
+    if generator.semantic_cache is not None:
+        st.sidebar.caption("Near-duplicate cache")
+        st.sidebar.json(generator.semantic_cache.summary())
+    if generator.warm_pool is not None:
+        st.sidebar.caption("Warm pool")
+        st.sidebar.json(generator.warm_pool.summary())
+    if generator.admission is not None:
+        st.sidebar.caption("Admission control")
+        st.sidebar.json(generator.admission.summary())
+    if generator.result_store is not None:
+        st.sidebar.caption("Result store")
+        st.sidebar.json(generator.result_store.summary())
+    digest = get_digest(date.today().isoformat())
+    st.sidebar.caption("Daily digest")
+    st.sidebar.json(digest.summary() if digest else "not built")
+    st.sidebar.caption("Response history")
+    st.sidebar.json(st.session_state.response_history.stats())
+    st.sidebar.caption("Model requests")
+    st.sidebar.json({
+        **generator.request_executor.stats,
+        "circuit": generator.request_executor.breaker.state,
+        "coalescing": generator.single_flight.stats if generator.single_flight else "off",
+        "routing": generator.router.stats() if generator.router else "off",
+    })
+    st.sidebar.caption("Token usage")
+    st.sidebar.json({
+        **generator.usage,
+        "by_length": generator.usage_by_length,
+        "context_cache": generator.prompt_cache.stats if generator.prompt_cache else "off",
+    })
+    timings = st.session_state.rerun_timings
+    st.sidebar.caption("Rerun timing")
+    st.sidebar.json({
+        "last_rerun": timings[-1],
+        "median_setup_ms": sorted(t["setup_ms"] for t in timings)[len(timings) // 2],
+        "median_total_ms": sorted(t["total_ms"] for t in timings)[len(timings) // 2],
+        "reruns_sampled": len(timings),
+        "process_uptime_s": round(time.time() - _process_started, 1),
+    })
+# Stage latencies for operators; the checkbox only appears with ?admin=<ADMIN_TOKEN>, and never when it is unset
+_admin_token = os.getenv("ADMIN_TOKEN", "")
+if _admin_token and st.query_params.get("admin") == _admin_token \
+        and st.sidebar.checkbox("Show Admin Metrics", value=False):
+    st.sidebar.caption("Latency (ms, last 1000 per series)")
+    st.sidebar.dataframe(latency_summary(), hide_index=True)
+    st.sidebar.caption("Counters")
+    st.sidebar.dataframe(counter_summary(), hide_index=True)
+    st.sidebar.caption("Recent traces")
+    st.sidebar.json(recent_traces(5)[::-1], expanded=False)
@@ -0,0 +1,224 @@
+"""Batch generation for many mood texts at once.
+
+    python batch.py entries.jsonl -o results.jsonl --concurrency 16 --rate 10
+
+Inputs are JSONL or CSV. Each row needs a ``text`` and may carry an ``id``
+and any ``GenerationSettings`` field (``mode``, ``tone``, ``length``, ...),
+either as top-level keys/columns or, in JSONL, under ``"settings"``. Flags
+such as ``--mode`` set the defaults for rows that leave a setting out.
+
+Rows are read lazily and run through a bounded pool of async workers with
+a requests-per-second limit. Each result is appended to the output JSONL as
+soon as it completes, keyed on the input's context hash and settings, so
+re-running the same command after a crash skips everything already written
+and only retries what is missing or failed. Results that are the local
+fallback rather than a model response are written with ``"fallback": true``
+and retried too.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from functools import partial
+
+from dotenv import load_dotenv
+
+from admission import BATCH
+from cache import make_cache_key
+from generation import MODES, GenerationSettings, Generator, create_context_hash, is_fallback
+
+
+def read_inputs(path: str):
+    """Yield ``(line number, row dict)`` from a JSONL or CSV file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            for line, row in enumerate(csv.DictReader(f), start=2):
+                # Empty cells fall back to the defaults
+                yield line, {k: v for k, v in row.items() if k and v not in (None, "")}
+            return
+        for line, raw in enumerate(f, start=1):
+            if not raw.strip():
+                continue
+            try:
+                yield line, json.loads(raw)
+            except ValueError:
+                yield line, None
+
+
+def parse_row(row, defaults: dict) -> tuple:
+    """Return ``(id, text, settings)`` for one input row; raises ValueError if invalid."""
+    if not isinstance(row, dict):
+        raise ValueError("row is not a JSON object")
+    row = dict(row)
+    text = row.pop("text", None)
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text is required")
+    item_id = row.pop("id", None)
+    nested = row.pop("settings", None) or {}
+    if not isinstance(nested, dict):
+        raise ValueError("settings must be an object")
+    return item_id, text, GenerationSettings.from_dict({**defaults, **row, **nested})
+
+
+def item_key(text: str, settings: GenerationSettings) -> str:
+    """Checkpoint key: identical inputs with identical settings are generated once."""
+    return make_cache_key(create_context_hash(text), settings.cache_fields(settings.mode))
+
+
+def load_checkpoint(path: str) -> set:
+    """Keys already written successfully to an existing output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "rb+") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if isinstance(record, dict) and "result" in record and not record.get("fallback"):
+                done.add(record.get("key"))
+        # Start appending on a fresh line after a partially written one
+        if f.tell():
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    return done
+
+
+class RateLimiter:
+    """Spaces request starts at least ``1 / rate`` seconds apart (no limit if rate <= 0)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        # Reserve the next slot before sleeping so concurrent workers queue up behind it
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def run_batch(generator: Generator, rows, output_path: str, defaults: dict = None,
+                    concurrency: int = 8, rate: float = 0.0, log=None) -> dict:
+    """Generate every row and append results to ``output_path``; returns a throughput report."""
+    defaults = defaults or {}
+    log = log or (lambda message: None)
+    done = load_checkpoint(output_path)
+    limiter = RateLimiter(rate)
+    jobs = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"ok": 0, "fallback": 0, "failed": 0, "invalid": 0, "skipped": 0}
+    usage_before = dict(generator.usage)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+
+    async def produce():
+        seen = set()
+        for line, row in rows:
+            try:
+                item_id, text, settings = parse_row(row, defaults)
+            except ValueError as e:
+                counts["invalid"] += 1
+                log(f"line {line}: {e}")
+                continue
+            key = item_key(text, settings)
+            if key in done or key in seen:
+                counts["skipped"] += 1
+                continue
+            seen.add(key)
+            await jobs.put((key, item_id, text, settings))
+        for _ in range(concurrency):
+            await jobs.put(None)
+
+    async def work(pool, out):
+        while True:
+            job = await jobs.get()
+            if job is None:
+                return
+            key, item_id, text, settings = job
+            # Wait out an open circuit instead of writing fallbacks for the rest of the run
+            while not generator.ready():
+                await asyncio.sleep(1.0)
+            await limiter.acquire()
+            record = {"key": key, "id": item_id, "text": text, "settings": asdict(settings)}
+            try:
+                # No fallback: an item the model could not answer (e.g. denied by admission control)
+                # is written as an error and retried by the next run
+                record["result"] = await loop.run_in_executor(
+                    pool, partial(generator.generate, text, settings, priority=BATCH, fallback_ok=False))
+                if is_fallback(record["result"]):
+                    # Not checkpointed: the next run asks the model again
+                    record["fallback"] = True
+                    counts["fallback"] += 1
+                else:
+                    counts["ok"] += 1
+            except Exception as e:
+                record["error"] = str(e)
+                counts["failed"] += 1
+            # Single event loop thread: each line is written whole, in completion order
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+
+    # Own pool so "both" rows, which fan out onto generator.pool, never wait behind their own batch
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as pool, \
+            open(output_path, "a", encoding="utf-8") as out:
+        await asyncio.gather(produce(), *(work(pool, out) for _ in range(concurrency)))
+
+    elapsed = time.perf_counter() - started
+    generated = counts["ok"] + counts["fallback"] + counts["failed"]
+    tokens = {k: generator.usage[k] - usage_before.get(k, 0) for k in ("input_tokens", "output_tokens")}
+    return {
+        **counts,
+        **tokens,
+        "elapsed_s": round(elapsed, 2),
+        "items_per_s": round(generated / elapsed, 2) if elapsed else 0.0,
+        "tokens_per_s": round(tokens["output_tokens"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL or CSV file of inputs")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, default=0.0, help="max requests started per second (0 = no limit)")
+    parser.add_argument("--mode", choices=MODES)
+    parser.add_argument("--model")
+    parser.add_argument("--tone")
+    parser.add_argument("--length")
+    parser.add_argument("--num-quotes", dest="num_quotes", type=int)
+    args = parser.parse_args()
+
+    load_dotenv()
+    defaults = {k: getattr(args, k) for k in ("mode", "model", "tone", "length", "num_quotes")
+                if getattr(args, k) is not None}
+    generator = Generator.from_env()
+    report = asyncio.run(run_batch(
+        generator, read_inputs(args.input), args.output, defaults,
+        concurrency=args.concurrency, rate=args.rate,
+        log=lambda message: print(message, file=sys.stderr),
+    ))
+    print(
+        f"{report['ok']} generated, {report['fallback']} fell back, {report['failed']} failed, "
+        f"{report['invalid']} invalid, "
+        f"{report['skipped']} already done in {report['elapsed_s']}s: "
+        f"{report['items_per_s']} items/s, {report['tokens_per_s']} output tokens/s "
+        f"({report['input_tokens']} in / {report['output_tokens']} out)",
+        file=sys.stderr,
+    )
+    return 1 if report["failed"] or report["fallback"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Micro-benchmark: single-pass keyword regex vs. the original nested scans.
+
+Run from the repository root:
+
+    python benchmarks/bench_emotion.py
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import emotion  # noqa: E402
+
+
+def legacy_analyze_user_emotion(user_text: str) -> dict:
+    """The original implementation from app.py, kept verbatim for comparison."""
+    text = user_text.lower().strip()
+
+    emotion_indicators = {
+        'excited': ['excited', 'thrilled', 'amazing', 'fantastic', 'awesome', 'great news', 'celebration', 'happy', 'joy'],
+        'sad': ['sad', 'depressed', 'down', 'crying', 'hurt', 'heartbroken', 'devastated', 'miserable'],
+        'anxious': ['anxious', 'worried', 'nervous', 'stress', 'fear', 'panic', 'overwhelmed', 'scared'],
+        'angry': ['angry', 'frustrated', 'mad', 'upset', 'annoyed', 'furious', 'irritated'],
+        'confused': ['confused', 'lost', 'unsure', 'doubt', 'uncertain', 'don\'t know', 'unclear'],
+        'tired': ['tired', 'exhausted', 'burnout', 'drained', 'worn out'],
+        'hopeful': ['hopeful', 'optimistic', 'looking forward', 'positive', 'motivated'],
+        'grateful': ['grateful', 'thankful', 'blessed', 'appreciate', 'lucky']
+    }
+
+    detected_emotions = []
+    for emotion_name, indicators in emotion_indicators.items():
+        if any(indicator in text for indicator in indicators):
+            detected_emotions.append(emotion_name)
+
+    primary_emotion = detected_emotions[0] if detected_emotions else 'neutral'
+
+    high_energy_words = ['excited', 'thrilled', 'amazing', 'fantastic', 'angry', 'furious', 'panic']
+    low_energy_words = ['tired', 'exhausted', 'sad', 'down', 'drained']
+
+    if any(word in text for word in high_energy_words):
+        energy_level = 'high'
+    elif any(word in text for word in low_energy_words):
+        energy_level = 'low'
+    else:
+        energy_level = 'medium'
+
+    themes = []
+    if any(word in text for word in ['work', 'job', 'career', 'boss', 'colleague']):
+        themes.append('work')
+    if any(word in text for word in ['relationship', 'partner', 'family', 'friend']):
+        themes.append('relationships')
+    if any(word in text for word in ['health', 'sick', 'medical', 'doctor']):
+        themes.append('health')
+    if any(word in text for word in ['money', 'financial', 'debt', 'expensive']):
+        themes.append('finances')
+    if any(word in text for word in ['school', 'study', 'exam', 'college', 'university']):
+        themes.append('education')
+
+    return {
+        'primary_emotion': primary_emotion,
+        'all_emotions': detected_emotions,
+        'energy_level': energy_level,
+        'themes': themes,
+        'text_length': len(user_text),
+        'is_greeting': len(text) < 20 and any(greeting in text for greeting in ['hi', 'hello', 'hey', 'good morning', 'good afternoon'])
+    }
+
+
+FILLER = (
+    "today i woke up early and made coffee before sitting down to write . "
+    "the morning light was soft and the street outside was quiet . "
+    "i keep thinking about the conversation from yesterday and what it meant . "
+    "there is a lot on my mind and writing it out usually helps me sort it . "
+).split()
+
+KEYWORDS = list(emotion._KEYWORD_MASKS)
+
+
+def journal_entry(rng: random.Random, words: int, keyword_rate: float) -> str:
+    out = []
+    for _ in range(words):
+        if rng.random() < keyword_rate:
+            out.append(rng.choice(KEYWORDS))
+        else:
+            out.append(rng.choice(FILLER))
+    return " ".join(out).capitalize()
+
+
+def bench(label, fn, inputs, number):
+    per_call = timeit.timeit(lambda: [fn(t) for t in inputs], number=number) / (number * len(inputs))
+    print(f"  {label:<28} {per_call * 1e6:10.1f} us/call")
+    return per_call
+
+
+def main():
+    rng = random.Random(42)
+    cases = [
+        ("greeting", ["Hi", "Hello there", "Good morning!"]),
+        ("short (25 words)", [journal_entry(rng, 25, 0.05) for _ in range(50)]),
+        ("journal (400 words)", [journal_entry(rng, 400, 0.01) for _ in range(50)]),
+        ("long journal (2000 words)", [journal_entry(rng, 2000, 0.002) for _ in range(20)]),
+        ("no keywords (2000 words)", [journal_entry(rng, 2000, 0.0) for _ in range(20)]),
+    ]
+
+    for label, inputs in cases:
+        for text in inputs:
+            assert emotion.analyze_user_emotion(text) == legacy_analyze_user_emotion(text), text
+
+    for label, inputs in cases:
+        number = max(1, 2000 // len(inputs))
+        print(f"{label}:")
+        legacy = bench("legacy nested scans", legacy_analyze_user_emotion, inputs, number)
+
+        def cold(text):
+            emotion.clear_cache()
+            return emotion.analyze_user_emotion(text)
+
+        compiled = bench("keyword regex (cold)", cold, inputs, number)
+        emotion.clear_cache()
+        for text in inputs:
+            emotion.analyze_user_emotion(text)
+        memo = bench("keyword regex (memoized)", emotion.analyze_user_emotion, inputs, number)
+        print(f"  speedup cold x{legacy / compiled:.2f}, memoized x{legacy / memo:.1f}")
+
+
+if __name__ == "__main__":
+    main()
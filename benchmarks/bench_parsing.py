@@ -0,0 +1,71 @@
+"""Benchmark parse_loose_json against the original three-stage parser.
+
+Uses benchmarks/corpus/malformed_outputs.jsonl, a corpus of model outputs in
+the shapes we see go wrong in practice: markdown fences, prose before or
+after the object (with braces in it), truncation at the token limit, wrong
+field types and outright refusals. Reports how many samples yield a usable
+payload and the time per parse.
+
+Run from the repository root:
+
+    python benchmarks/bench_parsing.py
+"""
+import json
+import re
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parsing import parse_loose_json, validate_payload  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "corpus" / "malformed_outputs.jsonl"
+
+
+def legacy_parse_loose_json(s: str):
+    """The original implementation from app.py, kept verbatim for comparison."""
+    if not s:
+        return None
+    try:
+        return json.loads(s)
+    except Exception:
+        pass
+
+    json_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', s, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group(1))
+        except Exception:
+            pass
+
+    start = s.find("{")
+    end = s.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        try:
+            return json.loads(s[start:end+1])
+        except Exception:
+            pass
+    return None
+
+
+def main(number: int = 2000):
+    samples = [json.loads(line) for line in CORPUS.read_text(encoding="utf-8").splitlines() if line.strip()]
+    print(f"{'sample':<30} {'legacy':>8} {'new':>8} {'legacy us':>10} {'new us':>10}")
+    totals = {"legacy": 0, "new": 0}
+    for sample in samples:
+        raw, mode = sample["raw"], sample["mode"]
+        legacy_ok = isinstance(legacy_parse_loose_json(raw), dict) and bool(
+            validate_payload(legacy_parse_loose_json(raw), mode)[0])
+        new_ok = bool(validate_payload(parse_loose_json(raw), mode)[0])
+        assert new_ok == sample["expect_valid"], sample["name"]
+        totals["legacy"] += legacy_ok
+        totals["new"] += new_ok
+        legacy_us = timeit.timeit(lambda: legacy_parse_loose_json(raw), number=number) / number * 1e6
+        new_us = timeit.timeit(lambda: parse_loose_json(raw), number=number) / number * 1e6
+        print(f"{sample['name']:<30} {str(legacy_ok):>8} {str(new_ok):>8} {legacy_us:10.1f} {new_us:10.1f}")
+    print(f"usable payloads: legacy {totals['legacy']}/{len(samples)}, new {totals['new']}/{len(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Exercise the request executor against the fake Gemini server.
+
+Sends the same workload through three configurations (single attempt,
+retries, retries + hedging) with injected latency spikes and errors, and
+prints success rate and latency percentiles for each. Uses plain HTTP, so
+the Gemini SDK is not required.
+
+Run from the repository root:
+
+    python benchmarks/bench_resilience.py
+"""
+import json
+import random
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_gemini import FakeGemini  # noqa: E402
+from resilience import CircuitBreaker, RequestExecutor  # noqa: E402
+
+
+class SpikyFake(FakeGemini):
+    """Mostly fast, with a slow tail that hedging should cut off."""
+
+    def sample_latency(self) -> float:
+        with self._lock:
+            return 2.0 if self.rng.random() < 0.05 else self.rng.uniform(0.05, 0.15)
+
+
+def make_request(base_url: str):
+    body = json.dumps({"contents": [{"role": "user", "parts": [{"text": "MODE: message"}]}]}).encode()
+
+    def request():
+        req = urllib.request.Request(
+            f"{base_url}/v1beta/models/fake:generateContent",
+            data=body,
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return json.loads(resp.read())
+
+    return request
+
+
+def run(label: str, executor: RequestExecutor, request, total: int, users: int):
+    latencies, failures = [], 0
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            executor.execute(request)
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        for result in pool.map(one, range(total)):
+            if result is None:
+                failures += 1
+            else:
+                latencies.append(result)
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000 if latencies else float("nan")
+    print(f"{label:<22} ok {len(latencies):4d}/{total}  p50 {pct(50):7.1f} ms  p95 {pct(95):7.1f} ms  "
+          f"p99 {pct(99):7.1f} ms  {executor.stats}")
+
+
+def main(total: int = 300, users: int = 8):
+    random.seed(7)
+    with SpikyFake(error_rate=0.1, seed=7) as fake:
+        request = make_request(fake.base_url)
+        no_breaker = lambda: CircuitBreaker(failure_threshold=10 ** 9)
+        run("single attempt", RequestExecutor(max_attempts=1, breaker=no_breaker()), request, total, users)
+        run("retries", RequestExecutor(max_attempts=3, base_delay=0.05, breaker=no_breaker()), request, total, users)
+        hedged = RequestExecutor(max_attempts=3, base_delay=0.05, hedge=True, hedge_min_samples=20, breaker=no_breaker())
+        run("retries + hedging", hedged, request, total, users)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Micro-benchmark: near-duplicate lookups in a large semantic cache.
+
+Fills a ``SemanticCache`` with random signatures spread over a few scopes,
+adds some real inputs, and then times lookups of their rewordings (hits)
+and of unrelated text (misses).
+
+Run from the repository root:
+
+    python benchmarks/bench_semantic.py --entries 1000000
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from semantic_cache import SemanticCache, scope_hash  # noqa: E402
+
+PAIRS = [
+    ("I'm so tired of work", "im so tired of my work"),
+    ("I am anxious about my presentation tomorrow", "im anxious about the presentation tomorrow"),
+    ("I feel lost and don't know what to do next", "i feel so lost and dont know what to do next"),
+    ("My partner and I keep fighting about money", "me and my partner keep fighting about money"),
+    ("I got promoted at work and I'm excited", "i got promoted at work and im so excited"),
+]
+MISSES = ["The weather is nice and I want to plan a picnic", "Can you help me stay focused on studying tonight"]
+SCOPES = [f"scope-{i}" for i in range(16)]
+
+
+def fill(cache: SemanticCache, n: int, seed: int = 1):
+    """Bulk-load ``n`` random entries directly; adding them one by one would only time the loop."""
+    rng = np.random.default_rng(seed)
+    while len(cache._sigs) < n:
+        cache._grow()
+    cache._sigs[:n] = rng.integers(0, 2 ** 32, (n, cache.num_perm), dtype=np.uint32)
+    cache._scopes[:n] = np.array([scope_hash(s) for s in SCOPES], np.uint64)[rng.integers(0, len(SCOPES), n)]
+    cache._keys = [f"random:{i}" for i in range(n)]
+    cache._size, cache._next = n, n % cache.max_entries
+    cache._seq = n
+    cache._rebuild()
+
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return sorted(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    cache = SemanticCache(max_entries=max(args.entries + 1024, 1024))
+    start = time.perf_counter()
+    fill(cache, args.entries)
+    print(f"filled {args.entries:,} entries in {time.perf_counter() - start:.1f}s, "
+          f"{tracemalloc.get_traced_memory()[0] / 2 ** 20:.0f} MiB")
+    tracemalloc.stop()
+
+    for i, (original, _) in enumerate(PAIRS):
+        cache.add(original, SCOPES[i % len(SCOPES)], f"real:{i}")
+    hits = sum(cache.lookup(reworded, SCOPES[i % len(SCOPES)]) == f"real:{i}"
+               for i, (_, reworded) in enumerate(PAIRS))
+    print(f"near-duplicates found: {hits}/{len(PAIRS)}")
+
+    for label, texts in (("hit", [p[1] for p in PAIRS]), ("miss", MISSES)):
+        queries = iter(range(10 ** 9))
+        samples = timed(lambda: cache.lookup(texts[next(queries) % len(texts)], SCOPES[0]), args.repeat)
+        print(f"{label:5s} lookup  p50 {samples[len(samples) // 2]:7.1f} us  p99 {samples[int(len(samples) * 0.99)]:7.1f} us")
+    samples = timed(lambda: cache.add(MISSES[0] + str(time.perf_counter_ns()), SCOPES[1], "added"), args.repeat)
+    print(f"add          p50 {samples[len(samples) // 2]:7.1f} us  p99 {samples[int(len(samples) * 0.99)]:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
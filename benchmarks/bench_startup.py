@@ -0,0 +1,102 @@
+"""Compare per-rerun setup cost with and without process-wide caching.
+
+Simulates the work app.py used to repeat on every Streamlit rerun (loading
+.env, constructing the Gemini client, building the CSS and system prompt)
+against the cached path, where each rerun only looks the objects up.
+
+With ``--imports`` it instead reports what the app's own modules cost to
+import in a fresh interpreter, parsed from ``python -X importtime``: the
+total and the slowest modules by cumulative time. Heavy dependencies (the
+Gemini SDK, NumPy) should not appear there, since they load on first use.
+
+Run from the repository root (no network access is needed):
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --imports
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+ASSETS = ROOT / "assets"
+# What the Streamlit page imports before its first render (streamlit itself is loaded by the runner)
+APP_MODULES = ["digest", "emotion", "generation", "history", "jobs", "metrics", "rendering"]
+
+from dotenv import load_dotenv  # noqa: E402
+from google import genai  # noqa: E402
+
+API_KEY = os.getenv("GEMINI_API_KEY") or "benchmark-placeholder-key"
+
+
+def uncached_setup():
+    load_dotenv()
+    client = genai.Client(api_key=API_KEY)
+    css = (ASSETS / "style.css").read_text(encoding="utf-8")
+    prompt = (ASSETS / "system_prompt.txt").read_text(encoding="utf-8")
+    return client, css, prompt
+
+
+@lru_cache(maxsize=None)
+def cached_setup():
+    # Stands in for the st.cache_resource singletons used by app.py
+    return uncached_setup()
+
+
+def measure(fn, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs
+
+
+def main(runs: int = 200):
+    first = measure(cached_setup, 1)
+    uncached = measure(uncached_setup, runs)
+    cached = measure(cached_setup, runs)
+    print(f"first (cold) setup:      {first * 1000:8.3f} ms")
+    print(f"per-rerun, uncached:     {uncached * 1000:8.3f} ms")
+    print(f"per-rerun, cached:       {cached * 1000:8.3f} ms")
+    print(f"saved per rerun:         {(uncached - cached) * 1000:8.3f} ms")
+
+
+def import_times(modules: list) -> list:
+    """``(self_us, cumulative_us, depth, name)`` for every module a fresh interpreter imports."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(own), int(cumulative), (len(name) - len(name.lstrip())) // 2, name.strip()))
+    return rows
+
+
+def report_imports(modules: list, top: int):
+    rows = import_times(modules)
+    roots = [row for row in rows if row[3] in modules]
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for own, cumulative, depth, name in sorted(rows, key=lambda row: -row[1])[:top]:
+        print(f"{cumulative / 1000:14.1f} {own / 1000:8.1f}  {'  ' * depth}{name}")
+    # Modules imported by the interpreter itself (site, encodings) are not counted
+    print(f"app modules: {sum(row[1] for row in roots) / 1000:.1f} ms")
+    heavy = [name for *_, name in rows if name.split(".")[0] in ("numpy", "google")]
+    if heavy:
+        print(f"heavy modules imported eagerly: {', '.join(sorted(set(n.split('.')[0] for n in heavy)))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("runs", nargs="?", type=int, default=200)
+    parser.add_argument("--imports", action="store_true", help="report import times of the app modules instead")
+    parser.add_argument("--top", type=int, default=15, help="modules to list with --imports")
+    args = parser.parse_args()
+    if args.imports:
+        report_imports(APP_MODULES, args.top)
+    else:
+        main(args.runs)
@@ -0,0 +1,321 @@
+"""Offline benchmark suite: micro-benchmarks, end-to-end load and session memory.
+
+Everything runs in-process against the fake Gemini server, seeded so that two
+runs see the same latencies, errors, malformed outputs and inputs. Results go
+to one JSON file per run that can be compared across commits:
+
+    python benchmarks/bench_suite.py                      # writes bench-results/<commit>.json
+    python benchmarks/bench_suite.py --users 1 8 32 --latency-ms 300 --malformed-rate 0.1
+    python benchmarks/bench_suite.py --compare bench-results/abc1234.json bench-results/def5678.json
+
+Sections:
+
+* ``micro`` - time per call of the pure functions on the request path
+  (emotion analysis, parsing and validation, prompt building, cache keys,
+  quote retrieval, history fingerprints).
+* ``load`` - N concurrent simulated users, each with its own history, sending
+  a fixed mix of message/quote/both requests through ``Generator.generate``:
+  throughput, latency percentiles, fallback and parse-failure rates, tokens.
+* ``memory`` - bytes retained per session ``ResponseHistory`` as responses
+  accumulate, measured with tracemalloc next to the history's own accounting.
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from google import genai  # noqa: E402
+from google.genai import types  # noqa: E402
+
+import emotion  # noqa: E402
+import metrics  # noqa: E402
+from cache import ResponseCache, make_cache_key  # noqa: E402
+from fake_gemini import DISTRIBUTIONS, MESSAGE_PAYLOAD, QUOTE_PAYLOAD, FakeGemini  # noqa: E402
+from generation import (GenerationSettings, Generator, build_instruction, create_context_hash,  # noqa: E402
+                        generation_config)
+from history import ResponseHistory, fingerprint, response_text  # noqa: E402
+from parsing import parse_loose_json, validate_payload  # noqa: E402
+from prompt_cache import PromptCache  # noqa: E402
+from quotes import load_quote_index  # noqa: E402
+from resilience import CircuitBreaker, RequestExecutor  # noqa: E402
+
+CORPUS = Path(__file__).resolve().parent / "corpus" / "malformed_outputs.jsonl"
+
+OPENINGS = ["I'm feeling", "Honestly I feel", "Today I am", "Lately I've been", "Right now I'm"]
+FEELINGS = ["anxious", "exhausted", "excited", "confused", "sad", "hopeful", "frustrated", "grateful", "stuck"]
+SITUATIONS = [
+    "about my exam tomorrow", "after a long week at work", "because my partner and I keep arguing",
+    "since I got the job offer", "about money and rent this month", "after seeing the doctor",
+    "and I don't know what I want in life", "about starting university", "because my boss ignored my idea",
+]
+GREETINGS = ["hi", "hello there", "good morning", "hey"]
+MODE_MIX = ["message", "message", "quote", "both"]
+
+
+def make_texts(rng: random.Random, n: int) -> list:
+    """Deterministic user inputs: mostly situations, a few greetings."""
+    texts = []
+    for _ in range(n):
+        if rng.random() < 0.1:
+            texts.append(rng.choice(GREETINGS))
+        else:
+            texts.append(f"{rng.choice(OPENINGS)} {rng.choice(FEELINGS)} {rng.choice(SITUATIONS)}")
+    return texts
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+def counter_total(counter) -> float:
+    return sum(value for _, _, value in counter.samples())
+
+
+# -------------------- Micro-benchmarks --------------------
+def time_per_call(fn, inputs: list, repeat: int) -> dict:
+    """Median and best microseconds per call over ``repeat`` passes through ``inputs``."""
+    passes = [timeit.timeit(lambda: [fn(x) for x in inputs], number=1) / len(inputs) * 1e6 for _ in range(repeat)]
+    return {"us_per_call": round(statistics.median(passes), 3), "best_us": round(min(passes), 3),
+            "calls": len(inputs) * repeat}
+
+
+def run_micro(texts: list, repeat: int) -> dict:
+    samples = [json.loads(line) for line in CORPUS.read_text(encoding="utf-8").splitlines() if line.strip()]
+    raws = [sample["raw"] for sample in samples]
+    parsed = [(parse_loose_json(sample["raw"]), sample["mode"]) for sample in samples]
+    settings = GenerationSettings()
+    history = ResponseHistory()
+    for text in texts[:20]:
+        history.add(create_context_hash(text), MESSAGE_PAYLOAD)
+    index = load_quote_index()
+    normalized = [emotion.normalize_text(t) for t in texts]
+    message_text = response_text(MESSAGE_PAYLOAD)
+
+    results = {
+        # Bypasses the memo so the scan itself is measured
+        "emotion_uncached": time_per_call(emotion._analyze_normalized.__wrapped__, normalized, repeat),
+        "emotion_cached": time_per_call(emotion.analyze_user_emotion, texts, repeat),
+        "parse_loose_json": time_per_call(parse_loose_json, raws, repeat),
+        "validate_payload": time_per_call(lambda item: validate_payload(*item), parsed, repeat),
+        "build_instruction": time_per_call(lambda t: build_instruction(t, "message", settings, history), texts, repeat),
+        "generation_config": time_per_call(lambda t: generation_config(t, "message", settings), texts, repeat),
+        "cache_key": time_per_call(
+            lambda t: make_cache_key(create_context_hash(t), settings.cache_fields("message")), texts, repeat),
+        "history_fingerprint": time_per_call(lambda _: fingerprint(message_text), texts, repeat),
+        "history_is_repeat": time_per_call(
+            lambda t: history.is_repeat(create_context_hash(t), MESSAGE_PAYLOAD), texts, repeat),
+    }
+    if index is not None:
+        results["quote_for_text"] = time_per_call(
+            lambda t: index.for_text(t, 5, rng=random.Random(0)), texts, repeat)
+    return results
+
+
+# -------------------- End-to-end load --------------------
+def make_generator(base_url: str) -> Generator:
+    client = genai.Client(api_key="benchmark", http_options=types.HttpOptions(base_url=base_url, timeout=30_000))
+    return Generator(
+        client,
+        response_cache=ResponseCache(),
+        request_executor=RequestExecutor(attempt_timeout=30, base_delay=0.01, max_delay=0.1,
+                                         breaker=CircuitBreaker(failure_threshold=50)),
+        quote_index=load_quote_index(),
+        prompt_cache=PromptCache(client),
+    )
+
+
+def run_load(base_url: str, users: int, requests_per_user: int, texts: list, seed: int) -> dict:
+    """``users`` threads each send ``requests_per_user`` requests back to back."""
+    generator = make_generator(base_url)
+    fallbacks, parse_failures = counter_total(metrics.FALLBACKS), counter_total(metrics.PARSE_FAILURES)
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def user(uid: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + uid)
+        history = ResponseHistory()
+        for i in range(requests_per_user):
+            settings = GenerationSettings(mode=MODE_MIX[(uid + i) % len(MODE_MIX)], tone=rng.choice(["adaptive", "calm"]))
+            started = time.perf_counter()
+            try:
+                generator.generate(rng.choice(texts), settings, history=history, stream=False)
+            except Exception:
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    elapsed = time.perf_counter() - started
+    total = users * requests_per_user
+    cache = generator.response_cache.stats()
+    return {
+        "users": users,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "fallback_rate": round((counter_total(metrics.FALLBACKS) - fallbacks) / total, 4),
+        "parse_failure_rate": round((counter_total(metrics.PARSE_FAILURES) - parse_failures) / total, 4),
+        "cache_hit_rate": cache["hit_rate"],
+        "retries": generator.request_executor.stats["retries"],
+        "model_calls": generator.usage["requests"],
+        "input_tokens_per_call": round(generator.usage["input_tokens"] / max(1, generator.usage["requests"]), 1),
+        "output_tokens_per_call": round(generator.usage["output_tokens"] / max(1, generator.usage["requests"]), 1),
+    }
+
+
+# -------------------- Session memory --------------------
+def run_memory(sessions: int, checkpoints: list, texts: list) -> dict:
+    """Retained bytes per session after each checkpoint number of responses."""
+    rng = random.Random(0)
+    payloads = []
+    for i in range(max(checkpoints)):
+        base = MESSAGE_PAYLOAD if i % 2 == 0 else QUOTE_PAYLOAD
+        payload = json.loads(json.dumps(base))
+        # Vary the text so fingerprints and compressed summaries differ like real responses do
+        field = "motivation" if base is MESSAGE_PAYLOAD else "reflection"
+        payload[field] += " " + " ".join(rng.choice(texts) for _ in range(20))
+        payloads.append(payload)
+    inputs = [create_context_hash(t) for t in texts[:10]]
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    histories = [ResponseHistory() for _ in range(sessions)]
+    growth = []
+    added = 0
+    for target in sorted(checkpoints):
+        for i in range(added, target):
+            for history in histories:
+                history.add(inputs[i % len(inputs)], payloads[i])
+        added = target
+        traced = tracemalloc.get_traced_memory()[0] - baseline
+        growth.append({
+            "responses": target,
+            "traced_bytes_per_session": round(traced / sessions),
+            "history_bytes_per_session": round(sum(h.nbytes for h in histories) / sessions),
+        })
+    tracemalloc.stop()
+    return {"sessions": sessions, "growth": growth}
+
+
+# -------------------- Results --------------------
+def git_revision() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown",
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def flatten(results: dict) -> dict:
+    """Numeric leaves keyed by a readable path, for comparing two result files."""
+    flat = {}
+    for name, values in results.get("micro", {}).items():
+        flat[f"micro.{name}.us_per_call"] = values["us_per_call"]
+    for row in results.get("load", []):
+        for key, value in row.items():
+            if key != "users" and isinstance(value, (int, float)):
+                flat[f"load.users={row['users']}.{key}"] = value
+    for row in results.get("memory", {}).get("growth", []):
+        flat[f"memory.responses={row['responses']}.traced_bytes_per_session"] = row["traced_bytes_per_session"]
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    old, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in (old_path, new_path))
+    before, after = flatten(old), flatten(new)
+    print(f"{'metric':<58} {old['meta']['commit']:>12} {new['meta']['commit']:>12} {'change':>8}")
+    for key in sorted(set(before) | set(after)):
+        a, b = before.get(key), after.get(key)
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+        print(f"{key:<58} {'' if a is None else a:>12} {'' if b is None else b:>12} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="results file (default: bench-results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    parser.add_argument("--sections", nargs="+", choices=["micro", "load", "memory"],
+                        default=["micro", "load", "memory"])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="passes per micro-benchmark")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32], help="concurrency levels")
+    parser.add_argument("--requests-per-user", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model median latency")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--sigma", type=float, default=0.5)
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="uniform distribution only")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--output-tokens", type=int, default=600)
+    parser.add_argument("--sessions", type=int, default=50, help="sessions in the memory benchmark")
+    parser.add_argument("--responses", type=int, nargs="+", default=[1, 5, 20, 50, 100],
+                        help="memory checkpoints, in responses per session")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    texts = make_texts(random.Random(args.seed), 500)
+    meta = {**git_revision(), "python": platform.python_version(), "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "args": {k: v for k, v in vars(args).items()
+                                                                         if k not in ("output", "compare")}}
+    results = {"meta": meta}
+
+    if "micro" in args.sections:
+        results["micro"] = run_micro(texts, args.repeat)
+        for name, values in results["micro"].items():
+            print(f"micro  {name:<22} {values['us_per_call']:>10.2f} us/call", file=sys.stderr)
+
+    if "load" in args.sections:
+        results["load"] = []
+        for users in args.users:
+            # A fresh, identically seeded fake per level keeps levels comparable across runs
+            with FakeGemini(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                            seed=args.seed, distribution=args.distribution, sigma=args.sigma,
+                            malformed_rate=args.malformed_rate, output_tokens=args.output_tokens) as fake:
+                row = run_load(fake.base_url, users, args.requests_per_user, texts, args.seed)
+            results["load"].append(row)
+            print(f"load   users={users:<4} {row['requests_per_s']:>8.2f} req/s  p50 {row['p50_ms']} ms  "
+                  f"p95 {row['p95_ms']} ms  p99 {row['p99_ms']} ms  fallbacks {row['fallback_rate']:.1%}",
+                  file=sys.stderr)
+
+    if "memory" in args.sections:
+        results["memory"] = run_memory(args.sessions, args.responses, texts)
+        for row in results["memory"]["growth"]:
+            print(f"memory responses={row['responses']:<4} {row['traced_bytes_per_session']:>8} B/session traced, "
+                  f"{row['history_bytes_per_session']:>8} B/session accounted", file=sys.stderr)
+
+    output = Path(args.output or ROOT / "bench-results" / f"{meta['commit']}{'-dirty' if meta['dirty'] else ''}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    print(f"results written to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Local stand-in for the Gemini REST API with injectable latency and errors.
+
+Serves ``generateContent``, ``streamGenerateContent`` (SSE) and
+``cachedContents`` creation for any model. Generations answer with a valid
+message-, quote- or quote_context-shaped JSON payload, depending on the
+``MODE:`` line of the prompt, and report approximate token usage.
+
+Latency is uniform (``latency_ms`` +/- ``jitter_ms``) or log-normal with
+median ``latency_ms``; ``malformed_rate`` makes a share of answers arrive
+truncated, wrapped in prose or as a refusal, and ``output_tokens`` pads
+payloads to a target length. With a ``seed`` every draw is reproducible.
+Point the app at it with:
+
+    python benchmarks/fake_gemini.py --port 8765 --latency-ms 800 --error-rate 0.1
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=fake streamlit run app.py
+
+It can also be started in-process with ``FakeGemini(...).start()``.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MESSAGE_PAYLOAD = {
+    "type": "message",
+    "motivation": "You named exactly what is weighing on you, and that honesty is where momentum starts.",
+    "steps": [
+        "Write down the one task that matters most today",
+        "Break it into a first step that takes ten minutes",
+        "Tell someone you trust what you are working on",
+        "Close the day by noting one thing that went right",
+    ],
+    "mantra": "One honest step at a time is still forward",
+    "quotes": [
+        {"quote": "It does not matter how slowly you go as long as you do not stop.", "author": "Confucius",
+         "context": "Progress counts even when it is small"},
+    ],
+    "reflection_questions": ["What would make today feel like a win?"],
+    "daily_affirmation": "I can handle what today brings",
+}
+
+QUOTE_PAYLOAD = {
+    "type": "quote",
+    "quotes": [
+        {"quote": "The best way out is always through.", "author": "Robert Frost",
+         "context": "Facing the situation directly", "category": "resilience"},
+        {"quote": "What you do makes a difference, and you have to decide what kind of difference you want to make.",
+         "author": "Jane Goodall", "context": "Choosing your next move", "category": "purpose"},
+    ],
+    "reflection": "These quotes meet you where you are and point to the next step.",
+    "theme": "Moving through, not around",
+    "application": "Pick one quote and keep it visible today.",
+}
+
+QUOTE_CONTEXT_PAYLOAD = {
+    "type": "quote_context",
+    "contexts": ["This speaks to exactly what you described."] * 10,
+    "reflection": "These quotes meet you where you are and point to the next step.",
+    "theme": "Moving through, not around",
+    "application": "Pick one quote and keep it visible today.",
+}
+PAYLOADS = {"message": MESSAGE_PAYLOAD, "quote": QUOTE_PAYLOAD, "quote_context": QUOTE_CONTEXT_PAYLOAD}
+# The free-text field padded when a target output length is set
+LONG_FIELDS = {"message": "motivation", "quote": "reflection", "quote_context": "reflection"}
+DISTRIBUTIONS = ("uniform", "lognormal")
+MALFORMATIONS = ("truncated", "prose", "refusal")
+
+
+class FakeGemini:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 jitter_ms: float = 0.0, error_rate: float = 0.0, error_codes=(429, 500, 503),
+                 chunk_chars: int = 64, seed: int = None, distribution: str = "uniform", sigma: float = 0.5,
+                 malformed_rate: float = 0.0, output_tokens: int = 0):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {DISTRIBUTIONS}")
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.malformed_rate = malformed_rate
+        self.output_tokens = output_tokens
+        self.chunk_chars = chunk_chars
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.malformed = 0
+        self.cached_contents = {}  # name -> cached system instruction text
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -------------------- Behaviour hooks --------------------
+    def sample_latency(self) -> float:
+        with self._lock:
+            if self.distribution == "lognormal":
+                # Median latency_ms with a long right tail, like real model latencies
+                return self.rng.lognormvariate(math.log(max(self.latency_ms, 1e-3)), self.sigma) / 1000
+            return max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def sample_error(self):
+        with self._lock:
+            if self.rng.random() < self.error_rate:
+                return self.rng.choice(self.error_codes)
+        return None
+
+    def response_text(self, prompt: str) -> str:
+        match = re.search(r"MODE:\s*(\w+)", prompt)
+        shape = match.group(1) if match and match.group(1) in PAYLOADS else "message"
+        payload = PAYLOADS[shape]
+        if self.output_tokens:
+            payload = dict(payload)
+            field = LONG_FIELDS[shape]
+            # Roughly four characters per token
+            missing = self.output_tokens * 4 - len(json.dumps(payload))
+            if missing > 0:
+                filler = " Keep going, one small step at a time."
+                payload[field] += (filler * (missing // len(filler) + 1))[:missing]
+        return self.malform(json.dumps(payload))
+
+    def malform(self, text: str) -> str:
+        """Corrupt ``malformed_rate`` of the answers the way real model output goes wrong."""
+        with self._lock:
+            if self.rng.random() >= self.malformed_rate:
+                return text
+            self.malformed += 1
+            kind = self.rng.choice(MALFORMATIONS)
+            cut = self.rng.randint(len(text) // 4, len(text) - 2)
+        if kind == "truncated":
+            return text[:cut]
+        if kind == "prose":
+            return f"Here is your response {{as requested}}:\n```json\n{text}\n```\nI hope this helps!"
+        return "I'm sorry, but I can't help with that request."
+
+    # -------------------- HTTP plumbing --------------------
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                with fake._lock:
+                    fake.requests += 1
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    request = json.loads(body or b"{}")
+                except ValueError:
+                    request = {}
+                prompt = " ".join(
+                    part.get("text", "")
+                    for content in request.get("contents", [])
+                    for part in content.get("parts", [])
+                )
+                system = " ".join(part.get("text", "") for part in (request.get("systemInstruction") or {}).get("parts", []))
+
+                if self.path.rstrip("/").endswith("/cachedContents"):
+                    with fake._lock:
+                        name = f"cachedContents/fake-{len(fake.cached_contents) + 1}"
+                        fake.cached_contents[name] = system
+                    return self._send_json(200, {"name": name, "model": request.get("model"),
+                                                 "expireTime": "2099-01-01T00:00:00Z"})
+                cached = fake.cached_contents.get(request.get("cachedContent"), "")
+
+                time.sleep(fake.sample_latency())
+                error = fake.sample_error()
+                if error:
+                    return self._send_json(error, {"error": {"code": error, "message": "injected failure",
+                                                              "status": "UNAVAILABLE"}})
+
+                text = fake.response_text(prompt)
+                # Roughly four characters per token, like the real tokenizer on English text
+                usage = {"promptTokenCount": (len(prompt) + len(system) + len(cached)) // 4,
+                         "cachedContentTokenCount": len(cached) // 4, "candidatesTokenCount": len(text) // 4}
+                if ":streamGenerateContent" in self.path:
+                    return self._send_stream(text, usage)
+                return self._send_json(200, _candidate(text, usage))
+
+            def _send_json(self, status: int, obj: dict):
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, text: str, usage: dict):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                step = max(1, fake.chunk_chars)
+                for i in range(0, len(text), step):
+                    last = i + step >= len(text)
+                    event = f"data: {json.dumps(_candidate(text[i:i + step], usage if last else None))}\r\n\r\n".encode()
+                    self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def _candidate(text: str, usage: dict = None) -> dict:
+    response = {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}]}
+    if usage:
+        response["usageMetadata"] = usage
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter-ms", type=float, default=200.0)
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal shape parameter")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--output-tokens", type=int, default=0, help="pad payloads to about this many tokens")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    fake = FakeGemini(args.host, args.port, args.latency_ms, args.jitter_ms, args.error_rate, seed=args.seed,
+                      distribution=args.distribution, sigma=args.sigma, malformed_rate=args.malformed_rate,
+                      output_tokens=args.output_tokens)
+    print(f"Fake Gemini listening on {fake.base_url}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""Local stand-in for a Redis server, covering the commands ``store.RedisStore`` uses.
+
+Speaks the Redis protocol (RESP) over TCP and keeps everything in memory:
+strings (GET/SET/MGET/DEL/INCRBY) and sorted sets (ZADD, ZREM, ZCARD,
+ZRANGE, ZRANGEBYSCORE, ZREVRANGEBYSCORE with LIMIT). Run it and point the
+result store at it with:
+
+    python benchmarks/fake_redis.py --port 6399
+    RESULT_STORE=redis RESULT_STORE_URL=redis://127.0.0.1:6399/0 streamlit run app.py
+
+It can also be started in-process with ``FakeRedis().start()``.
+"""
+import argparse
+import bisect
+import socketserver
+import threading
+
+
+def _score(arg: bytes, upper: bool) -> tuple:
+    """Parse a score bound: ``(value, exclusive)``."""
+    text = arg.decode()
+    exclusive = text.startswith("(")
+    text = text.lstrip("(")
+    if text in ("+inf", "inf"):
+        return float("inf"), exclusive
+    if text == "-inf":
+        return float("-inf"), exclusive
+    return float(text), exclusive
+
+
+class FakeRedis:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.strings = {}
+        self.zsets = {}  # key -> (sorted list of (score, member), {member: score})
+        self.commands = 0
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer((host, port), self._handler(), bind_and_activate=True)
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "FakeRedis":
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="fake-redis").start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -------------------- Commands --------------------
+    def call(self, args: list):
+        name = args[0].decode().upper()
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            return RuntimeError(f"ERR unknown command '{name}'")
+        with self._lock:
+            self.commands += 1
+            try:
+                return handler(*args[1:])
+            except (ValueError, TypeError, IndexError) as e:
+                return RuntimeError(f"ERR {e}")
+
+    def cmd_ping(self, *args):
+        return "PONG"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_get(self, key):
+        return self.strings.get(key)
+
+    def cmd_set(self, key, value):
+        self.strings[key] = value
+        return "OK"
+
+    def cmd_mget(self, *keys):
+        return [self.strings.get(key) for key in keys]
+
+    def cmd_incrby(self, key, amount):
+        value = int(self.strings.get(key, b"0")) + int(amount)
+        self.strings[key] = str(value).encode()
+        return value
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += (self.strings.pop(key, None) is not None) + (self.zsets.pop(key, None) is not None)
+        return removed
+
+    def _zset(self, key):
+        return self.zsets.setdefault(key, ([], {}))
+
+    def cmd_zadd(self, key, *pairs):
+        entries, scores = self._zset(key)
+        added = 0
+        for score, member in zip(pairs[::2], pairs[1::2]):
+            score = float(score)
+            if member in scores:
+                entries.remove((scores[member], member))
+            else:
+                added += 1
+            scores[member] = score
+            bisect.insort(entries, (score, member))
+        return added
+
+    def cmd_zrem(self, key, *members):
+        entries, scores = self._zset(key)
+        removed = 0
+        for member in members:
+            if member in scores:
+                entries.remove((scores.pop(member), member))
+                removed += 1
+        if not scores:
+            self.zsets.pop(key, None)
+        return removed
+
+    def cmd_zcard(self, key):
+        return len(self.zsets.get(key, ([], {}))[1])
+
+    def cmd_zrange(self, key, start, stop):
+        entries = self.zsets.get(key, ([], {}))[0]
+        start, stop = int(start), int(stop)
+        stop = len(entries) + stop if stop < 0 else stop
+        return [member for _, member in entries[start:stop + 1]]
+
+    def _by_score(self, key, low, high, rest, reverse: bool):
+        (low, low_excl), (high, high_excl) = _score(low, False), _score(high, True)
+        entries = self.zsets.get(key, ([], {}))[0]
+        members = [m for s, m in (reversed(entries) if reverse else entries)
+                   if (s > low if low_excl else s >= low) and (s < high if high_excl else s <= high)]
+        if rest and rest[0].upper() == b"LIMIT":
+            offset, count = int(rest[1]), int(rest[2])
+            members = members[offset:] if count < 0 else members[offset:offset + count]
+        return members
+
+    def cmd_zrangebyscore(self, key, low, high, *rest):
+        return self._by_score(key, low, high, rest, reverse=False)
+
+    def cmd_zrevrangebyscore(self, key, high, low, *rest):
+        return self._by_score(key, low, high, rest, reverse=True)
+
+    # -------------------- Protocol --------------------
+    def _handler(self):
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                if not line.startswith(b"*"):
+                    return line.split()
+                args = []
+                for _ in range(int(line[1:])):
+                    size = int(self.rfile.readline()[1:])
+                    args.append(self.rfile.read(size + 2)[:-2])
+                return args
+
+            def encode(self, value) -> bytes:
+                if value is None:
+                    return b"$-1\r\n"
+                if isinstance(value, RuntimeError):
+                    return b"-%s\r\n" % str(value).encode()
+                if isinstance(value, str):
+                    return b"+%s\r\n" % value.encode()
+                if isinstance(value, int):
+                    return b":%d\r\n" % value
+                if isinstance(value, bytes):
+                    return b"$%d\r\n%s\r\n" % (len(value), value)
+                return b"*%d\r\n" % len(value) + b"".join(self.encode(v) for v in value)
+
+            def handle(self):
+                while True:
+                    args = self.read_command()
+                    if not args:
+                        return
+                    self.wfile.write(self.encode(fake.call(args)))
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    server = FakeRedis(args.host, args.port)
+    print(f"Fake Redis listening on {server.url}")
+    server._server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
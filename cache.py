@@ -0,0 +1,182 @@
+"""Response cache for generated payloads.
+
+Entries are keyed on the context hash of the user's text plus every setting
+that changes the prompt. Each key collects up to ``variants_per_key``
+distinct responses before the cache starts serving them, and then rotates
+through them so repeated submissions still see different content. Entries
+expire after ``ttl_seconds`` and the least recently used keys are evicted
+once ``max_entries`` is exceeded.
+"""
+import copy
+import json
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(context_hash: str, settings: dict) -> str:
+    """Combine the text hash with the prompt-affecting settings."""
+    blob = json.dumps(settings, sort_keys=True, separators=(",", ":"))
+    return f"{context_hash}:{hashlib.md5(blob.encode()).hexdigest()[:12]}"
+
+
+class MemoryBackend:
+    """In-process LRU store: key -> {"variants": [...], "created": ts, "cursor": n}.
+
+    Entries are copied in and out, like the SQLite backend's JSON round-trip,
+    so a caller that annotates a payload does not change it for every session.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return copy.deepcopy(entry)
+
+    def set(self, key, entry):
+        self._entries[key] = copy.deepcopy(entry)
+        self._entries.move_to_end(key)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def evict(self, max_entries: int) -> int:
+        evicted = 0
+        while len(self._entries) > max_entries:
+            self._entries.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """File-backed store so the cache survives restarts and is shared by processes."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, entry TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_last_used ON response_cache (last_used)"
+        )
+
+    def get(self, key):
+        row = self._conn.execute("SELECT entry FROM response_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self._conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def set(self, key, entry):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, entry, last_used) VALUES (?, ?, ?)",
+            (key, json.dumps(entry), time.time()),
+        )
+
+    def delete(self, key):
+        self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+
+    def evict(self, max_entries: int) -> int:
+        cur = self._conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        )
+        return max(cur.rowcount, 0)
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 6 * 3600,
+                 variants_per_key: int = 3, backend=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.variants_per_key = max(1, variants_per_key)
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        """Return a cached response, or None if a new variant should be generated."""
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+                self.backend.delete(key)
+                entry = None
+            if entry is None or len(entry["variants"]) < self.variants_per_key:
+                self.misses += 1
+                return None
+            cursor = entry.get("cursor", 0)
+            entry["cursor"] = (cursor + 1) % len(entry["variants"])
+            self.backend.set(key, entry)
+            self.hits += 1
+            return entry["variants"][cursor]
+
+    def put(self, key: str, data: dict):
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                entry = {"variants": [], "created": time.time(), "cursor": 0}
+            if len(entry["variants"]) < self.variants_per_key:
+                entry["variants"].append(data)
+            self.backend.set(key, entry)
+            self.evictions += self.backend.evict(self.max_entries)
+
+    def peek(self, key: str, seen=None):
+        """Any unexpired variant for ``key``, even one not yet served; None if there is none.
+
+        Used when a fresh generation is not allowed. ``seen(variant)`` skips variants the caller has had.
+        """
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is None or time.time() - entry["created"] > self.ttl_seconds:
+                return None
+            return next((v for v in entry["variants"] if seen is None or not seen(v)), None)
+
+    def seed(self, key: str, variants: list, created: float = None) -> bool:
+        """Fill a key with variants generated elsewhere; True if the key can now be served.
+
+        Keys that already hold as many variants are left alone.
+        """
+        with self._lock:
+            entry = self.backend.get(key)
+            if entry is not None and time.time() - entry["created"] <= self.ttl_seconds \
+                    and len(entry["variants"]) >= len(variants):
+                return False
+            variants = variants[:self.variants_per_key]
+            self.backend.set(key, {"variants": variants, "created": created or time.time(), "cursor": 0})
+            self.evictions += self.backend.evict(self.max_entries)
+            return len(variants) >= self.variants_per_key
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.backend),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def create_backend(kind: str = "memory", path: str = "response_cache.sqlite3"):
+    if kind == "sqlite":
+        return SQLiteBackend(path)
+    if kind == "memory":
+        return MemoryBackend()
+    raise ValueError(f"Unknown cache backend: {kind}")
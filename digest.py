@@ -0,0 +1,343 @@
+"""Daily digest: pre-generated inspiration for every emotion profile, served without the model.
+
+Many users just want an affirmation for how they feel today. That does not
+need its own model call: ``analyze_user_emotion`` reduces any input to a
+profile (primary emotion, energy, main theme; see ``warm_pool.bucket``), and
+there are only ``len(PROFILES)`` of them. ``python digest.py build`` writes
+``variants`` message and quote payloads per profile for one day, generated
+at background priority by a bounded worker pool. ``python digest.py
+schedule`` does that every day at an off-peak hour.
+
+A day is one little-endian binary file, ``<DIGEST_DIR>/<YYYY-MM-DD>.digest``,
+made of 4-byte aligned sections in the layout of ``quotes.idx``:
+
+* ``meta`` - UTF-8 JSON: the date, the settings used and counts;
+* ``offsets`` - ``len(PROFILES) * len(KINDS) + 1`` uint32: the range of
+  ``spans`` holding the variants of each (profile, kind);
+* ``spans`` - (offset, length) uint32 pairs into ``payloads``;
+* ``payloads`` - each payload as zlib-compressed compact JSON.
+
+``Digest`` memory-maps a file, so serving one payload reads and inflates
+only that payload. Files are written to a temporary name and renamed, so a
+reader never sees half a day.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from datetime import date, datetime, timedelta
+
+from emotion import EMOTION_INDICATORS, THEME_INDICATORS
+from generation import GenerationError, GenerationSettings, stable_hash
+from metrics import DIGEST_SERVED
+from warm_pool import bucket, bucket_text
+
+logger = logging.getLogger(__name__)
+
+DIGEST_DIR = os.getenv("DIGEST_DIR", "digests")
+EMOTIONS = ["neutral", *EMOTION_INDICATORS]
+ENERGIES = ["low", "medium", "high"]
+THEMES = ["general", *THEME_INDICATORS]
+PROFILES = [(emotion, energy, theme) for emotion in EMOTIONS for energy in ENERGIES for theme in THEMES]
+_PROFILE_IDS = {profile: i for i, profile in enumerate(PROFILES)}
+KINDS = ("message", "quote")
+
+MAGIC = b"DGST"
+VERSION = 1
+SECTIONS = ("meta", "offsets", "spans", "payloads")
+_HEADER = struct.Struct("<4sII")
+_SECTION = struct.Struct("<II")
+
+
+def _u32(values) -> array:
+    arr = array("I", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def digest_path(day: date, directory: str = None) -> str:
+    return os.path.join(directory or DIGEST_DIR, f"{day.isoformat()}.digest")
+
+
+def build_digest(payloads: dict, meta: dict) -> bytes:
+    """Compile ``{(profile, kind): [payload, ...]}`` into the digest format."""
+    offsets, spans, blob = [0], [], bytearray()
+    for profile in PROFILES:
+        for kind in KINDS:
+            for payload in payloads.get((profile, kind), ()):
+                data = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(), 9)
+                spans.extend((len(blob), len(data)))
+                blob.extend(data)
+            offsets.append(len(spans) // 2)
+
+    sections = [
+        json.dumps(meta, sort_keys=True).encode(),
+        _u32(offsets).tobytes(),
+        _u32(spans).tobytes(),
+        bytes(blob),
+    ]
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, len(sections)))
+    table_at = len(out)
+    out.extend(b"\0" * _SECTION.size * len(sections))
+    table = []
+    for section in sections:
+        out.extend(b"\0" * (-len(out) % 4))
+        table.append((len(out), len(section)))
+        out.extend(section)
+    for i, entry in enumerate(table):
+        _SECTION.pack_into(out, table_at + i * _SECTION.size, *entry)
+    return bytes(out)
+
+
+def write_digest(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    # Readers that already mapped the old file keep their mapping
+    os.replace(tmp, path)
+
+
+class Digest:
+    """Read-only view of one day's digest."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION or count != len(SECTIONS):
+            raise ValueError("not a digest (or written by another version); rebuild it with `python digest.py build`")
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+            sections[name] = view[offset:offset + length]
+        self.meta = json.loads(bytes(sections["meta"]))
+        self.day = self.meta["date"]
+        if sys.byteorder == "big":
+            self._offsets = _u32(array("I", bytes(sections["offsets"])))
+            self._spans = _u32(array("I", bytes(sections["spans"])))
+        else:
+            self._offsets = sections["offsets"].cast("I")
+            self._spans = sections["spans"].cast("I")
+        self._payloads = sections["payloads"]
+        if len(self._offsets) != len(PROFILES) * len(KINDS) + 1:
+            raise ValueError("digest was written for a different set of profiles; rebuild it")
+
+    @classmethod
+    def open(cls, path: str) -> "Digest":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _range(self, profile: tuple, kind: str) -> tuple:
+        slot = _PROFILE_IDS[profile] * len(KINDS) + KINDS.index(kind)
+        return self._offsets[slot], self._offsets[slot + 1]
+
+    def variants(self, profile: tuple, kind: str) -> int:
+        start, end = self._range(profile, kind)
+        return end - start
+
+    def get(self, profile: tuple, kind: str, i: int) -> dict:
+        start, _ = self._range(profile, kind)
+        offset, length = self._spans[2 * (start + i)], self._spans[2 * (start + i) + 1]
+        return json.loads(zlib.decompress(self._payloads[offset:offset + length]))
+
+    def pick(self, user_text: str, kind: str, seed: str = ""):
+        """``(payload, match)`` for this text's profile, or ``(None, None)``.
+
+        ``seed`` (e.g. a session id) picks the variant, so one user keeps the
+        same inspiration all day. A profile whose generation failed falls back
+        to the same emotion without a theme, then to the neutral profile.
+        """
+        emotion, energy, theme = bucket(user_text or "")
+        for match, profile in (("profile", (emotion, energy, theme)), ("emotion", (emotion, energy, "general")),
+                               ("default", ("neutral", "medium", "general"))):
+            count = self.variants(profile, kind)
+            if count:
+                return self.get(profile, kind, stable_hash(f"{seed}:{self.day}:{kind}") % count), match
+        return None, None
+
+    def inspiration(self, user_text: str, mode: str, seed: str = ""):
+        """A payload for ``mode`` (message, quote or both) from the digest, or None."""
+        if mode == "both":
+            message, match = self.pick(user_text, "message", seed)
+            quote, _ = self.pick(user_text, "quote", seed)
+            if message is None and quote is None:
+                return None
+            data = {"type": "both", "message": message or {}, "quote": quote or {}}
+        else:
+            data, match = self.pick(user_text, mode, seed)
+            if data is None:
+                return None
+        DIGEST_SERVED.inc(mode=mode, match=match or "default")
+        return data
+
+    def summary(self) -> dict:
+        return {**self.meta, "bytes": len(self._buffer)}
+
+
+def latest_digest(day: date = None, directory: str = None, max_age_days: int = 2):
+    """Today's digest, or the newest of the previous ``max_age_days`` while today's is being built."""
+    day = day or date.today()
+    for age in range(max_age_days + 1):
+        path = digest_path(day - timedelta(days=age), directory)
+        if os.path.exists(path):
+            return Digest.open(path)
+    return None
+
+
+# -------------------- Building --------------------
+def generate_day(generator, settings: GenerationSettings, variants: int = 3, concurrency: int = 4,
+                 log=None) -> tuple:
+    """Generate ``variants`` payloads of each kind for every profile; returns ``(payloads, counts)``.
+
+    Calls run at background priority, so interactive traffic sharing the
+    admission buckets goes first.
+    """
+    log = log or (lambda message: None)
+    tasks = [(profile, kind) for profile in PROFILES for kind in KINDS for _ in range(variants)]
+    payloads, counts = {}, {"ok": 0, "failed": 0, "duplicates": 0}
+
+    def run(profile: tuple, kind: str) -> dict:
+        # Wait out an open circuit instead of recording a day of failures
+        while not generator.ready():
+            time.sleep(1.0)
+        return generator.generate_warm(bucket_text(profile), kind, settings)
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="digest") as pool:
+        futures = {pool.submit(run, *task): task for task in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            profile, kind = futures[future]
+            try:
+                payload = future.result()
+            except GenerationError as e:
+                counts["failed"] += 1
+                log(f"{'/'.join(profile)} {kind}: {e}")
+                continue
+            kept = payloads.setdefault((profile, kind), [])
+            if payload in kept:
+                counts["duplicates"] += 1
+            else:
+                kept.append(payload)
+                counts["ok"] += 1
+            if done % 50 == 0:
+                log(f"{done}/{len(tasks)} generated")
+    return payloads, counts
+
+
+def build_day(generator, day: date, settings: GenerationSettings, directory: str = None, variants: int = 3,
+              concurrency: int = 4, log=None) -> dict:
+    """Generate and write one day's digest; returns a report."""
+    started = time.perf_counter()
+    payloads, counts = generate_day(generator, settings, variants, concurrency, log)
+    meta = {"date": day.isoformat(), "created": round(time.time(), 3), "settings": asdict(settings),
+            "variants": variants, "profiles": len(PROFILES), **counts}
+    data = build_digest(payloads, meta)
+    path = digest_path(day, directory)
+    write_digest(path, data)
+    return {**counts, "path": path, "bytes": len(data), "elapsed_s": round(time.perf_counter() - started, 1)}
+
+
+def prune(directory: str = None, keep_days: int = 7, today: date = None) -> int:
+    """Delete digests older than ``keep_days``."""
+    directory = directory or DIGEST_DIR
+    cutoff = (today or date.today()) - timedelta(days=keep_days)
+    removed = 0
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        stem, ext = os.path.splitext(name)
+        try:
+            old = ext == ".digest" and date.fromisoformat(stem) < cutoff
+        except ValueError:
+            continue
+        if old:
+            os.remove(os.path.join(directory, name))
+            removed += 1
+    return removed
+
+
+def seconds_until(at: str, now: datetime = None) -> float:
+    """Seconds until the next local ``HH:MM``."""
+    now = now or datetime.now()
+    hour, minute = map(int, at.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def main():
+    from dotenv import load_dotenv
+    from generation import Generator
+
+    parser = argparse.ArgumentParser(description="Build and serve the daily digest of pre-generated inspiration.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, description in (("build", "generate one day's digest"),
+                              ("schedule", "build each day's digest at an off-peak hour")):
+        command = commands.add_parser(name, help=description)
+        command.add_argument("--dir", default=None, help=f"output directory (default: $DIGEST_DIR or {DIGEST_DIR})")
+        command.add_argument("--variants", type=int, default=int(os.getenv("DIGEST_VARIANTS", "3")),
+                             help="payloads of each kind per profile")
+        command.add_argument("--concurrency", type=int, default=int(os.getenv("DIGEST_CONCURRENCY", "4")),
+                             help="model calls in flight at once")
+        command.add_argument("--keep", type=int, default=7, help="days of digests to keep")
+        command.add_argument("--model")
+        command.add_argument("--tone")
+        command.add_argument("--length")
+        command.add_argument("--num-quotes", dest="num_quotes", type=int)
+    commands.choices["build"].add_argument("--date", type=date.fromisoformat, help="YYYY-MM-DD (default: today)")
+    commands.choices["build"].add_argument("--force", action="store_true", help="rebuild an existing digest")
+    commands.choices["schedule"].add_argument("--at", default=os.getenv("DIGEST_AT", "02:00"),
+                                              help="local time to build each day's digest (HH:MM)")
+    show = commands.add_parser("show", help="print the inspiration a digest serves for a text")
+    show.add_argument("text", nargs="?", default="")
+    show.add_argument("--mode", default="message", choices=("message", "quote", "both"))
+    show.add_argument("--dir", default=None)
+    args = parser.parse_args()
+
+    if args.command == "show":
+        digest = latest_digest(directory=args.dir)
+        if digest is None:
+            print("no digest for today; run `python digest.py build`", file=sys.stderr)
+            return 1
+        print(json.dumps({"digest": digest.summary(), "inspiration": digest.inspiration(args.text, args.mode)},
+                         indent=2, ensure_ascii=False))
+        return 0
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    settings = GenerationSettings.from_dict({k: getattr(args, k) for k in ("model", "tone", "length", "num_quotes")
+                                             if getattr(args, k) is not None})
+    generator = Generator.from_env()
+
+    def build(day: date):
+        report = build_day(generator, day, settings, args.dir, args.variants, args.concurrency, log=logger.info)
+        logger.info("%s: %d payloads, %d failed, %d duplicates, %.1f KiB in %ss", report["path"], report["ok"],
+                    report["failed"], report["duplicates"], report["bytes"] / 1024, report["elapsed_s"])
+        prune(args.dir, args.keep, day)
+        return report
+
+    if args.command == "build":
+        day = args.date or date.today()
+        if os.path.exists(digest_path(day, args.dir)) and not args.force:
+            print(f"{digest_path(day, args.dir)} exists; use --force to rebuild", file=sys.stderr)
+            return 0
+        return 1 if build(day)["ok"] == 0 else 0
+
+    while True:
+        if not os.path.exists(digest_path(date.today(), args.dir)):
+            build(date.today())
+        wait = seconds_until(args.at)
+        logger.info("next digest in %.0f s (at %s)", wait, args.at)
+        time.sleep(wait)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
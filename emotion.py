@@ -0,0 +1,155 @@
+"""Keyword-based emotion, energy and theme analysis for user input.
+
+All keyword tables are compiled once at import into one regular expression
+over every keyword, factored into a trie so the engine tries at most one
+branch per character, and a table mapping each keyword to the categories
+it implies. One analysis is a single pass over the text instead of a
+separate scan per keyword. Results are memoized per normalized text, which
+makes the repeated calls made during one generation effectively free.
+"""
+import re
+from functools import lru_cache
+
+EMOTION_INDICATORS = {
+    'excited': ['excited', 'thrilled', 'amazing', 'fantastic', 'awesome', 'great news', 'celebration', 'happy', 'joy'],
+    'sad': ['sad', 'depressed', 'down', 'crying', 'hurt', 'heartbroken', 'devastated', 'miserable'],
+    'anxious': ['anxious', 'worried', 'nervous', 'stress', 'fear', 'panic', 'overwhelmed', 'scared'],
+    'angry': ['angry', 'frustrated', 'mad', 'upset', 'annoyed', 'furious', 'irritated'],
+    'confused': ['confused', 'lost', 'unsure', 'doubt', 'uncertain', 'don\'t know', 'unclear'],
+    'tired': ['tired', 'exhausted', 'burnout', 'drained', 'worn out'],
+    'hopeful': ['hopeful', 'optimistic', 'looking forward', 'positive', 'motivated'],
+    'grateful': ['grateful', 'thankful', 'blessed', 'appreciate', 'lucky']
+}
+
+ENERGY_INDICATORS = {
+    'high': ['excited', 'thrilled', 'amazing', 'fantastic', 'angry', 'furious', 'panic'],
+    'low': ['tired', 'exhausted', 'sad', 'down', 'drained'],
+}
+
+THEME_INDICATORS = {
+    'work': ['work', 'job', 'career', 'boss', 'colleague'],
+    'relationships': ['relationship', 'partner', 'family', 'friend'],
+    'health': ['health', 'sick', 'medical', 'doctor'],
+    'finances': ['money', 'financial', 'debt', 'expensive'],
+    'education': ['school', 'study', 'exam', 'college', 'university'],
+}
+
+GREETINGS = ['hi', 'hello', 'hey', 'good morning', 'good afternoon']
+GREETING_MAX_LENGTH = 20
+
+# Every category gets one bit; order matters because the primary emotion is
+# the first detected emotion in EMOTION_INDICATORS order.
+_CATEGORIES = (
+    [('emotion', name) for name in EMOTION_INDICATORS]
+    + [('energy', name) for name in ENERGY_INDICATORS]
+    + [('theme', name) for name in THEME_INDICATORS]
+    + [('greeting', 'greeting')]
+)
+_BITS = {category: 1 << i for i, category in enumerate(_CATEGORIES)}
+
+
+def _compile_keyword_table():
+    """Map each unique keyword to the bitmask of every category it implies."""
+    masks = {}
+    groups = (
+        [(('emotion', k), v) for k, v in EMOTION_INDICATORS.items()]
+        + [(('energy', k), v) for k, v in ENERGY_INDICATORS.items()]
+        + [(('theme', k), v) for k, v in THEME_INDICATORS.items()]
+        + [(('greeting', 'greeting'), GREETINGS)]
+    )
+    for category, keywords in groups:
+        for keyword in keywords:
+            masks[keyword] = masks.get(keyword, 0) | _BITS[category]
+    # A match stands for every keyword inside it too ("relationship" contains
+    # "hi"), so its mask absorbs theirs.
+    implied = {}
+    for keyword, mask in masks.items():
+        for other, other_mask in masks.items():
+            if other in keyword:
+                mask |= other_mask
+        implied[keyword] = mask
+    return implied
+
+
+def _resume_offsets(keywords) -> dict:
+    """Where to look again after each keyword matches: the first offset at which a
+    longer keyword could start inside it and run past its end, else its length."""
+    offsets = {}
+    for keyword in keywords:
+        offsets[keyword] = next((i for i in range(1, len(keyword))
+                                 if any(other.startswith(keyword[i:]) and len(other) > len(keyword) - i
+                                        for other in keywords)), len(keyword))
+    return offsets
+
+
+def _trie_pattern(keywords) -> str:
+    """An alternation over ``keywords`` with shared prefixes factored out; longest match first."""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+_KEYWORD_MASKS = _compile_keyword_table()
+_KEYWORD_RESUME = _resume_offsets(_KEYWORD_MASKS)
+_KEYWORD_RE = re.compile(_trie_pattern(_KEYWORD_MASKS))
+
+
+def normalize_text(user_text: str) -> str:
+    return user_text.lower().strip()
+
+
+def _scan(text: str) -> int:
+    """Return the bitmask of all categories whose keywords occur in ``text``."""
+    found = 0
+    search = _KEYWORD_RE.search
+    match = search(text)
+    while match:
+        keyword = match.group()
+        found |= _KEYWORD_MASKS[keyword]
+        # Keywords inside the match are already in its mask; one overlapping its end is not
+        match = search(text, match.start() + _KEYWORD_RESUME[keyword])
+    return found
+
+
+@lru_cache(maxsize=1024)
+def _analyze_normalized(text: str) -> tuple:
+    found = _scan(text)
+    emotions = tuple(name for name in EMOTION_INDICATORS if found & _BITS[('emotion', name)])
+    if found & _BITS[('energy', 'high')]:
+        energy_level = 'high'
+    elif found & _BITS[('energy', 'low')]:
+        energy_level = 'low'
+    else:
+        energy_level = 'medium'
+    themes = tuple(name for name in THEME_INDICATORS if found & _BITS[('theme', name)])
+    is_greeting = len(text) < GREETING_MAX_LENGTH and bool(found & _BITS[('greeting', 'greeting')])
+    return emotions, energy_level, themes, is_greeting
+
+
+def analyze_user_emotion(user_text: str) -> dict:
+    """Analyze user's emotional state and context"""
+    emotions, energy_level, themes, is_greeting = _analyze_normalized(normalize_text(user_text))
+    return {
+        'primary_emotion': emotions[0] if emotions else 'neutral',
+        'all_emotions': list(emotions),
+        'energy_level': energy_level,
+        'themes': list(themes),
+        'text_length': len(user_text),
+        'is_greeting': is_greeting
+    }
+
+
+def clear_cache():
+    _analyze_normalized.cache_clear()
@@ -0,0 +1,998 @@
+"""Generation core shared by the Streamlit app, the HTTP API and batch jobs.
+
+Everything here takes its inputs explicitly (text, ``GenerationSettings``,
+an optional per-user ``ResponseHistory``) instead of reading Streamlit
+widgets or session state, so it can be imported and driven from any
+front end. ``Generator`` owns the long-lived pieces: the Gemini client and
+its connection pool, the response cache, the resilient request executor and
+the worker pool used to run generations concurrently.
+
+The Gemini SDK and NumPy are imported when the first ``Generator`` is built
+(see ``genai_sdk``), not when this module is, to keep cold starts short.
+"""
+import copy
+import hashlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from functools import lru_cache, partial
+
+from admission import BACKGROUND, BATCH, INTERACTIVE, AdmissionController, create_buckets, current_request, \
+    request_scope
+from cache import ResponseCache, create_backend, make_cache_key
+from emotion import analyze_user_emotion
+from metrics import (CACHE_LOOKUPS, COALESCED, DEADLINE_FALLBACKS, ERRORS, FALLBACKS, MODEL_LATENCY, PARSE_FAILURES,
+                     REGISTRY, ROUTES, WARM_POOL_HITS, current_context, span)
+from parsing import parse_loose_json, response_schema, validate_payload
+from prompt_cache import PromptCache
+from quotes import load_quote_index
+from replay import Recorder, RecordingClient, ReplayClient
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, RequestExecutor, status_code
+from routing import AUTO_MODEL, DEFAULT_TIERS, ModelRouter, Route
+from singleflight import SingleFlight
+from store import create_store, make_record
+from warm_pool import WarmPool
+from streaming import JSONFieldStream
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# "auto" lets the router pick per request; the rest are its tiers, fastest first
+MODELS = [AUTO_MODEL, *DEFAULT_TIERS]
+TONES = ["adaptive", "inspiring", "empathetic", "energetic", "calm", "practical", "philosophical"]
+LENGTHS = ["concise", "detailed", "comprehensive", "extensive"]
+MODES = ["message", "quote", "both"]
+QUOTE_RETRIEVAL_MODES = ["off", "context", "local"]
+
+# Output token ceilings per length setting; quote shapes get an allowance per quote on top
+OUTPUT_TOKEN_BUDGETS = {"concise": 1536, "detailed": 2560, "comprehensive": 3584, "extensive": 4608}
+QUOTE_TOKEN_ALLOWANCE = 80
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationError(Exception):
+    """The model could not be reached or every attempt failed."""
+
+
+class GenerationCancelled(GenerationError):
+    """The caller cancelled the request before it finished."""
+
+
+def check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise GenerationCancelled("Request cancelled")
+
+
+def genai_sdk() -> tuple:
+    """``(genai, types)`` from google-genai, imported on first use.
+
+    The SDK is most of a cold start (about 0.7 s to import), so front ends can
+    import this module and render before anything is generated.
+    """
+    from google import genai
+    from google.genai import types
+    return genai, types
+
+
+@lru_cache(maxsize=None)
+def load_asset(name: str) -> str:
+    with open(os.path.join(ASSETS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def parse_budgets(spec: str) -> dict:
+    """``"concise=1024,detailed=2048"`` -> OUTPUT_TOKEN_BUDGETS with those lengths overridden."""
+    budgets = dict(OUTPUT_TOKEN_BUDGETS)
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        length, _, tokens = item.partition("=")
+        if length.strip() not in budgets:
+            raise ValueError(f"Unknown length in token budgets: {length}")
+        budgets[length.strip()] = int(tokens)
+    return budgets
+
+
+@dataclass(frozen=True)
+class GenerationSettings:
+    """Every user-facing setting that changes the prompt or generation config."""
+    model: str = MODELS[0]
+    mode: str = "message"
+    tone: str = "adaptive"
+    length: str = "detailed"
+    num_quotes: int = 5
+    creativity: float = 0.9
+    personalization_strength: int = 5
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GenerationSettings":
+        """Build settings from untrusted input (e.g. an API request), raising ValueError if invalid."""
+        defaults = cls(model=os.getenv("GEMINI_MODEL", MODELS[0]))
+        unknown = set(data) - set(asdict(defaults))
+        if unknown:
+            raise ValueError(f"Unknown setting(s): {', '.join(sorted(unknown))}")
+        settings = replace(defaults, **data)
+        if settings.mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        if settings.tone not in TONES:
+            raise ValueError(f"tone must be one of {TONES}")
+        if settings.length not in LENGTHS:
+            raise ValueError(f"length must be one of {LENGTHS}")
+        if not isinstance(settings.model, str) or not settings.model:
+            raise ValueError("model must be a model name")
+        try:
+            settings = replace(
+                settings,
+                num_quotes=int(settings.num_quotes),
+                creativity=float(settings.creativity),
+                personalization_strength=int(settings.personalization_strength),
+            )
+        except (TypeError, ValueError):
+            raise ValueError("num_quotes, creativity and personalization_strength must be numbers")
+        if not 3 <= settings.num_quotes <= 10:
+            raise ValueError("num_quotes must be between 3 and 10")
+        if not 0.1 <= settings.creativity <= 1.0:
+            raise ValueError("creativity must be between 0.1 and 1.0")
+        if not 1 <= settings.personalization_strength <= 5:
+            raise ValueError("personalization_strength must be between 1 and 5")
+        return settings
+
+    def cache_fields(self, requested_mode: str) -> dict:
+        """Settings for one request shape, as used in cache keys."""
+        return {**asdict(self), "mode": requested_mode}
+
+
+# -------------------- Enhanced Prompt Building --------------------
+def create_context_hash(user_text: str) -> str:
+    """Create a unique hash based on user input to track response uniqueness"""
+    return hashlib.md5(user_text.lower().strip().encode()).hexdigest()[:8]
+
+
+def stable_hash(text: str) -> int:
+    """A 64-bit hash that, unlike ``hash()``, is the same in every process."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def seeded_rng(seed, *parts):
+    """A ``random.Random`` derived from ``seed`` and ``parts``, or the shared ``random`` module if seed is None."""
+    if seed is None:
+        return random
+    return random.Random(stable_hash(":".join(map(str, (seed, *parts)))))
+
+
+def system_instruction() -> str:
+    """The static part of every prompt; identical across requests so it can be cached."""
+    return load_asset("system_prompt.txt").strip()
+
+
+def build_instruction(user_text: str, requested_mode: str, settings: GenerationSettings, history=None,
+                      quotes=None, seed: int = None) -> str:
+    """The per-request part of the prompt; the rules live in ``system_instruction()``.
+
+    With a ``seed`` the prompt is the same for the same inputs in every process.
+    """
+    # Analyze user's emotional context
+    emotion_analysis = analyze_user_emotion(user_text)
+    
+    # Create unique context hash
+    context_hash = create_context_hash(user_text)
+    
+    # Add randomization seed
+    random_seed = seeded_rng(seed, "prompt", context_hash, requested_mode).randint(1000, 9999)
+    
+    tone = settings.tone if settings.tone != 'adaptive' else f"adaptive (match their {emotion_analysis['primary_emotion']} energy)"
+    lines = [
+        f"UNIQUE RESPONSE ID: {context_hash}-{random_seed}",
+        f'USER\'S EXACT WORDS: "{user_text}"',
+        f"ANALYSIS: primary emotion={emotion_analysis['primary_emotion']}; energy={emotion_analysis['energy_level']}; "
+        f"themes={', '.join(emotion_analysis['themes']) or 'general'}; "
+        f"message type={'greeting' if emotion_analysis['is_greeting'] else 'substantive'}",
+        f"STYLE: tone={tone}; length={settings.length}; creativity boost={settings.creativity}; "
+        f"personalization={settings.personalization_strength}/5",
+    ]
+
+    # Spell out what this user has already received for the same input
+    avoid = []
+    for previous in history.recent_summaries(context_hash) if history is not None else []:
+        avoid += [previous[k] for k in ("mantra", "daily_affirmation", "theme") if k in previous]
+        avoid += previous.get("quotes", [])
+    if avoid:
+        lines.append("ALREADY USED:")
+        lines += [f"- {item[:120]}" for item in avoid[:12]]
+
+    if quotes:
+        # The quotes come from the local corpus, so the model only writes what ties them to this user
+        requested_mode = "quote_context"
+        lines.append("CURATED QUOTES:")
+        lines += [f'{i}. "{q["quote"]}" — {q["author"]}' for i, q in enumerate(quotes, 1)]
+
+    lines.append(f"MODE: {requested_mode}")
+    lines.append(f"NUMBER OF QUOTES: {len(quotes) if quotes else settings.num_quotes}")
+    return "\n".join(lines)
+
+
+def build_fallback(user_text: str, requested_mode: str, quotes=None) -> dict:
+    """Create truly personalized fallback based on user's actual input
+
+    ``quotes`` retrieved from the local corpus replace the built-in ones.
+    """
+    emotion_analysis = analyze_user_emotion(user_text)
+    
+    if requested_mode == "message":
+        # Personalized fallback based on their input
+        motivation_text = f"I hear you when you say '{user_text[:100]}{'...' if len(user_text) > 100 else ''}'. "
+        
+        if emotion_analysis['primary_emotion'] == 'excited':
+            motivation_text += "Your excitement is contagious! This energy you're feeling is powerful - it's the fuel of achievement."
+        elif emotion_analysis['primary_emotion'] == 'sad':
+            motivation_text += "I can feel the heaviness in your words, and I want you to know that it's okay to feel this way."
+        elif emotion_analysis['primary_emotion'] == 'anxious':
+            motivation_text += "I understand that anxiety can feel overwhelming, but you're stronger than you realize."
+        elif emotion_analysis['is_greeting']:
+            motivation_text = "Hello there! I'm so glad you reached out today. How are you really feeling right now?"
+        else:
+            motivation_text += "Your situation is unique, and you deserve support that truly understands what you're going through."
+        
+        data = {
+            "type": "message",
+            "motivation": motivation_text,
+            "steps": [
+                f"Reflect on what you just shared: '{user_text[:50]}{'...' if len(user_text) > 50 else ''}'",
+                f"Focus on your {emotion_analysis['primary_emotion']} feelings and what they're telling you",
+                "Take one small action that aligns with your current emotional state",
+                "Practice self-compassion as you navigate this moment"
+            ],
+            "mantra": f"I honor my {emotion_analysis['primary_emotion']} feelings and trust my journey",
+            "quotes": [
+                {"quote": "The only way to do great work is to love what you do.", "author": "Steve Jobs", "context": f"This resonates with your {emotion_analysis['primary_emotion']} energy"},
+                {"quote": "Success is not final, failure is not fatal: it is the courage to continue that counts.", "author": "Winston Churchill", "context": "Speaks to the resilience I see in your message"}
+            ],
+            "reflection_questions": [
+                f"What does your {emotion_analysis['primary_emotion']} feeling tell you about what you need right now?",
+                f"How can you honor the situation you described: '{user_text[:30]}{'...' if len(user_text) > 30 else ''}'?",
+                "What would self-compassion look like in this moment?"
+            ],
+            "daily_affirmation": f"I trust my {emotion_analysis['primary_emotion']} feelings and my ability to navigate this situation"
+        }
+        if quotes:
+            data["quotes"] = [
+                {"quote": q["quote"], "author": q["author"], "context": f"Chosen for the {emotion_analysis['primary_emotion']} feelings in your message"}
+                for q in quotes[:2]
+            ]
+    else:
+        data = {
+            "type": "quote",
+            "quotes": [
+                {"quote": "The future belongs to those who believe in the beauty of their dreams.", "author": "Eleanor Roosevelt", "context": f"This speaks to the {emotion_analysis['primary_emotion']} energy in your message", "category": "motivation"},
+                {"quote": "It does not matter how slowly you go as long as you do not stop.", "author": "Confucius", "context": "Perfectly fits your current situation", "category": "wisdom"}
+            ],
+            "reflection": f"Your words '{user_text[:100]}{'...' if len(user_text) > 100 else ''}' reveal someone who is {emotion_analysis['primary_emotion']} and seeking guidance. These quotes speak directly to your emotional state.",
+            "theme": f"Navigating {emotion_analysis['primary_emotion']} feelings with wisdom",
+            "application": f"Use these quotes to guide you through your current {emotion_analysis['primary_emotion']} experience"
+        }
+        if quotes:
+            data["quotes"] = [
+                dict(q, context=q.get("context") or f"Chosen for the {emotion_analysis['primary_emotion']} feelings in your message")
+                for q in quotes
+            ]
+    return data
+
+
+def is_fallback(data) -> bool:
+    """True if a payload (or either half of a "both" payload) is a fallback for a failed model call."""
+    if not isinstance(data, dict):
+        return False
+    return bool(data.get("fallback")) or any(is_fallback(data.get(k)) for k in ("message", "quote"))
+
+
+def merge_quote_context(quotes: list, data: dict) -> dict:
+    """Combine retrieved quotes with a (possibly partial) quote_context payload into the quote shape."""
+    contexts = data.get("contexts") or []
+    merged = {"type": "quote", "quotes": [
+        dict(q, context=contexts[i]) if i < len(contexts) and isinstance(contexts[i], str) else dict(q)
+        for i, q in enumerate(quotes)
+    ]}
+    merged.update({k: data[k] for k in ("reflection", "theme", "application") if k in data})
+    return merged
+
+
+def shuffle_quotes(data: dict, rng=random) -> dict:
+    """A copy of a payload with its quotes in a different order, for responses shared between users."""
+    data = copy.deepcopy(data)
+    if isinstance(data.get("quotes"), list):
+        rng.shuffle(data["quotes"])
+    return data
+
+
+def quotes_only(data: dict) -> dict:
+    """The parts of a quote payload that do not repeat the user's words, for reuse with other users."""
+    return {"type": "quote", "quotes": [{k: q[k] for k in ("quote", "author", "category") if k in q}
+                                        for q in data.get("quotes") or []]}
+
+
+def output_token_budget(requested_mode: str, settings: GenerationSettings, budgets: dict = None) -> int:
+    budget = (budgets or OUTPUT_TOKEN_BUDGETS)[settings.length]
+    if requested_mode in ("quote", "quote_context"):
+        budget += settings.num_quotes * QUOTE_TOKEN_ALLOWANCE
+    return budget
+
+
+def generation_config(user_text: str, requested_mode: str, settings: GenerationSettings, json_mode: bool = True,
+                      budgets: dict = None) -> dict:
+    """Sampling parameters for one request, as keyword arguments for GenerateContentConfig."""
+    # Enhanced temperature calculation for more variety
+    base_temp = max(0.8, settings.creativity)
+    
+    # Add randomization based on content
+    content_hash = stable_hash(user_text) % 100
+    temp_variance = (content_hash / 100) * 0.2  # 0.0 to 0.2 variance
+    
+    emotion_analysis = analyze_user_emotion(user_text)
+    
+    # Adjust temperature based on emotional context
+    if emotion_analysis['primary_emotion'] in ['excited', 'happy']:
+        temp = min(1.0, base_temp + 0.1 + temp_variance)
+    elif emotion_analysis['primary_emotion'] in ['sad', 'anxious']:
+        temp = max(0.7, base_temp - 0.1 + temp_variance)
+    else:
+        temp = base_temp + temp_variance
+    
+    return dict(
+        temperature=temp,
+        max_output_tokens=output_token_budget(requested_mode, settings, budgets),
+        candidate_count=1,
+        top_p=0.95,
+        top_k=40,  # Add top_k for more variety
+        response_mime_type="application/json" if json_mode else None,
+        response_schema=response_schema(requested_mode) if json_mode else None,
+    )
+
+
+# -------------------- Generator --------------------
+class Generator:
+    def __init__(self, client, response_cache: ResponseCache = None, request_executor: RequestExecutor = None,
+                 workers: int = 8, json_mode: bool = True, repeat_threshold: float = 0.5,
+                 quote_index=None, quote_retrieval: str = "context", prompt_cache: PromptCache = None,
+                 output_budgets: dict = None, single_flight: SingleFlight = None, coalesce_shuffle: bool = True,
+                 router: ModelRouter = None, warm_pool: bool = False, warm_pool_options: dict = None,
+                 result_store=None, admission: AdmissionController = None,
+                 semantic_cache=None, seed: int = None):
+        self.client = client
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.request_executor = request_executor if request_executor is not None else RequestExecutor()
+        self.json_mode = json_mode
+        # Estimated similarity above which a response counts as a repeat for a history
+        self.repeat_threshold = repeat_threshold
+        # Quote mode draws quotes from the local corpus: "context" has the model explain
+        # them, "local" skips the model entirely; "off" (or no index) generates them
+        self.quote_index = quote_index
+        self.quote_retrieval = quote_retrieval if quote_index is not None else "off"
+        # Explicit context caching of the system prompt; None sends it inline on every request
+        self.prompt_cache = prompt_cache
+        self.output_budgets = output_budgets or dict(OUTPUT_TOKEN_BUDGETS)
+        # Concurrent identical requests share one model call; waiters get the quotes reshuffled
+        self.single_flight = single_flight
+        self.coalesce_shuffle = coalesce_shuffle
+        # Picks the model per request and the deadline before falling back to a faster one
+        self.router = router
+        # Pre-generated responses for generic inputs, refilled in the background
+        self.warm_pool = WarmPool(self.generate_warm, ready=self.ready, **(warm_pool_options or {})) \
+            if warm_pool else None
+        # Every generated response, persisted for other processes and later restarts (see store.py)
+        self.result_store = result_store
+        # Token buckets every model call must pass; denied requests are answered without the model
+        self.admission = admission
+        # Reuses the quotes of responses to reworded quote-mode inputs with the same mood and settings
+        self.semantic_cache = semantic_cache
+        # Seeded mode: prompts, quote picks and shuffles depend only on the inputs and this seed
+        self.seed = seed
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation")
+        # Tokens billed across all requests, including retries and hedges, in total and per length
+        self.usage = {"requests": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0}
+        self.usage_by_length = {}
+        self._usage_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, api_key: str = None) -> "Generator":
+        """Build a generator configured from environment variables (see README)."""
+        api_key = api_key or os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        replay_path = os.getenv("GEMINI_REPLAY")
+        if not api_key and not replay_path:
+            raise GenerationError("No GEMINI_API_KEY configured")
+        # NumPy is only needed once a generator exists
+        from semantic_cache import SemanticCache
+
+        attempt_timeout = float(os.getenv("GEMINI_ATTEMPT_TIMEOUT", "60"))
+        if replay_path:
+            # Answers from a recorded log, without network access (see replay.py)
+            client = ReplayClient.open(replay_path, speed=float(os.getenv("GEMINI_REPLAY_SPEED", "0")))
+        else:
+            genai, types = genai_sdk()
+            # GEMINI_BASE_URL points the SDK at another endpoint, e.g. benchmarks/fake_gemini.py
+            http_options = types.HttpOptions(
+                base_url=os.getenv("GEMINI_BASE_URL") or None,
+                timeout=int(attempt_timeout * 1000),
+            )
+            client = genai.Client(api_key=api_key, http_options=http_options)
+        if os.getenv("GEMINI_RECORD"):
+            client = RecordingClient(client, Recorder(os.getenv("GEMINI_RECORD")))
+        response_cache = ResponseCache(
+            max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600))),
+            variants_per_key=int(os.getenv("RESPONSE_CACHE_VARIANTS", "3")),
+            backend=create_backend(
+                os.getenv("RESPONSE_CACHE_BACKEND", "memory"),
+                os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3"),
+            ),
+        )
+        request_executor = RequestExecutor(
+            attempt_timeout=attempt_timeout,
+            max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8")),
+            hedge=env_flag("GEMINI_HEDGE"),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("GEMINI_BREAKER_THRESHOLD", "5")),
+                reset_after=float(os.getenv("GEMINI_BREAKER_RESET", "30")),
+            ),
+        )
+        generator = cls(
+            client,
+            response_cache=response_cache,
+            request_executor=request_executor,
+            workers=int(os.getenv("GENERATION_WORKERS", "8")),
+            # Ask the model for schema-constrained JSON so responses need no repair
+            json_mode=env_flag("GEMINI_JSON_MODE", "true"),
+            repeat_threshold=float(os.getenv("HISTORY_REPEAT_THRESHOLD", "0.5")),
+            quote_index=load_quote_index(),
+            quote_retrieval=os.getenv("QUOTE_RETRIEVAL", "context"),
+            prompt_cache=PromptCache(
+                client,
+                ttl_seconds=float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600")),
+            ) if env_flag("GEMINI_CONTEXT_CACHE", "true") and not replay_path else None,
+            output_budgets=parse_budgets(os.getenv("GEMINI_OUTPUT_BUDGETS", "")),
+            single_flight=SingleFlight() if env_flag("GEMINI_COALESCE", "true") else None,
+            coalesce_shuffle=env_flag("GEMINI_COALESCE_SHUFFLE", "true"),
+            router=ModelRouter(
+                tiers=[m.strip() for m in os.getenv("ROUTER_TIERS", ",".join(DEFAULT_TIERS)).split(",") if m.strip()],
+                slo_seconds=float(os.getenv("ROUTER_SLO_SECONDS", "20")),
+                local_greetings=env_flag("ROUTER_LOCAL_GREETINGS", "true"),
+            ) if env_flag("ROUTER_ENABLED", "true") else None,
+            semantic_cache=SemanticCache(
+                threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.7")),
+                max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "1000000")),
+            ) if env_flag("SEMANTIC_CACHE", "true") else None,
+            warm_pool=env_flag("WARM_POOL", "false"),
+            seed=int(os.getenv("GENERATION_SEED")) if os.getenv("GENERATION_SEED") else None,
+            warm_pool_options=dict(
+                per_key=int(os.getenv("WARM_POOL_SIZE", "2")),
+                ttl_seconds=float(os.getenv("WARM_POOL_TTL", "3600")),
+                max_keys=int(os.getenv("WARM_POOL_MAX_KEYS", "64")),
+            ),
+        )
+        if env_flag("ADMISSION_ENABLED", "true"):
+            generator.admission = AdmissionController(
+                buckets=create_buckets(os.getenv("ADMISSION_STORE", "sqlite"),
+                                       os.getenv("ADMISSION_PATH", "admission.sqlite3")),
+                global_rate=float(os.getenv("ADMISSION_GLOBAL_TOKENS_PER_MIN", "250000")) / 60,
+                global_capacity=float(os.getenv("ADMISSION_GLOBAL_BURST", "250000")),
+                session_rate=float(os.getenv("ADMISSION_SESSION_TOKENS_PER_MIN", "20000")) / 60,
+                session_capacity=float(os.getenv("ADMISSION_SESSION_BURST", "20000")),
+                max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "32")),
+                max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "10")),
+            )
+        store_kind = os.getenv("RESULT_STORE", "sqlite")
+        generator.result_store = create_store(
+            store_kind,
+            os.getenv("RESULT_STORE_URL", "redis://127.0.0.1:6379/0") if store_kind == "redis"
+            else os.getenv("RESULT_STORE_PATH", "results.sqlite3"),
+            batch_size=int(os.getenv("RESULT_STORE_BATCH", "64")),
+            flush_seconds=float(os.getenv("RESULT_STORE_FLUSH_SECONDS", "1")),
+            max_age_seconds=float(os.getenv("RESULT_STORE_MAX_AGE", str(7 * 86400))),
+            max_records=int(os.getenv("RESULT_STORE_MAX_RECORDS", "100000")),
+            compact_seconds=float(os.getenv("RESULT_STORE_COMPACT_SECONDS", "600")),
+        )
+        # Keyed, so a generator rebuilt by prewarm.clear() replaces its predecessor's series
+        REGISTRY.register_collector(generator.collect_metrics, key="generator")
+        return generator
+
+    def ready(self) -> bool:
+        """True when requests would be sent upstream rather than short-circuited."""
+        return self.request_executor.breaker.state != "open"
+
+    def collect_metrics(self) -> list:
+        """Executor and token counters in the ``Registry.register_collector`` format."""
+        executor = self.request_executor.stats
+        metrics = [
+            ("motivator_model_" + name, "counter", f"Model request executor {name.replace('_', ' ')}.",
+             [({}, executor[name])])
+            for name in executor
+        ]
+        with self._usage_lock:
+            by_length = {length: dict(totals) for length, totals in self.usage_by_length.items()}
+        metrics += [
+            ("motivator_" + name, "counter", f"Billed {name.replace('_', ' ')} by length setting.",
+             [({"length": length}, totals[name]) for length, totals in sorted(by_length.items())])
+            for name in ("input_tokens", "cached_tokens", "output_tokens")
+        ]
+        metrics.append(("motivator_circuit_open", "gauge", "1 while the upstream circuit breaker is open.",
+                        [({}, int(not self.ready()))]))
+        return metrics
+
+    def record_usage(self, resp, settings: GenerationSettings = None, shape: str = None, seconds: float = None):
+        """Add a response's ``usage_metadata`` to the token totals and log it."""
+        usage = getattr(resp, "usage_metadata", None)
+        # Cached tokens are part of the prompt count; they are tracked separately to show the savings
+        counts = {
+            "input_tokens": (usage.prompt_token_count or 0) if usage else 0,
+            "cached_tokens": (usage.cached_content_token_count or 0) if usage else 0,
+            "output_tokens": (usage.candidates_token_count or 0) if usage else 0,
+        }
+        with self._usage_lock:
+            totals = [self.usage]
+            if settings is not None:
+                totals.append(self.usage_by_length.setdefault(settings.length, dict.fromkeys(self.usage, 0)))
+            for total in totals:
+                total["requests"] += 1
+                for name, value in counts.items():
+                    total[name] += value
+        logger.info(
+            "tokens model=%s mode=%s length=%s input=%d cached=%d output=%d seconds=%s",
+            settings.model if settings else "?", shape, settings.length if settings else "?",
+            counts["input_tokens"], counts["cached_tokens"], counts["output_tokens"],
+            f"{seconds:.2f}" if seconds is not None else "?",
+        )
+
+    def route(self, user_text: str, settings: GenerationSettings) -> Route:
+        """Models to try for this request, in order (see ``routing.py``)."""
+        if self.router is not None:
+            return self.router.route(user_text, settings.model)
+        return Route((DEFAULT_TIERS[0] if settings.model == AUTO_MODEL else settings.model,))
+
+    def retrieve_quotes(self, user_text: str, k: int, history=None) -> list:
+        """Quotes from the local corpus for this text, skipping ones the user has already seen."""
+        if self.quote_index is None:
+            return []
+        seen = []
+        if history is not None:
+            for previous in history.recent_summaries(create_context_hash(user_text)):
+                seen += previous.get("quotes", [])
+        return self.quote_index.for_text(user_text, k, exclude=seen,
+                                         rng=seeded_rng(self.seed, "quotes", user_text, len(seen)))
+
+    def stream_response(self, model: str, prompt: str, cfg, on_update, cancel=None, stop=None) -> tuple:
+        """Stream the generation, passing partially decoded fields to on_update as they arrive.
+
+        Returns the full text and the final chunk, which carries the usage totals.
+        Setting ``cancel`` (the caller's) or ``stop`` (the executor's, once it has
+        given up on this attempt) closes the stream at the next chunk.
+        """
+        fields = JSONFieldStream()
+        partial = {}
+        chunk = None
+        stream = self.client.models.generate_content_stream(
+            model=model,
+            contents=prompt,
+            config=cfg,
+        )
+        try:
+            for chunk in stream:
+                check_cancelled(cancel)
+                check_cancelled(stop)
+                events = fields.feed(getattr(chunk, "text", None) or "")
+                if events:
+                    for key, value, _complete in events:
+                        partial[key] = value
+                    on_update(dict(partial))
+        finally:
+            # Closed here rather than when the generator is collected, so the connection and the
+            # token spend end now
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        return fields.buffer.strip(), chunk
+
+    def call_gemini(self, user_text: str, requested_mode: str, settings: GenerationSettings,
+                    history=None, on_update=None, cancel=None, fallback_ok: bool = True) -> dict:
+        """Generate one payload shape; raises GenerationError if the model cannot be reached.
+
+        ``on_update`` receives partial payloads while the response streams. It is
+        called from a worker thread. Setting the ``cancel`` event stops the
+        request before the model call or at the next streamed chunk and raises
+        GenerationCancelled. With ``fallback_ok=False`` a request that gets no
+        model response (denied, circuit open, unparseable) raises
+        GenerationError instead of returning the local fallback. Each stage is
+        traced as a span under ``generate`` (see ``metrics.py``).
+        """
+        with span("generate", mode=requested_mode, model=settings.model):
+            data = self._call_gemini(user_text, requested_mode, settings, history, on_update, cancel, fallback_ok)
+        if not fallback_ok and is_fallback(data):
+            # Never hand a fallback to a caller that refused one
+            raise GenerationError("no model response (fallback refused)")
+        return data
+
+    def _call_gemini(self, user_text: str, requested_mode: str, settings: GenerationSettings,
+                     history=None, on_update=None, cancel=None, fallback_ok: bool = True) -> dict:
+        # Serve a stored variant when this exact input and settings were seen before
+        with span("cache_lookup") as lookup:
+            context_hash = create_context_hash(user_text)
+            cache_key = make_cache_key(context_hash, settings.cache_fields(requested_mode))
+            cached = self.response_cache.get(cache_key)
+            if cached is None and self.load_stored(cache_key):
+                cached = self.response_cache.get(cache_key)
+            # A variant this user has already seen would break the uniqueness promise
+            seen = bool(cached) and history is not None and history.is_repeat(context_hash, cached,
+                                                                              self.repeat_threshold)
+            result = "miss" if not cached else "seen" if seen else "hit"
+            lookup.set(result=result)
+        CACHE_LOOKUPS.inc(result=result)
+        if result == "hit":
+            if history is not None:
+                history.add(context_hash, cached)
+            return cached
+
+        if self.semantic_cache is not None and requested_mode == "quote":
+            with span("semantic_lookup") as semantic:
+                data = self.near_duplicate(user_text, context_hash, cache_key, history)
+                semantic.set(hit=data is not None)
+            if data is not None:
+                CACHE_LOOKUPS.inc(result="near_duplicate")
+                return data
+
+        if self.warm_pool is not None:
+            with span("warm_pool") as warm:
+                seen = (lambda payload: history.is_repeat(context_hash, payload, self.repeat_threshold)) \
+                    if history is not None else None
+                data = self.warm_pool.take(user_text, requested_mode, settings, seen)
+                warm.set(hit=data is not None)
+            if data is not None:
+                WARM_POOL_HITS.inc(mode=requested_mode)
+                if history is not None:
+                    history.add(context_hash, data)
+                return data
+
+        if self.single_flight is None:
+            return self._generate_fresh(user_text, requested_mode, settings, history, on_update, fallback_ok,
+                                        cancel=cancel)
+        # Identical requests already in flight share one model call; callers that refuse the
+        # fallback (batch, warm pool) only join each other, since the two want different failures
+        try:
+            with span("single_flight") as flight:
+                data, shared = self.single_flight.do(
+                    (cache_key, fallback_ok),
+                    lambda publish: self._generate_fresh(user_text, requested_mode, settings, history,
+                                                         publish if on_update is not None else None, fallback_ok,
+                                                         cancel=cancel),
+                    on_update,
+                )
+                flight.set(shared=shared)
+        except GenerationCancelled:
+            check_cancelled(cancel)
+            # The request this one joined was cancelled by its owner
+            return self._generate_fresh(user_text, requested_mode, settings, history, on_update, fallback_ok,
+                                        cancel=cancel)
+        if not shared:
+            return data
+        COALESCED.inc(mode=requested_mode)
+        if history is not None and history.is_repeat(context_hash, data, self.repeat_threshold):
+            # The shared response is one this user has already seen
+            return self._generate_fresh(user_text, requested_mode, settings, history, on_update, fallback_ok,
+                                        cancel=cancel)
+        if self.coalesce_shuffle:
+            data = shuffle_quotes(data, seeded_rng(self.seed, "coalesce", cache_key))
+        if history is not None:
+            history.add(context_hash, data)
+        return data
+
+    def load_stored(self, cache_key: str) -> bool:
+        """Seed the response cache with variants other processes stored for this key; True if it can serve."""
+        if self.result_store is None:
+            return False
+        cache = self.response_cache
+        records = self.result_store.by_key(cache_key, limit=cache.variants_per_key,
+                                           since=time.time() - cache.ttl_seconds)
+        if len(records) < cache.variants_per_key:
+            return False
+        return cache.seed(cache_key, [r["payload"] for r in records], created=min(r["created"] for r in records))
+
+    @staticmethod
+    def semantic_scope(user_text: str, cache_key: str) -> str:
+        """Near-duplicates are only matched within the same settings and emotion/energy/theme bucket."""
+        analysis = analyze_user_emotion(user_text)
+        theme = (analysis["themes"] or ["general"])[0]
+        return f"{cache_key.split(':', 1)[1]}:{analysis['primary_emotion']}:{analysis['energy_level']}:{theme}"
+
+    def near_duplicate(self, user_text: str, context_hash: str, cache_key: str, history=None):
+        """The quotes chosen for a reworded version of this quote-mode input, or None.
+
+        Everything else in a response repeats the earlier user's own words, so
+        only the quotes themselves (text, author, category) are served.
+        """
+        neighbour = self.semantic_cache.lookup(user_text, self.semantic_scope(user_text, cache_key),
+                                               exclude=cache_key)
+        if neighbour is None:
+            return None
+        seen = (lambda payload: history.is_repeat(context_hash, quotes_only(payload), self.repeat_threshold)) \
+            if history is not None else None
+        data = self.response_cache.peek(neighbour, seen)
+        if data is None and self.result_store is not None:
+            # The response cache holds far fewer inputs than the index
+            data = next((r["payload"] for r in self.result_store.by_key(neighbour)
+                         if seen is None or not seen(r["payload"])), None)
+        if data is None or is_fallback(data) or not data.get("quotes"):
+            return None
+        self.semantic_cache.record_hit()
+        data = shuffle_quotes(quotes_only(data), seeded_rng(self.seed, "near_duplicate", cache_key))
+        if history is not None:
+            history.add(context_hash, data)
+        return data
+
+    def degraded(self, context_hash: str, cache_key: str, history=None):
+        """An earlier response for this input and settings, for requests that may not call the model."""
+        seen = (lambda payload: history.is_repeat(context_hash, payload, self.repeat_threshold)) \
+            if history is not None else None
+        data = self.response_cache.peek(cache_key, seen)
+        if data is None and self.result_store is not None:
+            data = next((r["payload"] for r in self.result_store.by_key(cache_key)
+                         if seen is None or not seen(r["payload"])), None)
+        if data is not None:
+            FALLBACKS.inc(reason="admission_cached")
+            if history is not None:
+                history.add(context_hash, data)
+        return data
+
+    def store_result(self, user_text: str, context_hash: str, cache_key: str, requested_mode: str, data: dict):
+        if self.result_store is None:
+            return
+        analysis = analyze_user_emotion(user_text)
+        self.result_store.add(make_record(context_hash, cache_key, requested_mode, analysis["primary_emotion"],
+                                          (analysis["themes"] or ["general"])[0], data))
+
+    def generate_warm(self, user_text: str, requested_mode: str, settings: GenerationSettings) -> dict:
+        """Generate a response for the warm pool or the daily digest; raises GenerationError instead of falling back."""
+        with request_scope(priority=BACKGROUND), span("warm_refill", mode=requested_mode):
+            return self._generate_fresh(user_text, requested_mode, settings, fallback_ok=False)
+
+    def _generate_fresh(self, user_text: str, requested_mode: str, settings: GenerationSettings,
+                        history=None, on_update=None, fallback_ok: bool = True, cancel=None) -> dict:
+        """Generate a new response for ``call_gemini``, bypassing the response cache lookup."""
+        context_hash = create_context_hash(user_text)
+        cache_key = make_cache_key(context_hash, settings.cache_fields(requested_mode))
+
+        # Memoized, so the prompt and config builders below reuse this analysis
+        with span("emotion_analysis"):
+            analyze_user_emotion(user_text)
+
+        quotes = None
+        if requested_mode == "quote" and self.quote_retrieval != "off":
+            with span("quote_retrieval"):
+                quotes = self.retrieve_quotes(user_text, settings.num_quotes, history) or None
+        if quotes and self.quote_retrieval == "local":
+            data = build_fallback(user_text, requested_mode, quotes)
+            if history is not None:
+                history.add(context_hash, data)
+            return data
+
+        route = self.route(user_text, settings)
+        ROUTES.inc(model=route.models[0] if route.models else "local", complexity=route.complexity)
+        if route.local:
+            # Greetings get the local template: a model call adds latency but nothing a greeting needs
+            data = build_fallback(user_text, requested_mode, quotes)
+            if history is not None:
+                history.add(context_hash, data)
+            return data
+
+        def fallback(reason: str) -> dict:
+            if not fallback_ok:
+                raise GenerationError(f"no model response ({reason})")
+            FALLBACKS.inc(reason=reason)
+            with span("fallback", reason=reason):
+                # Corpus quotes keep even the fallback specific to what the user wrote
+                data = build_fallback(user_text, requested_mode,
+                                      quotes or self.retrieve_quotes(user_text, settings.num_quotes, history))
+            # Marks a stand-in for a model response, e.g. so batch runs retry it
+            data["fallback"] = True
+            return data
+
+        with span("prompt_build"):
+            prompt = build_instruction(user_text, requested_mode, settings, history, quotes, self.seed)
+            shape = "quote_context" if quotes else requested_mode
+            # Enhanced generation config
+            config = generation_config(user_text, shape, settings, self.json_mode, self.output_budgets)
+            system = system_instruction()
+        if self.admission is not None:
+            session, priority = current_request()
+            # Prompt plus the most the model may write; the cached system prompt is not counted
+            tokens = len(prompt) // 4 + config["max_output_tokens"]
+            with span("admission", tokens=tokens) as admission:
+                denied = self.admission.admit(tokens, session, priority)
+                admission.set(denied=denied)
+            if denied:
+                if not fallback_ok:
+                    # Callers that need a model response (batch, warm pool) retry later instead
+                    return fallback(f"admission_{denied}")
+                return self.degraded(context_hash, cache_key, history) or fallback(f"admission_{denied}")
+        if quotes and on_update is not None:
+            # Partial quote_context payloads are shown as quotes that gain their context as it streams
+            show = on_update
+            on_update = lambda partial: show(merge_quote_context(quotes, partial))
+
+        def send(model: str, cfg, updates, stop: threading.Event) -> str:
+            started = time.perf_counter()
+            try:
+                if updates is not None:
+                    raw, resp = self.stream_response(model, prompt, cfg, updates, cancel, stop)
+                else:
+                    resp = self.client.models.generate_content(
+                        model=model,
+                        contents=prompt,
+                        config=cfg,
+                    )
+                    raw = (getattr(resp, "text", None) or "").strip()
+            except Exception:
+                MODEL_LATENCY.observe(time.perf_counter() - started, model=model, outcome="error")
+                raise
+            elapsed = time.perf_counter() - started
+            MODEL_LATENCY.observe(elapsed, model=model, outcome="ok")
+            if self.router is not None:
+                self.router.observe(model, elapsed)
+            self.record_usage(resp, replace(settings, model=model), shape, elapsed)
+            return raw
+
+        def request(model: str, cached_prompt, stream: bool, stop: threading.Event) -> str:
+            # A call the executor gave up on (timed out, or another hedge won) may still be between
+            # chunks; its late partials must not reach the user
+            updates = None if not stream else \
+                (lambda partial: None if stop.is_set() or on_update is None else on_update(partial))
+            types = genai_sdk()[1]
+            inline = types.GenerateContentConfig(**config, system_instruction=system)
+            if cached_prompt is None:
+                return send(model, inline, updates, stop)
+            try:
+                return send(model, types.GenerateContentConfig(**config, cached_content=cached_prompt), updates,
+                            stop)
+            except Exception as e:
+                if status_code(e) not in (400, 403, 404):
+                    raise
+                # The cached prompt expired or was deleted: send it inline and recreate it next time
+                self.prompt_cache.invalidate(model, system)
+                return send(model, inline, updates, stop)
+
+        for i, model in enumerate(route.models):
+            check_cancelled(cancel)
+            cached_prompt = None
+            if self.prompt_cache is not None:
+                with span("context_cache", model=model):
+                    cached_prompt = self.prompt_cache.get(model, system)
+            # Only a model with a faster one behind it has a deadline
+            deadline = route.deadline if i + 1 < len(route.models) else None
+            try:
+                with span("model_call", model=model, stream=on_update is not None, deadline=deadline):
+                    # Hedging would render two competing streams, so it is only used without a listener;
+                    # a call with a deadline streams even then, so it can be closed once abandoned
+                    raw = self.request_executor.execute(
+                        partial(request, model, cached_prompt, on_update is not None or deadline is not None),
+                        hedge=on_update is None,
+                        timeout=deadline,
+                        stoppable=True,
+                    )
+                break
+            except DeadlineExceeded:
+                # The executor has already set the attempt's stop event, so a stream closes at its next chunk
+                DEADLINE_FALLBACKS.inc(model=model, fallback=route.models[i + 1])
+                logger.info("%s missed its %.1fs deadline, retrying with %s", model, deadline, route.models[i + 1])
+            except CircuitOpenError:
+                # Upstream keeps failing: answer right away instead of waiting on another timeout
+                return fallback("circuit_open")
+            except GenerationCancelled:
+                raise
+            except Exception as e:
+                ERRORS.inc(stage="model_call")
+                raise GenerationError(str(e)) from e
+
+        with span("parse", shape=shape):
+            # Malformed fields are dropped here so the renderers only see valid data
+            data, _problems = validate_payload(parse_loose_json(raw), shape)
+            if data and quotes:
+                data, _problems = validate_payload(merge_quote_context(quotes, data), requested_mode)
+
+        if data:
+            # Near-duplicates of earlier responses are not worth keeping as cache variants
+            if history is None or not history.is_repeat(context_hash, data, self.repeat_threshold):
+                self.response_cache.put(cache_key, data)
+                if self.semantic_cache is not None and requested_mode == "quote":
+                    self.semantic_cache.add(user_text, self.semantic_scope(user_text, cache_key), cache_key)
+            self.store_result(user_text, context_hash, cache_key, requested_mode, data)
+            if history is not None:
+                # Store response to avoid repetition
+                history.add(context_hash, data)
+        else:
+            PARSE_FAILURES.inc(shape=shape)
+            data = fallback("parse_failure")
+
+        return data
+
+    def generate_both(self, user_text: str, settings: GenerationSettings, history=None,
+                      on_update=None, stream: bool = True, cancel=None, fallback_ok: bool = True) -> dict:
+        """Request the message and quote shapes concurrently and merge them.
+
+        Partial and final payloads are handed back through a queue and passed
+        to ``on_update`` on the calling thread in the order they arrive, so
+        wall-clock time is that of the slower request.
+        """
+        updates = queue.Queue()
+
+        def run(shape: str):
+            callback = (lambda partial: updates.put((shape, partial, False, None))) if on_update and stream else None
+            try:
+                updates.put((shape, self.call_gemini(user_text, shape, settings, history, callback, cancel,
+                                                     fallback_ok), True, None))
+            except Exception as e:
+                updates.put((shape, None, True, e))
+
+        for shape in ("message", "quote"):
+            # Each worker gets a copy of the caller's context so its spans join the caller's trace
+            self.pool.submit(current_context().run, run, shape)
+
+        merged = {"type": "both", "message": {}, "quote": {}}
+        errors = []
+        pending = 2
+        while pending:
+            shape, payload, finished, error = updates.get()
+            if finished:
+                pending -= 1
+                # A failed request must not leave a half-streamed section behind
+                merged[shape] = payload or {}
+                if error is not None:
+                    errors.append(error)
+            elif payload:
+                merged[shape] = payload
+            if on_update:
+                on_update(dict(merged))
+
+        check_cancelled(cancel)
+        if not merged["message"] and not merged["quote"]:
+            raise errors[0] if errors else GenerationError("No response generated")
+        if errors and not fallback_ok:
+            # Half a result is not a model response for both shapes
+            raise errors[0]
+        return merged
+
+    def generate(self, user_text: str, settings: GenerationSettings, history=None,
+                 on_update=None, stream: bool = True, cancel=None, session: str = None,
+                 priority: int = INTERACTIVE, fallback_ok: bool = True) -> dict:
+        """Generate a payload for ``settings.mode``.
+
+        ``session`` and ``priority`` are used by admission control: each session
+        has its own token bucket, and higher priorities (lower numbers) are
+        admitted first when the global bucket runs dry. ``fallback_ok=False``
+        raises GenerationError where the local fallback would be returned.
+        """
+        with request_scope(session, priority), span("request", mode=settings.mode, length=settings.length):
+            if settings.mode == "both":
+                return self.generate_both(user_text, settings, history, on_update, stream, cancel, fallback_ok)
+            return self.call_gemini(user_text, settings.mode, settings, history, on_update if stream else None,
+                                    cancel, fallback_ok)
+
+    def generate_many(self, requests: list, concurrency: int = 8, session: str = None) -> list:
+        """Run ``(user_text, settings)`` pairs concurrently; failures come back as exceptions.
+
+        Every item is admitted against ``session``'s token bucket, as its own request would be.
+        """
+        def run(item):
+            user_text, settings = item
+            try:
+                return self.generate(user_text, settings, session=session, priority=BATCH)
+            except Exception as e:
+                return e
+
+        # A separate pool: "both" requests submit to self.pool and must not wait behind their own batch
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as batch_pool:
+            return list(batch_pool.map(run, requests))
@@ -0,0 +1,126 @@
+"""Bounded, compact per-session history of generated responses.
+
+Instead of keeping every response dict forever, each entry stores:
+
+* a bottom-k MinHash sketch of the response's word shingles (a few hundred
+  bytes) used to estimate how similar a new response is to earlier ones;
+* a zlib-compressed summary (mantra, affirmation, theme, quote texts) that
+  the prompt can list as things not to repeat.
+
+Each context hash keeps a ring buffer of its latest ``per_key`` entries and
+the whole history is held under ``byte_budget`` by dropping the oldest
+entries of the least recently used hashes first.
+"""
+import json
+import re
+import threading
+import zlib
+from array import array
+from collections import OrderedDict, deque
+
+_WORD = re.compile(r"[a-z0-9']+")
+_ENTRY_OVERHEAD = 64
+
+
+def response_text(data: dict) -> str:
+    """All user-visible text of a message or quote payload."""
+    parts = [data.get(k, "") for k in ("motivation", "reflection", "mantra", "daily_affirmation", "theme", "application")]
+    parts += data.get("steps") or []
+    parts += data.get("reflection_questions") or []
+    parts += [q.get("quote", "") for q in data.get("quotes") or [] if isinstance(q, dict)]
+    return " ".join(p for p in parts if isinstance(p, str))
+
+
+def fingerprint(text: str, k: int = 64, shingle: int = 3) -> array:
+    """Bottom-k MinHash sketch over word shingles (sorted 32-bit hashes)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < shingle:
+        grams = {" ".join(words)} if words else set()
+    else:
+        grams = {" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)}
+    hashes = sorted({zlib.crc32(g.encode()) for g in grams})
+    return array("I", hashes[:k])
+
+
+def similarity(a: array, b: array, k: int = 64) -> float:
+    """Estimate the Jaccard similarity of two sketches."""
+    if not a or not b:
+        return 0.0
+    union = sorted(set(a) | set(b))[:k]
+    sa, sb = set(a), set(b)
+    both = sum(1 for h in union if h in sa and h in sb)
+    return both / len(union)
+
+
+def summarize(data: dict) -> dict:
+    summary = {k: data[k] for k in ("mantra", "daily_affirmation", "theme") if isinstance(data.get(k), str)}
+    quotes = [q.get("quote") for q in data.get("quotes") or [] if isinstance(q, dict) and q.get("quote")]
+    if quotes:
+        summary["quotes"] = quotes
+    return summary
+
+
+class ResponseHistory:
+    def __init__(self, per_key: int = 5, byte_budget: int = 64 * 1024, k: int = 64):
+        self.per_key = per_key
+        self.byte_budget = byte_budget
+        self.k = k
+        self.nbytes = 0
+        self._entries = OrderedDict()  # context hash -> deque of (sketch bytes, compressed summary)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    @staticmethod
+    def _size(entry) -> int:
+        return len(entry[0]) + len(entry[1]) + _ENTRY_OVERHEAD
+
+    def add(self, context_hash: str, data: dict):
+        if not data:
+            return
+        sketch = fingerprint(response_text(data), self.k).tobytes()
+        summary = zlib.compress(json.dumps(summarize(data), separators=(",", ":")).encode())
+        entry = (sketch, summary)
+        with self._lock:
+            entries = self._entries.setdefault(context_hash, deque())
+            self._entries.move_to_end(context_hash)
+            entries.append(entry)
+            self.nbytes += self._size(entry)
+            if len(entries) > self.per_key:
+                self.nbytes -= self._size(entries.popleft())
+            self._enforce_budget()
+
+    def _enforce_budget(self):
+        while self.nbytes > self.byte_budget and self._entries:
+            context_hash, entries = next(iter(self._entries.items()))
+            self.nbytes -= self._size(entries.popleft())
+            if not entries:
+                del self._entries[context_hash]
+
+    def max_similarity(self, context_hash: str, data: dict) -> float:
+        """Highest estimated similarity between ``data`` and earlier responses for this hash."""
+        with self._lock:
+            entries = list(self._entries.get(context_hash, ()))
+        if not entries or not data:
+            return 0.0
+        sketch = fingerprint(response_text(data), self.k)
+        best = 0.0
+        for stored, _ in entries:
+            past = array("I")
+            past.frombytes(stored)
+            best = max(best, similarity(sketch, past, self.k))
+        return best
+
+    def is_repeat(self, context_hash: str, data: dict, threshold: float = 0.5) -> bool:
+        return self.max_similarity(context_hash, data) >= threshold
+
+    def recent_summaries(self, context_hash: str, limit: int = 3) -> list:
+        with self._lock:
+            entries = list(self._entries.get(context_hash, ()))[-limit:]
+        return [json.loads(zlib.decompress(summary)) for _, summary in entries]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hashes": len(self._entries), "entries": len(self), "bytes": self.nbytes,
+                    "byte_budget": self.byte_budget}
@@ -0,0 +1,40 @@
+"""Background generation jobs for front ends that must not block on the model.
+
+A ``Job`` runs ``run(on_update, cancel)`` on a shared executor and keeps the
+latest partial payload it reported, so a UI can poll it between reruns. The
+Streamlit app stores one job per session in ``st.session_state``. Cancelling a
+job drops it from the executor queue if it has not started yet, and otherwise
+sets ``cancel``, which the generator checks before calling the model and
+between streamed chunks, so an abandoned request stops streaming (and being
+billed) right away.
+"""
+import threading
+import time
+
+
+class Job:
+    def __init__(self, pool, run, key=None):
+        self.key = key
+        self.partial = None
+        self.started = time.time()
+        self.cancelled = threading.Event()
+        self.future = pool.submit(run, self._update, self.cancelled)
+
+    def _update(self, partial):
+        self.partial = partial
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started
+
+    def cancel(self):
+        self.cancelled.set()
+        self.future.cancel()
+
+    def result(self):
+        """The job's result; raises what the job raised. Only call once ``done``."""
+        return self.future.result()
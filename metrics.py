@@ -0,0 +1,316 @@
+"""In-process metrics and tracing with Prometheus text export.
+
+* ``Counter`` and ``Histogram`` are keyed by label values and thread-safe.
+  Histograms keep cumulative buckets for Prometheus plus a bounded window
+  of recent observations, so live p50/p95/p99 can be shown without an
+  external system.
+* ``span(name, **attributes)`` times one stage of a request. Spans nest
+  through a context variable, so each knows its trace and parent; every
+  finished span is observed in ``stage_seconds{stage=...}`` and complete
+  traces are kept in ``recent_traces()`` and logged as one JSON line on the
+  ``metrics.trace`` logger at DEBUG level.
+* ``Registry.render()`` returns the Prometheus text exposition format; it is
+  served by ``GET /metrics`` in the API and by ``start_http_server`` for the
+  Streamlit app.
+"""
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+trace_logger = logging.getLogger("metrics.trace")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PERCENTILES = (50, 95, 99)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(n, "")) for n in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + "_total", dict(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS, window: int = 1000):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.window = window
+        self._series = {}  # label values -> [bucket counts, sum, count, recent observations]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0, deque(maxlen=self.window)]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+            series[3].append(value)
+
+    def percentiles(self, percentiles=PERCENTILES) -> list:
+        """``(labels, count, {p: seconds})`` for every label set, over the recent window."""
+        with self._lock:
+            items = [(key, series[2], sorted(series[3])) for key, series in self._series.items()]
+        result = []
+        for key, count, recent in sorted(items):
+            values = {p: recent[min(len(recent) - 1, int(round(p / 100 * (len(recent) - 1))))] for p in percentiles}
+            result.append((dict(zip(self.labelnames, key)), count, values))
+        return result
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(s[0]), s[1], s[2]) for key, s in self._series.items()]
+        for key, counts, total, count in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield self.name + "_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def register_collector(self, collect, key: str = None):
+        """Add a callable returning ``[(name, kind, help, [(labels, value), ...]), ...]`` read at render time.
+
+        As with ``Counter``, a counter is named without ``_total``, which is added to its samples.
+        A collector registered under a ``key`` already in use replaces the earlier one.
+        """
+        with self._lock:
+            self._collectors[collect if key is None else key] = collect
+
+    def metrics(self) -> list:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines += [f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples()]
+        with self._lock:
+            collectors = list(self._collectors.values())
+        for collect in collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                sample_name = name + "_total" if kind == "counter" else name
+                lines += [f"{sample_name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("motivator_stage_seconds", "Time spent in each traced stage.", ["stage"])
+MODEL_LATENCY = REGISTRY.histogram("motivator_model_latency_seconds",
+                                   "Latency of individual model requests, including failed ones.", ["model", "outcome"])
+FALLBACKS = REGISTRY.counter("motivator_fallbacks", "Responses served by the local fallback.", ["reason"])
+PARSE_FAILURES = REGISTRY.counter("motivator_parse_failures",
+                                  "Model outputs with no usable payload after repair and validation.", ["shape"])
+CACHE_LOOKUPS = REGISTRY.counter("motivator_cache_lookups", "Response cache lookups by result.", ["result"])
+COALESCED = REGISTRY.counter("motivator_coalesced",
+                             "Requests answered by an identical request already in flight.", ["mode"])
+ROUTES = REGISTRY.counter("motivator_routes", "Requests by routed model and input complexity.",
+                          ["model", "complexity"])
+DEADLINE_FALLBACKS = REGISTRY.counter("motivator_deadline_fallbacks",
+                                      "Requests moved to a faster model after missing their deadline.",
+                                      ["model", "fallback"])
+WARM_POOL_HITS = REGISTRY.counter("motivator_warm_pool_hits", "Requests answered from the warm pool.", ["mode"])
+DIGEST_SERVED = REGISTRY.counter("motivator_digest_served", "Inspirations served from the daily digest.",
+                                 ["mode", "match"])
+ADMISSIONS = REGISTRY.counter("motivator_admissions", "Model calls admitted or denied by admission control.",
+                              ["result", "priority"])
+QUEUE_SECONDS = REGISTRY.histogram("motivator_admission_queue_seconds",
+                                   "Time admitted model calls waited for tokens.", ["priority"])
+ERRORS = REGISTRY.counter("motivator_errors", "Requests that failed with an error shown to the user.", ["stage"])
+
+
+# -------------------- Tracing --------------------
+_current_span = contextvars.ContextVar("current_span", default=None)
+_traces = deque(maxlen=int(os.getenv("METRICS_TRACE_BUFFER", "100")))
+
+
+class Span:
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "root", "start", "duration", "error",
+                 "finished")
+
+    def __init__(self, name: str, attributes: dict, parent):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent.span_id if parent else None
+        self.root = parent.root if parent else self
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        # Only the root span holds the list of finished spans for its trace
+        self.finished = [] if parent is None else None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        record = {"trace": self.trace_id, "span": self.span_id, "parent": self.parent_id, "name": self.name,
+                  "start": round(self.start, 6), "ms": round(self.duration * 1000, 3), **self.attributes}
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class span:
+    """Times one stage of a request: ``with span("parse", shape=shape):``."""
+
+    def __init__(self, name: str, **attributes):
+        self._span = None
+        self._name = name
+        self._attributes = attributes
+        self._token = None
+        self._started = None
+
+    def __enter__(self) -> Span:
+        self._span = Span(self._name, self._attributes, _current_span.get())
+        self._token = _current_span.set(self._span)
+        self._started = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        s = self._span
+        s.duration = time.perf_counter() - self._started
+        if exc is not None:
+            s.error = type(exc).__name__
+        _current_span.reset(self._token)
+        STAGE_SECONDS.observe(s.duration, stage=s.name)
+        s.root.finished.append(s)
+        if s is s.root:
+            trace = [finished.to_dict() for finished in s.finished]
+            _traces.append(trace)
+            if trace_logger.isEnabledFor(logging.DEBUG):
+                trace_logger.debug(json.dumps(trace, default=str))
+        return False
+
+
+def current_context():
+    """Copy of the current context, for running work on another thread inside the same trace."""
+    return contextvars.copy_context()
+
+
+def recent_traces(limit: int = 20) -> list:
+    return list(_traces)[-limit:]
+
+
+def latency_summary(registry: Registry = REGISTRY) -> list:
+    """Rows of ``{metric, labels..., count, p50, p95, p99}`` in milliseconds for every histogram."""
+    rows = []
+    for metric in registry.metrics():
+        if isinstance(metric, Histogram):
+            for labels, count, values in metric.percentiles():
+                rows.append({"metric": metric.name, **labels, "count": count,
+                             **{f"p{p}_ms": round(v * 1000, 1) for p, v in values.items()}})
+    return rows
+
+
+def counter_summary(registry: Registry = REGISTRY) -> list:
+    rows = []
+    for metric in registry.metrics():
+        if isinstance(metric, Counter):
+            rows += [{"metric": name, **labels, "value": value} for name, labels, value in metric.samples()]
+    return rows
+
+
+def start_http_server(port: int, host: str = "0.0.0.0", registry: Registry = REGISTRY):
+    """Serve ``GET /metrics`` from a daemon thread; returns the ``ThreadingHTTPServer``."""
+    # Only needed when the endpoint is enabled, so kept off the import path
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            data = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    return server
@@ -0,0 +1,227 @@
+"""Robust extraction and validation of the JSON payloads returned by the model.
+
+``parse_loose_json`` first tries the text between the outermost braces, which
+covers JSON mode, markdown fences and plain prose around the object. When
+that fails it makes one pass over the text to find the first balanced
+top-level object, tracking strings and escapes so braces inside prose or
+string values do not confuse it. Output cut off at the token limit is
+repaired by closing the open string and containers, or by falling back to
+the last complete value. ``validate_payload`` then checks the result against
+the "message" or "quote" schema, keeping well-formed fields and dropping
+malformed ones before anything is rendered.
+"""
+import json
+import re
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+# One token per match: a whole string (the closing quote group is empty when
+# the text ends inside it), a structural character, or a bare literal. Letting
+# the regex engine consume string bodies keeps the Python loop to a handful of
+# iterations per field.
+_TOKEN = re.compile(r'"(?:[^"\\]+|\\.)*("?)|[{}\[\],]|[-+.\w]+')
+
+
+def _scan_object(s: str, start: int):
+    """Scan from the ``{`` at ``start``.
+
+    Returns ``(end, None)`` with the index after the matching ``}``, or
+    ``(None, repairs)`` if the text ends first, where ``repairs`` lists
+    candidate completions to try in order.
+    """
+    stack = []
+    expecting_key = False
+    # Last point where a value had just finished: (index, open containers)
+    safe = None
+
+    for m in _TOKEN.finditer(s, start):
+        token = m.group()
+        first = token[0]
+        if first == '"':
+            is_key = expecting_key
+            expecting_key = False
+            if not m.group(1):
+                # Text ends inside this string; a value can be closed, a key cannot
+                repairs = []
+                closers = "".join(_CLOSERS[c] for c in reversed(stack))
+                if not is_key:
+                    repairs.append(s[start:m.end()] + '"' + closers)
+                if safe is not None:
+                    repairs.append(s[start:safe[0]] + "".join(_CLOSERS[c] for c in reversed(safe[1])))
+                return None, repairs
+            if not is_key:
+                safe = (m.end(), tuple(stack))
+        elif first in "{[":
+            stack.append(first)
+            expecting_key = first == "{"
+        elif first in "}]":
+            if not stack:
+                return None, []
+            stack.pop()
+            if not stack:
+                return m.end(), None
+            safe = (m.end(), tuple(stack))
+        elif first == ",":
+            expecting_key = stack[-1] == "{"
+        elif not expecting_key and m.end() < len(s):
+            # A bare literal (number, true, false, null) that is not cut off
+            safe = (m.end(), tuple(stack))
+
+    repairs = []
+    if safe is not None:
+        repairs.append(s[start:safe[0]] + "".join(_CLOSERS[c] for c in reversed(safe[1])))
+    return None, repairs
+
+
+def parse_loose_json(s: str):
+    """Parse the first JSON object in model output, repairing truncation if needed."""
+    if not s:
+        return None
+    start = s.find("{")
+    end = s.rfind("}")
+    if start != -1 and end > start:
+        # Fast path: JSON mode, fences and surrounding prose without braces
+        # all leave exactly one object between the outermost braces
+        try:
+            value = json.loads(s[start:end + 1])
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+
+    while start != -1:
+        end, repairs = _scan_object(s, start)
+        candidates = [s[start:end]] if end is not None else repairs
+        for candidate in candidates:
+            try:
+                value = json.loads(candidate)
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                return value
+        # Not a JSON object after all (e.g. "{braces}" in prose): try the next one
+        start = s.find("{", start + 1)
+    return None
+
+
+# -------------------- Schemas --------------------
+# Field -> expected type. [str] is a list of strings; a dict describes the
+# objects in a list. Required fields must be present and valid for the
+# payload to be usable at all.
+QUOTE_ITEM = {"quote": str, "author": str, "context": str, "category": str}
+
+SCHEMAS = {
+    "message": {
+        "fields": {
+            "type": str,
+            "motivation": str,
+            "steps": [str],
+            "mantra": str,
+            "quotes": [QUOTE_ITEM],
+            "reflection_questions": [str],
+            "daily_affirmation": str,
+        },
+        "required": ["motivation"],
+    },
+    "quote": {
+        "fields": {
+            "type": str,
+            "quotes": [QUOTE_ITEM],
+            "reflection": str,
+            "theme": str,
+            "application": str,
+        },
+        "required": ["quotes"],
+    },
+    # Quote mode with quotes retrieved from the local corpus: the model only
+    # writes one context line per quote plus the surrounding reflection
+    "quote_context": {
+        "fields": {
+            "type": str,
+            "contexts": [str],
+            "reflection": str,
+            "theme": str,
+            "application": str,
+        },
+        "required": ["reflection"],
+    },
+}
+
+QUOTE_ITEM_REQUIRED = ("quote",)
+
+
+def _clean_quote(item):
+    if isinstance(item, str) and item.strip():
+        return {"quote": item.strip(), "author": "Unknown"}
+    if not isinstance(item, dict):
+        return None
+    clean = {k: item[k].strip() for k, t in QUOTE_ITEM.items() if isinstance(item.get(k), t) and item[k].strip()}
+    if not all(k in clean for k in QUOTE_ITEM_REQUIRED):
+        return None
+    clean.setdefault("author", "Unknown")
+    return clean
+
+
+def validate_payload(data, mode: str):
+    """Return ``(payload, problems)``; payload is None if required fields are unusable."""
+    if not isinstance(data, dict):
+        return None, ["response is not a JSON object"]
+    schema = SCHEMAS[mode]
+    clean, problems = {}, []
+    for field, expected in schema["fields"].items():
+        if field not in data:
+            continue
+        value = data[field]
+        if expected is str:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            if isinstance(value, str) and value.strip():
+                clean[field] = value.strip()
+            else:
+                problems.append(f"{field}: expected non-empty text")
+        elif isinstance(value, list):
+            item_schema = expected[0]
+            if item_schema is str:
+                items = [str(v).strip() for v in value if isinstance(v, (str, int, float)) and str(v).strip()]
+            else:
+                items = [q for q in (_clean_quote(v) for v in value) if q]
+            if len(items) < len(value):
+                problems.append(f"{field}: dropped {len(value) - len(items)} malformed item(s)")
+            if items:
+                clean[field] = items
+        elif isinstance(value, str) and expected[0] is str and value.strip():
+            # A single string where a list was expected
+            clean[field] = [value.strip()]
+        else:
+            problems.append(f"{field}: expected a list")
+
+    missing = [f for f in schema["required"] if f not in clean]
+    if missing:
+        problems.append(f"missing required field(s): {', '.join(missing)}")
+        return None, problems
+    clean["type"] = mode
+    return clean, problems
+
+
+def response_schema(mode: str) -> dict:
+    """OpenAPI-style schema for the SDK's structured output (response_schema)."""
+    def convert(expected):
+        if expected is str:
+            return {"type": "STRING"}
+        if isinstance(expected, list):
+            return {"type": "ARRAY", "items": convert(expected[0])}
+        return {
+            "type": "OBJECT",
+            "properties": {k: convert(v) for k, v in expected.items()},
+            "required": list(QUOTE_ITEM_REQUIRED) + ["author"],
+        }
+
+    schema = SCHEMAS[mode]
+    fields = {k: v for k, v in schema["fields"].items() if k != "type"}
+    return {
+        "type": "OBJECT",
+        "properties": {k: convert(v) for k, v in fields.items()},
+        "required": list(schema["required"]),
+        "propertyOrdering": list(fields),
+    }
@@ -0,0 +1,96 @@
+"""Explicit context caching of the static system prompt.
+
+The system instruction is identical for every request, so it is uploaded
+once per model as a cached-content resource and requests refer to it by
+name; cached input tokens are billed at a reduced rate. Entries are
+recreated shortly before their TTL runs out. When the API refuses to cache
+(e.g. the prompt is below the model's minimum cacheable size), the model is
+remembered as unsupported for a while and callers send the system
+instruction inline instead, where implicit prefix caching can still apply.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class PromptCache:
+    def __init__(self, client, ttl_seconds: float = 3600.0, refresh_margin: float = 300.0,
+                 retry_after: float = 3600.0):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin = refresh_margin
+        self.retry_after = retry_after
+        self._entries = {}  # (model, prompt digest) -> (cached content name, expires at)
+        self._unsupported = {}  # (model, prompt digest) -> time of the failed attempt
+        self.stats = {"hits": 0, "created": 0, "failures": 0, "invalidated": 0}
+        self._lock = threading.Lock()
+        # Concurrent first requests for one model wait for a single upload; other models are not held up
+        self._uploads = SingleFlight()
+
+    @staticmethod
+    def _key(model: str, system_instruction: str) -> tuple:
+        return model, hashlib.md5(system_instruction.encode()).hexdigest()
+
+    def get(self, model: str, system_instruction: str):
+        """Name of a live cached content for this model and prompt, or None to send it inline."""
+        key = self._key(model, system_instruction)
+        with self._lock:
+            name, known = self._lookup(key)
+        if known:
+            return name
+        name, _ = self._uploads.do(key, lambda publish: self._create(key, model, system_instruction))
+        return name
+
+    def _lookup(self, key: tuple) -> tuple:
+        """``(name, True)`` when the answer is known without an upload; call with the lock held."""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[1] - self.refresh_margin > now:
+            self.stats["hits"] += 1
+            return entry[0], True
+        failed_at = self._unsupported.get(key)
+        if failed_at is not None and now - failed_at < self.retry_after:
+            return None, True
+        return None, False
+
+    def _create(self, key: tuple, model: str, system_instruction: str):
+        with self._lock:
+            # An upload that finished just before this one started has already done the work
+            name, known = self._lookup(key)
+        if known:
+            return name
+        now = time.monotonic()
+        try:
+            # Already loaded by the time a client exists; imported here to keep module import cheap
+            from google.genai import types
+            cached = self.client.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    ttl=f"{int(self.ttl_seconds)}s",
+                    display_name="motivator-system-prompt",
+                ),
+            )
+            if not getattr(cached, "name", None):
+                raise ValueError("cache created without a name")
+        except Exception as e:
+            with self._lock:
+                self.stats["failures"] += 1
+                self._unsupported[key] = now
+            logger.info("context caching unavailable for %s, sending the system prompt inline: %s", model, e)
+            return None
+        with self._lock:
+            self.stats["created"] += 1
+            self._entries[key] = (cached.name, now + self.ttl_seconds)
+        return cached.name
+
+    def invalidate(self, model: str, system_instruction: str):
+        """Forget the cached content for this model, e.g. after the API reports it missing or expired."""
+        with self._lock:
+            if self._entries.pop(self._key(model, system_instruction), None):
+                self.stats["invalidated"] += 1
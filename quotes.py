@@ -0,0 +1,316 @@
+"""Bundled quote corpus with tag and lexical retrieval.
+
+``assets/quotes.tsv`` (quote, author, category, space-separated tags) is
+compiled by ``python quotes.py build`` into ``assets/quotes.idx``, one
+little-endian binary file of 4-byte aligned sections:
+
+* ``text`` - UTF-8 bytes of every quote, author and category;
+* ``records`` - five uint32 per quote: text offset, text length, author id,
+  category id and a bitmask of its tags;
+* ``strings`` - (offset, length) pairs for the distinct authors/categories;
+* ``terms`` / ``term_offsets`` / ``term_postings`` - an inverted index from
+  the sorted crc32 hashes of quote words to quote ids;
+* ``tag_offsets`` / ``tag_postings`` - an inverted index from each tag in
+  ``TAGS`` (the emotions and themes of ``analyze_user_emotion``) to quote ids.
+
+``QuoteIndex`` memory-maps the file, so opening it costs the same for ten
+quotes or ten thousand and only the quotes a search returns are decoded.
+"""
+import argparse
+import csv
+import math
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from emotion import EMOTION_INDICATORS, THEME_INDICATORS, analyze_user_emotion
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+SOURCE_PATH = os.path.join(ASSETS_DIR, "quotes.tsv")
+INDEX_PATH = os.path.join(ASSETS_DIR, "quotes.idx")
+
+TAGS = list(EMOTION_INDICATORS) + list(THEME_INDICATORS)
+_TAG_BITS = {tag: 1 << i for i, tag in enumerate(TAGS)}
+
+MAGIC = b"QIDX"
+VERSION = 1
+SECTIONS = ("text", "records", "strings", "terms", "term_offsets", "term_postings", "tag_offsets", "tag_postings")
+_HEADER = struct.Struct("<4sII")
+_SECTION = struct.Struct("<II")
+_RECORD_FIELDS = 5
+
+# Tag matches dominate word overlap: the user's feelings matter more than vocabulary
+PRIMARY_EMOTION_WEIGHT = 3.0
+EMOTION_WEIGHT = 1.5
+THEME_WEIGHT = 2.0
+
+_WORD = re.compile(r"[a-z']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by do for from has have he her his i if in is it its me my no not of on or our "
+    "she so that the their them they this to too us was we what when which who will with you your".split()
+)
+
+
+def terms(text: str) -> set:
+    """Lowercased content words with a trailing plural ``s`` stripped, as crc32 hashes."""
+    out = set()
+    for word in _WORD.findall(text.lower()):
+        word = word.strip("'")
+        if word.endswith("'s"):
+            word = word[:-2]
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        if word and word not in _STOPWORDS:
+            out.add(zlib.crc32(word.encode()))
+    return out
+
+
+def _u32(values) -> array:
+    arr = array("I", values)
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def read_source(path: str = SOURCE_PATH) -> list:
+    """Rows of a quotes TSV as dicts with ``quote``, ``author``, ``category`` and ``tags``."""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for line, row in enumerate(csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE), start=2):
+            quote = (row.get("quote") or "").strip()
+            if not quote:
+                continue
+            tags = (row.get("tags") or "").split()
+            unknown = [t for t in tags if t not in _TAG_BITS]
+            if unknown:
+                raise ValueError(f"{path}:{line}: unknown tag(s) {', '.join(unknown)}; expected {TAGS}")
+            rows.append({
+                "quote": quote,
+                "author": (row.get("author") or "").strip() or "Unknown",
+                "category": (row.get("category") or "").strip(),
+                "tags": tags,
+            })
+    return rows
+
+
+def build_index(rows: list) -> bytes:
+    """Compile quote rows into the binary index format."""
+    text = bytearray()
+    strings, string_ids = [], {}
+    records = []
+    term_postings = defaultdict(list)
+    tag_postings = [[] for _ in TAGS]
+
+    def intern(value: str) -> int:
+        if value not in string_ids:
+            data = value.encode()
+            string_ids[value] = len(strings) // 2
+            strings.extend((len(text), len(data)))
+            text.extend(data)
+        return string_ids[value]
+
+    seen = set()
+    for row in rows:
+        if row["quote"] in seen:
+            continue
+        seen.add(row["quote"])
+        qid = len(records) // _RECORD_FIELDS
+        data = row["quote"].encode()
+        offset = len(text)
+        text.extend(data)
+        # Keywords in the quote itself also count, e.g. "worry" under anxious
+        analysis = analyze_user_emotion(row["quote"])
+        tags = set(row["tags"]) | set(analysis["all_emotions"]) | set(analysis["themes"])
+        mask = 0
+        for tag in tags:
+            mask |= _TAG_BITS[tag]
+            tag_postings[TAGS.index(tag)].append(qid)
+        records.extend((offset, len(data), intern(row["author"]), intern(row["category"]), mask))
+        for term in terms(row["quote"]):
+            term_postings[term].append(qid)
+
+    sorted_terms = sorted(term_postings)
+    term_offsets, postings = [0], []
+    for term in sorted_terms:
+        postings.extend(term_postings[term])
+        term_offsets.append(len(postings))
+    tag_offsets, tag_flat = [0], []
+    for ids in tag_postings:
+        tag_flat.extend(ids)
+        tag_offsets.append(len(tag_flat))
+
+    sections = [
+        bytes(text),
+        _u32(records).tobytes(),
+        _u32(strings).tobytes(),
+        _u32(sorted_terms).tobytes(),
+        _u32(term_offsets).tobytes(),
+        _u32(postings).tobytes(),
+        _u32(tag_offsets).tobytes(),
+        _u32(tag_flat).tobytes(),
+    ]
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, len(sections)))
+    table_at = len(out)
+    out.extend(b"\0" * _SECTION.size * len(sections))
+    table = []
+    for section in sections:
+        out.extend(b"\0" * (-len(out) % 4))
+        table.append((len(out), len(section)))
+        out.extend(section)
+    for i, entry in enumerate(table):
+        _SECTION.pack_into(out, table_at + i * _SECTION.size, *entry)
+    return bytes(out)
+
+
+class QuoteIndex:
+    """Read-only view of a compiled quote index."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, count = _HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION or count != len(SECTIONS):
+            raise ValueError("not a quote index (or built by another version); rebuild it with `python quotes.py build`")
+        sections = {}
+        for i, name in enumerate(SECTIONS):
+            offset, length = _SECTION.unpack_from(buffer, _HEADER.size + i * _SECTION.size)
+            sections[name] = view[offset:offset + length]
+        self._text = sections.pop("text")
+        if sys.byteorder == "big":
+            arrays = {name: _u32(array("I", bytes(mv))) for name, mv in sections.items()}
+        else:
+            arrays = {name: mv.cast("I") for name, mv in sections.items()}
+        self._records = arrays["records"]
+        self._strings = arrays["strings"]
+        self._terms = arrays["terms"]
+        self._term_offsets = arrays["term_offsets"]
+        self._term_postings = arrays["term_postings"]
+        self._tag_offsets = arrays["tag_offsets"]
+        self._tag_postings = arrays["tag_postings"]
+
+    @classmethod
+    def open(cls, path: str = INDEX_PATH) -> "QuoteIndex":
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self._records) // _RECORD_FIELDS
+
+    def _string(self, string_id: int) -> str:
+        offset, length = self._strings[2 * string_id], self._strings[2 * string_id + 1]
+        return str(self._text[offset:offset + length], "utf-8")
+
+    def quote_text(self, qid: int) -> str:
+        offset, length = self._records[qid * _RECORD_FIELDS], self._records[qid * _RECORD_FIELDS + 1]
+        return str(self._text[offset:offset + length], "utf-8")
+
+    def get(self, qid: int) -> dict:
+        """Quote ``qid`` as a QUOTE_ITEM-shaped dict (without ``context``)."""
+        base = qid * _RECORD_FIELDS
+        quote = {"quote": self.quote_text(qid), "author": self._string(self._records[base + 2])}
+        category = self._string(self._records[base + 3])
+        if category:
+            quote["category"] = category
+        return quote
+
+    def tags(self, qid: int) -> list:
+        mask = self._records[qid * _RECORD_FIELDS + 4]
+        return [tag for tag in TAGS if mask & _TAG_BITS[tag]]
+
+    def with_tag(self, tag: str):
+        i = TAGS.index(tag)
+        return self._tag_postings[self._tag_offsets[i]:self._tag_offsets[i + 1]]
+
+    def with_term(self, term: int):
+        i = bisect_left(self._terms, term)
+        if i == len(self._terms) or self._terms[i] != term:
+            return ()
+        return self._term_postings[self._term_offsets[i]:self._term_offsets[i + 1]]
+
+    def score(self, text: str = "", emotions=(), themes=()) -> dict:
+        """Relevance of every matching quote: tag matches plus idf-weighted shared words."""
+        scores = defaultdict(float)
+        for i, emotion in enumerate(e for e in emotions if e in _TAG_BITS):
+            weight = PRIMARY_EMOTION_WEIGHT if i == 0 else EMOTION_WEIGHT
+            for qid in self.with_tag(emotion):
+                scores[qid] += weight
+        for theme in themes:
+            if theme in _TAG_BITS:
+                for qid in self.with_tag(theme):
+                    scores[qid] += THEME_WEIGHT
+        total = len(self)
+        for term in terms(text):
+            postings = self.with_term(term)
+            if postings:
+                idf = math.log(1 + total / len(postings))
+                for qid in postings:
+                    scores[qid] += idf
+        return scores
+
+    def search(self, text: str = "", emotions=(), themes=(), k: int = 5, exclude=(), rng=None,
+               pool_factor: int = 3) -> list:
+        """Return ``k`` relevant quotes, best first.
+
+        ``k`` are sampled from the top ``k * pool_factor`` so repeated
+        searches for the same text do not always return the same quotes;
+        ``exclude`` lists quote texts the caller has already used.
+        """
+        rng = rng or random
+        excluded = {q.strip().lower() for q in exclude}
+        scores = self.score(text, emotions, themes)
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        if len(ranked) < k:
+            # Not enough matches: pad with arbitrary quotes rather than return too few
+            rest = [qid for qid in range(len(self)) if qid not in scores]
+            ranked += rng.sample(rest, min(len(rest), k * pool_factor))
+        pool = [qid for qid in ranked if self.quote_text(qid).lower() not in excluded][:k * pool_factor]
+        chosen = sorted(rng.sample(pool, min(k, len(pool))), key=lambda qid: -scores.get(qid, 0.0))
+        return [self.get(qid) for qid in chosen]
+
+    def for_text(self, user_text: str, k: int = 5, exclude=(), rng=None) -> list:
+        """Quotes for a user's message, using its emotions, themes and words."""
+        analysis = analyze_user_emotion(user_text)
+        return self.search(user_text, analysis["all_emotions"], analysis["themes"], k, exclude, rng)
+
+
+@lru_cache(maxsize=None)
+def load_quote_index(path: str = INDEX_PATH):
+    """The shared bundled index, or None if it has not been built."""
+    if not os.path.exists(path):
+        return None
+    return QuoteIndex.open(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the bundled quote index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile a quotes TSV into the binary index")
+    build.add_argument("source", nargs="?", default=SOURCE_PATH)
+    build.add_argument("output", nargs="?", default=INDEX_PATH)
+    search = commands.add_parser("search", help="print the quotes retrieved for a text")
+    search.add_argument("text")
+    search.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        rows = read_source(args.source)
+        data = build_index(rows)
+        with open(args.output, "wb") as f:
+            f.write(data)
+        print(f"{len(rows)} quotes -> {args.output} ({len(data) / 1024:.1f} KiB)")
+    else:
+        index = QuoteIndex.open()
+        for quote in index.for_text(args.text, args.k):
+            print(f'"{quote["quote"]}" — {quote["author"]}')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Result rendering as batched HTML.
+
+Each result section (the message, the quote collection) is built as one HTML
+string and sent to the browser with a single ``st.markdown`` call, instead
+of one call per step, quote and heading. Finished results are cached by a
+hash of their content, so reruns that show the same result skip the
+formatting work entirely.
+
+Speech is handled by one component (``assets/tts.html``) whose HTML never
+changes, so the browser keeps the same iframe across reruns. The result
+HTML carries a hidden ``tts-payload`` element with the text to speak, which
+the component picks up from the page.
+"""
+import hashlib
+import html
+import json
+import re
+import threading
+from collections import OrderedDict
+
+CACHE_SIZE = 256
+
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_ITALIC = re.compile(r"(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?![*\w])")
+
+_sections = OrderedDict()  # (result hash, kind, include_steps) -> tuple of section HTML
+_lock = threading.Lock()
+
+
+def result_hash(data: dict) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+def inline(text) -> str:
+    """Escape model text as HTML, keeping **bold**, *italic* and line breaks."""
+    escaped = html.escape(str(text or ""))
+    escaped = _ITALIC.sub(r"<em>\1</em>", _BOLD.sub(r"<strong>\1</strong>", escaped))
+    return escaped.replace("\n", "<br>")
+
+
+def quote_html(q: dict, number: int = None, category: bool = False) -> str:
+    prefix = f"<strong>{number}.</strong> " if number is not None else ""
+    parts = [f'{prefix}"{inline(q.get("quote", ""))}" — <em>{inline(q.get("author", ""))}</em>']
+    if q.get("context"):
+        parts.append(f"💡 {inline(q['context'])}")
+    if category and q.get("category"):
+        parts.append(f"🏷️ Category: {inline(q['category'])}")
+    return f'<div class="quote-box">{"<br>".join(parts)}</div>'
+
+
+def message_html(data: dict, include_steps: bool = True) -> str:
+    out = ['<div class="motivation-box"><h3>💫 Your Personalized Motivation</h3>',
+           f'<p>{inline(data.get("motivation", ""))}</p></div>']
+    if include_steps and data.get("steps"):
+        out.append("<h3>🎯 Action Steps</h3>")
+        out += [f'<div class="step-box"><strong>{i}.</strong> {inline(step)}</div>'
+                for i, step in enumerate(data["steps"], 1)]
+    if data.get("mantra"):
+        out.append(f'<div class="mantra-box">🎭 Your Mantra: "{inline(data["mantra"])}"</div>')
+    if data.get("daily_affirmation"):
+        out.append(f'<div class="mantra-box">✨ Daily Affirmation: "{inline(data["daily_affirmation"])}"</div>')
+    if data.get("reflection_questions"):
+        out.append("<h3>🤔 Reflection Questions</h3>")
+        out += [f"<p><strong>{i}.</strong> {inline(question)}</p>"
+                for i, question in enumerate(data["reflection_questions"], 1)]
+    if data.get("quotes"):
+        out.append("<h3>📚 Inspiring Quotes</h3>")
+        out += [quote_html(q) for q in data["quotes"]]
+    return "".join(out)
+
+
+def quotes_html(data: dict) -> str:
+    out = []
+    if data.get("quotes"):
+        out.append("<h3>📚 Curated Quotes for You</h3>")
+        out += [quote_html(q, i, category=True) for i, q in enumerate(data["quotes"], 1)]
+    if data.get("theme"):
+        out.append(f"<h3>🎯 Theme: {inline(data['theme'])}</h3>")
+    if data.get("reflection"):
+        out.append(f'<h3>💭 Deep Reflection</h3><div class="reflection-box">{inline(data["reflection"])}</div>')
+    if data.get("application"):
+        out.append(f"<h3>🚀 How to Apply This Wisdom</h3><p>{inline(data['application'])}</p>")
+    return "".join(out)
+
+
+def build_sections(data: dict, kind: str, include_steps: bool = True) -> tuple:
+    if kind == "both":
+        sections = []
+        if data.get("message"):
+            sections.append(message_html(data["message"], include_steps))
+        if data.get("quote"):
+            sections.append("<hr>" + quotes_html(data["quote"]))
+        return tuple(sections)
+    if kind == "quote":
+        return (quotes_html(data),)
+    return (message_html(data, include_steps),)
+
+
+def render_sections(data: dict, kind: str, include_steps: bool = True, cache: bool = True) -> tuple:
+    """HTML for each section of a result; pass ``cache=False`` for partial results that are about to change."""
+    if not cache:
+        return build_sections(data, kind, include_steps)
+    key = (result_hash(data), kind, include_steps)
+    with _lock:
+        sections = _sections.get(key)
+        if sections is not None:
+            _sections.move_to_end(key)
+            return sections
+    sections = build_sections(data, kind, include_steps)
+    with _lock:
+        _sections[key] = sections
+        while len(_sections) > CACHE_SIZE:
+            _sections.popitem(last=False)
+    return sections
+
+
+def speech(data: dict, kind: str) -> tuple:
+    """``(title, text)`` read aloud for a result."""
+    if kind == "quote":
+        quotes = data.get("quotes") or []
+        first = f"{quotes[0].get('quote', '')} — {quotes[0].get('author', '')}" if quotes else ""
+        return "Quote Collection", f"{first} {data.get('reflection', '')}".strip()
+    msg = (data.get("message") or {}) if kind == "both" else data
+    text = " ".join(msg.get(k, "") for k in ("motivation", "mantra", "daily_affirmation")).strip()
+    return ("Complete Experience" if kind == "both" else "Motivational Message"), text
+
+
+def speech_payload(title: str, text: str, key: str, autospeak: bool = False) -> str:
+    """Hidden element the speech component reads; ``key`` changes when there is new text to auto-speak."""
+    attrs = {"title": title, "text": text, "key": key, "autospeak": str(autospeak).lower()}
+    return ('<div class="tts-payload" style="display:none" '
+            + " ".join(f'data-{name}="{html.escape(value, quote=True)}"' for name, value in attrs.items()) + "></div>")
@@ -0,0 +1,299 @@
+"""Record model exchanges to a compact log and replay them without the network.
+
+``RecordingClient`` wraps a Gemini client and appends one JSON line per
+model call to a gzip file: the model, the prompt, the request config, the
+raw response (or, for a streamed response, each chunk with its offset) and
+the token usage. The system instruction is the same for every request, so
+it is written once and later records refer to it by digest.
+
+A log can be used in two ways:
+
+* ``ReplayClient`` stands in for the client, so the generator runs its whole
+  pipeline offline (caches, routing, parsing, rendering). Responses are
+  matched to requests by prompt, so record with ``GENERATION_SEED`` set,
+  which makes the prompts the same from run to run. ``speed`` reproduces the
+  recorded latencies (1.0 is real time; 0 does not wait).
+* ``python replay.py <log>`` feeds every recorded response through
+  ``parse_loose_json``, ``validate_payload`` and the renderers. It reports
+  the time spent in each stage next to the recorded model latency.
+  ``--strict`` exits non-zero if any response no longer parses, so a log of
+  real responses works as a regression test.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+FORMAT = 1
+USAGE_FIELDS = ("prompt_token_count", "cached_content_token_count", "candidates_token_count")
+
+
+def prompt_key(contents: str) -> str:
+    return hashlib.blake2b(contents.encode(), digest_size=12).hexdigest()
+
+
+def config_dict(cfg) -> dict:
+    """A ``GenerateContentConfig`` (or a plain dict) as JSON-ready data."""
+    if hasattr(cfg, "model_dump"):
+        return cfg.model_dump(mode="json", exclude_none=True)
+    return {k: v for k, v in dict(cfg or {}).items() if v is not None}
+
+
+def usage_dict(resp) -> dict:
+    usage = getattr(resp, "usage_metadata", None)
+    return {name: getattr(usage, name, None) or 0 for name in USAGE_FIELDS} if usage else {}
+
+
+def raw_text(record: dict) -> str:
+    if "chunks" in record:
+        return "".join(text for _, text in record["chunks"]).strip()
+    return record.get("raw", "")
+
+
+class Recorder:
+    """Appends records to a gzip JSON-lines file; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._systems = set()
+        self.count = 0
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            # A sync flush per record, so a crash loses at most the record being written
+            self._file.flush()
+            self.count += 1
+
+    def exchange(self, model: str, contents: str, cfg, seconds: float, usage: dict, raw: str = None,
+                 chunks: list = None):
+        config = config_dict(cfg)
+        system = config.pop("system_instruction", None)
+        if isinstance(system, str):
+            digest = prompt_key(system)
+            with self._lock:
+                first = digest not in self._systems
+                self._systems.add(digest)
+            if first:
+                self.write({"v": FORMAT, "system": digest, "text": system})
+            config["system_instruction"] = {"ref": digest}
+        record = {"v": FORMAT, "at": round(time.time(), 3), "model": model, "key": prompt_key(contents),
+                  "prompt": contents, "config": config, "seconds": round(seconds, 4), "usage": usage}
+        if chunks is not None:
+            record["chunks"] = chunks
+        else:
+            record["raw"] = raw
+        self.write(record)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_log(path: str):
+    """Yield the exchanges in a log, oldest first; a record cut off by a crash ends the log."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    return
+                if "prompt" in record:
+                    yield record
+        except EOFError:
+            return
+
+
+class _RecordingModels:
+    def __init__(self, models, recorder: Recorder):
+        self._models = models
+        self._recorder = recorder
+
+    def generate_content(self, model: str, contents: str, config=None):
+        started = time.perf_counter()
+        resp = self._models.generate_content(model=model, contents=contents, config=config)
+        self._recorder.exchange(model, contents, config, time.perf_counter() - started, usage_dict(resp),
+                                raw=(getattr(resp, "text", None) or "").strip())
+        return resp
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        started = time.perf_counter()
+        chunks, chunk = [], None
+        for chunk in self._models.generate_content_stream(model=model, contents=contents, config=config):
+            chunks.append((round((time.perf_counter() - started) * 1000, 1), getattr(chunk, "text", None) or ""))
+            yield chunk
+        # Only complete streams are recorded; one abandoned at a deadline never reaches this point
+        self._recorder.exchange(model, contents, config, time.perf_counter() - started, usage_dict(chunk),
+                                chunks=chunks)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+class RecordingClient:
+    """A Gemini client that records every ``generate_content`` call; other attributes pass through."""
+
+    def __init__(self, client, recorder: Recorder):
+        self._client = client
+        self.recorder = recorder
+        self.models = _RecordingModels(client.models, recorder)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class ReplayMiss(LookupError):
+    """No recorded response for a prompt."""
+    # Read by resilience.status_code: a 404 is not retried
+    code = 404
+
+
+def _response(text: str, usage: dict = None):
+    return SimpleNamespace(text=text, usage_metadata=SimpleNamespace(**usage) if usage else None)
+
+
+class _ReplayModels:
+    def __init__(self, client: "ReplayClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents: str, config=None):
+        record = self._client.find(model, contents)
+        self._client.wait(record["seconds"])
+        return _response(raw_text(record), record.get("usage"))
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        record = self._client.find(model, contents)
+        chunks = record.get("chunks") or [(record["seconds"] * 1000, record.get("raw", ""))]
+        started = time.perf_counter()
+        for i, (offset_ms, text) in enumerate(chunks):
+            # Offsets are in recorded time; elapsed time is scaled by the replay speed
+            self._client.wait(offset_ms / 1000 - (time.perf_counter() - started) * self._client.speed)
+            yield _response(text, record.get("usage") if i == len(chunks) - 1 else None)
+
+
+class ReplayClient:
+    """Answers ``generate_content`` calls from a log instead of the API.
+
+    A prompt recorded several times replays its responses in turn. A prompt
+    recorded for another model is used when there is none for the requested
+    one, since routing may pick differently offline.
+    """
+
+    def __init__(self, records, speed: float = 0.0):
+        self.speed = speed
+        self._by_model = {}
+        self._by_prompt = {}
+        for record in records:
+            self._by_model.setdefault((record["model"], record["key"]), []).append(record)
+            self._by_prompt.setdefault(record["key"], []).append(record)
+        self._turns = {}
+        self._lock = threading.Lock()
+        self.stats = {"replayed": 0, "misses": 0}
+        self.models = _ReplayModels(self)
+
+    @classmethod
+    def open(cls, path: str, speed: float = 0.0) -> "ReplayClient":
+        return cls(read_log(path), speed)
+
+    def find(self, model: str, contents: str) -> dict:
+        key = prompt_key(contents)
+        with self._lock:
+            candidates = self._by_model.get((model, key)) or self._by_prompt.get(key)
+            if not candidates:
+                self.stats["misses"] += 1
+                raise ReplayMiss(f"no recorded response for this prompt ({key})")
+            turn = self._turns.get(key, 0)
+            self._turns[key] = turn + 1
+            self.stats["replayed"] += 1
+            return candidates[turn % len(candidates)]
+
+    def wait(self, seconds: float):
+        if self.speed > 0 and seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def __len__(self):
+        return len(self._by_prompt)
+
+
+# -------------------- Offline pipeline --------------------
+_MODE = re.compile(r"^MODE: (\w+)$", re.M)
+_CURATED = re.compile(r'^\d+\. "(.*)" — (.*)$')
+
+
+def curated_quotes(prompt: str) -> list:
+    """The corpus quotes listed in a quote_context prompt."""
+    if "CURATED QUOTES:" not in prompt:
+        return []
+    lines = prompt.split("CURATED QUOTES:", 1)[1].splitlines()
+    return [{"quote": m.group(1), "author": m.group(2)} for m in map(_CURATED.match, lines) if m]
+
+
+def run_pipeline(record: dict) -> tuple:
+    """Parse, validate and render one recorded response; ``(payload or None, {stage: seconds})``."""
+    # Imported here so reading and writing logs needs none of the generation modules
+    from generation import merge_quote_context
+    from parsing import parse_loose_json, validate_payload
+    from rendering import render_sections
+
+    match = _MODE.search(record["prompt"])
+    shape = match.group(1) if match else "message"
+    timings = {}
+    started = time.perf_counter()
+    parsed = parse_loose_json(raw_text(record))
+    timings["parse"] = time.perf_counter() - started
+    started = time.perf_counter()
+    data, _problems = validate_payload(parsed, shape)
+    if data and shape == "quote_context":
+        data, _problems = validate_payload(merge_quote_context(curated_quotes(record["prompt"]), data), "quote")
+    timings["validate"] = time.perf_counter() - started
+    if data:
+        started = time.perf_counter()
+        render_sections(data, data.get("type") or shape, True, cache=False)
+        timings["render"] = time.perf_counter() - started
+    return data, timings
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded model responses through the parser and renderers.")
+    parser.add_argument("log", help="a log written with GEMINI_RECORD")
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the log, for steadier timings")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 if any response fails to parse")
+    args = parser.parse_args()
+
+    records = list(read_log(args.log))
+    stages = {"model": [record["seconds"] for record in records]}
+    failures = []
+    for n in range(args.repeat):
+        for i, record in enumerate(records):
+            data, timings = run_pipeline(record)
+            for stage, seconds in timings.items():
+                stages.setdefault(stage, []).append(seconds)
+            if data is None and n == 0:
+                failures.append(i)
+
+    print(f"{len(records)} exchanges, {len(failures)} failed to parse")
+    print(f"{'stage':<10} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for stage, values in stages.items():
+        print(f"{stage:<10} {_percentile(values, 0.5) * 1000:10.3f} {_percentile(values, 0.95) * 1000:10.3f} "
+              f"{max(values, default=0) * 1000:10.3f}")
+    for i in failures[:10]:
+        print(f"  #{i} ({records[i]['model']}): {raw_text(records[i])[:80]!r}")
+    if args.strict and failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
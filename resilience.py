@@ -0,0 +1,267 @@
+"""Timeouts, retries, hedging and circuit breaking for model requests.
+
+``RequestExecutor.execute`` runs a zero-argument request function with:
+
+* a per-attempt deadline,
+* bounded exponential backoff with full jitter between retryable failures
+  (timeouts, HTTP 429 and 5xx),
+* optional hedging: when an attempt is still running after the observed p95
+  latency, a second identical request is sent and the first valid response
+  wins,
+* a circuit breaker that fails fast with ``CircuitOpenError`` while the
+  upstream keeps failing, so callers can fall back immediately.
+"""
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """The caller's overall time budget for a request ran out."""
+
+
+class AttemptTimeout(Exception):
+    """Raised when an attempt does not finish within its deadline."""
+
+
+def status_code(exc: Exception):
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (AttemptTimeout, TimeoutError, ConnectionError)):
+        return True
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # httpx transport errors carry no status code
+    return type(exc).__name__ in ("ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError")
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures for ``reset_after`` seconds."""
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                return "half-open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_after or self._trial_in_flight:
+                return False
+            # Half-open: let a single trial request through
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self):
+        """End a request that proved nothing about the upstream, freeing a half-open trial slot."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class RequestExecutor:
+    def __init__(self, attempt_timeout: float = 30.0, max_attempts: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 8.0,
+                 hedge: bool = False, hedge_percentile: float = 95.0, hedge_min_samples: int = 20,
+                 breaker: CircuitBreaker = None, max_workers: int = 16):
+        self.attempt_timeout = attempt_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "hedges": 0,
+                      "timeouts": 0, "failures": 0, "short_circuited": 0, "deadline_exceeded": 0}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="request")
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given (1-based) retry number."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def hedge_delay(self):
+        if not self.hedge or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _submit(self, fn, stops: list):
+        if stops is None:
+            return self._pool.submit(fn)
+        stop = threading.Event()
+        stops.append(stop)
+        return self._pool.submit(fn, stop)
+
+    def _attempt(self, fn, hedge: bool, timeout: float = None, stoppable: bool = False):
+        """Run one attempt (plus an optional hedge) and return the first successful result."""
+        stops = [] if stoppable else None
+        try:
+            return self._run_attempt(fn, hedge, timeout, stops)
+        finally:
+            # Whatever is still running has lost the race or timed out; a finished call ignores this
+            for stop in stops or ():
+                stop.set()
+
+    def _run_attempt(self, fn, hedge: bool, timeout: float, stops: list):
+        started = time.monotonic()
+        limit = self.attempt_timeout if timeout is None else timeout
+        deadline = started + limit
+        futures = {self._submit(fn, stops)}
+        self._count("attempts")
+        hedge_at = self.hedge_delay() if hedge else None
+        last_error = None
+
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wait_for = deadline - now
+            if hedge_at is not None:
+                wait_for = min(wait_for, max(0.0, started + hedge_at - now))
+            done, futures = wait(futures, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.latency.record(time.monotonic() - started)
+                return result
+            if hedge_at is not None and time.monotonic() >= started + hedge_at:
+                hedge_at = None
+                if futures:
+                    futures.add(self._submit(fn, stops))
+                    self._count("hedges")
+                    self._count("attempts")
+            if not futures and last_error is not None:
+                raise last_error
+
+        # Abandoned requests keep running on their worker thread; their result is ignored
+        for future in futures:
+            future.cancel()
+        self._count("timeouts")
+        raise AttemptTimeout(f"No response within {limit:.1f}s")
+
+    def execute(self, fn, hedge: bool = True, timeout: float = None, stoppable: bool = False):
+        """Call ``fn`` with deadlines, retries and hedging; raise the last error if all attempts fail.
+
+        ``timeout`` bounds the whole call, retries and backoff included; when it
+        runs out DeadlineExceeded is raised without counting a failure, since a
+        slow answer is not a failing upstream; a half-open trial slot is freed
+        so the next request can try again.
+
+        With ``stoppable`` each call is ``fn(stop)``, where ``stop`` is an event
+        of its own that is set once its result is no longer wanted (it timed
+        out or another hedge won), so it can stop work and side effects early.
+        """
+        self._count("requests")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("Upstream is failing; request short-circuited")
+
+        budget_end = time.monotonic() + timeout if timeout is not None else None
+        for attempt in range(1, self.max_attempts + 1):
+            attempt_timeout = None
+            if budget_end is not None:
+                attempt_timeout = min(self.attempt_timeout, budget_end - time.monotonic())
+                if attempt_timeout <= 0:
+                    self._count("deadline_exceeded")
+                    self.breaker.release()
+                    raise DeadlineExceeded(f"No response within the {timeout:.1f}s budget")
+            try:
+                result = self._attempt(fn, hedge, attempt_timeout, stoppable)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if budget_end is not None and retryable and time.monotonic() >= budget_end:
+                    self._count("deadline_exceeded")
+                    self.breaker.release()
+                    raise DeadlineExceeded(f"No response within the {timeout:.1f}s budget") from e
+                if attempt < self.max_attempts and retryable:
+                    self._count("retries")
+                    delay = self.backoff(attempt)
+                    if budget_end is not None:
+                        delay = min(delay, max(0.0, budget_end - time.monotonic()))
+                    time.sleep(delay)
+                    continue
+                self._count("failures")
+                if retryable:
+                    self.breaker.record_failure()
+                elif 400 <= (status_code(e) or 0) < 500:
+                    # The upstream answered (e.g. a 400), so it is not down
+                    self.breaker.record_success()
+                else:
+                    # Cancelled, or failed on this side: nothing was learned about the upstream
+                    self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
@@ -0,0 +1,112 @@
+"""Model routing by input complexity and a latency target.
+
+With the model setting on ``auto``, ``ModelRouter`` picks the model for each
+request: greetings can be answered from a local template, short inputs go
+to the fastest tier, and longer or emotionally mixed inputs may use more
+capable tiers. A tier is only picked while its live p95 latency is within
+the SLO.
+Every routed request also gets a deadline after which the caller abandons
+the chosen model and asks the fastest tier instead, leaving that tier its
+own p95 to finish within the SLO.
+"""
+import threading
+from dataclasses import dataclass
+
+from emotion import analyze_user_emotion
+from resilience import LatencyTracker
+
+AUTO_MODEL = "auto"
+# Least to most capable, one model family so that each tier is also slower than the last; the
+# first is the deadline fallback
+DEFAULT_TIERS = ("gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-pro")
+COMPLEXITIES = ("greeting", "simple", "normal", "complex")
+
+
+@dataclass(frozen=True)
+class Route:
+    """Where one request goes: ``models`` in the order to try, or ``local`` for a template answer."""
+    models: tuple
+    deadline: float = None  # seconds before giving up on models[0]
+    local: bool = False
+    complexity: str = "normal"
+
+
+def input_complexity(user_text: str, short_chars: int = 60, long_chars: int = 400) -> str:
+    analysis = analyze_user_emotion(user_text)
+    if analysis["is_greeting"]:
+        return "greeting"
+    if len(user_text) < short_chars and len(analysis["all_emotions"]) <= 1 and not analysis["themes"]:
+        return "simple"
+    if len(user_text) > long_chars or len(analysis["all_emotions"]) + len(analysis["themes"]) >= 3:
+        return "complex"
+    return "normal"
+
+
+class ModelRouter:
+    def __init__(self, tiers=DEFAULT_TIERS, slo_seconds: float = 20.0, percentile: float = 95.0,
+                 min_samples: int = 10, local_greetings: bool = True, probe_every: int = 20):
+        if not tiers:
+            raise ValueError("at least one model tier is required")
+        self.tiers = tuple(tiers)
+        self.slo_seconds = slo_seconds
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.local_greetings = local_greetings
+        # A tier over its SLO still gets every n-th eligible request, so its stats can show a recovery
+        self.probe_every = probe_every
+        self._latency = {}  # model -> LatencyTracker of successful requests
+        self._skipped = {}  # model -> eligible requests routed elsewhere since its last probe
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float):
+        with self._lock:
+            tracker = self._latency.get(model)
+            if tracker is None:
+                tracker = self._latency[model] = LatencyTracker()
+        tracker.record(seconds)
+
+    def latency(self, model: str):
+        """Observed p95 (or the configured percentile) for a model; None until enough samples."""
+        tracker = self._latency.get(model)
+        if tracker is None or len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.percentile)
+
+    def within_slo(self, model: str) -> bool:
+        observed = self.latency(model)
+        # Unmeasured models get the benefit of the doubt until they have a history
+        if observed is None or observed <= self.slo_seconds:
+            return True
+        with self._lock:
+            skipped = self._skipped.get(model, 0) + 1
+            probe = bool(self.probe_every) and skipped >= self.probe_every
+            self._skipped[model] = 0 if probe else skipped
+        return probe
+
+    def deadline(self, model: str):
+        """How long ``model`` may run before the fastest tier takes over; None if it is the fastest."""
+        fastest = self.tiers[0]
+        if model == fastest:
+            return None
+        reserve = self.latency(fastest)
+        # Leave the fallback its usual p95, but always give the chosen model at least half the budget
+        return max(self.slo_seconds / 2, self.slo_seconds - reserve) if reserve is not None else self.slo_seconds / 2
+
+    def route(self, user_text: str, model: str) -> Route:
+        """Route one request; an explicit ``model`` is kept but still gets a deadline and a fallback."""
+        complexity = input_complexity(user_text)
+        if model != AUTO_MODEL:
+            fallback = (self.tiers[0],) if model != self.tiers[0] else ()
+            return Route((model, *fallback), self.deadline(model) if fallback else None, complexity=complexity)
+        if complexity == "greeting" and self.local_greetings:
+            return Route((), local=True, complexity=complexity)
+
+        allowed = self.tiers[:max(1, COMPLEXITIES.index(complexity))]
+        chosen = next((tier for tier in reversed(allowed) if self.within_slo(tier)), self.tiers[0])
+        fallback = (self.tiers[0],) if chosen != self.tiers[0] else ()
+        return Route((chosen, *fallback), self.deadline(chosen) if fallback else None, complexity=complexity)
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = list(self._latency)
+        return {model: {"latency_s": self.latency(model), "samples": len(self._latency[model])} for model in models}
@@ -0,0 +1,214 @@
+"""Near-duplicate lookup for inputs the exact response cache misses.
+
+``create_context_hash`` only matches identical text, but much of the traffic
+is small rewordings ("I'm so tired of work" / "im so tired of my work").
+``SemanticCache`` indexes a MinHash signature of each input's word set and
+finds earlier inputs whose estimated Jaccard similarity is at least
+``threshold``. Only inputs in the same scope are compared. The generator
+makes the scope from the prompt-affecting settings plus the emotion,
+energy and theme bucket, so a match never crosses moods or settings.
+
+The index is built to handle a million entries with sub-millisecond
+lookups:
+
+* signatures are rows of one ``uint32`` NumPy matrix, used as a ring
+  buffer of ``max_entries`` slots;
+* LSH splits each signature into ``bands``, and for each band a sorted
+  array of band hashes is binary-searched to find candidates;
+* entries added since the last rebuild live in a small dict, and the
+  sorted arrays are rebuilt in a background thread once that dict grows.
+"""
+import hashlib
+import re
+import threading
+import zlib
+
+import numpy as np
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Largest prime below 2**32: (a * h + b) of 32-bit values then fits in uint64
+_PRIME = 4294967291
+# Apostrophes are dropped before splitting, so "I'm" and "im" both expand here
+CONTRACTIONS = {"im": "i am", "ive": "i have", "id": "i would", "ill": "i will", "dont": "do not",
+                "doesnt": "does not", "didnt": "did not", "cant": "can not", "cannot": "can not",
+                "wont": "will not", "isnt": "is not", "arent": "are not", "wasnt": "was not",
+                "couldnt": "could not", "shouldnt": "should not", "wouldnt": "would not",
+                "its": "it is", "thats": "that is", "youre": "you are", "theyre": "they are"}
+
+
+def tokens(text: str) -> set:
+    words = _WORD.findall(text.lower().replace("'", "").replace("’", ""))
+    return set(" ".join(CONTRACTIONS.get(w, w) for w in words).split())
+
+
+def scope_hash(scope: str) -> int:
+    return int.from_bytes(hashlib.blake2b(scope.encode(), digest_size=8).digest(), "little")
+
+
+class SemanticCache:
+    def __init__(self, threshold: float = 0.7, num_perm: int = 32, bands: int = 8, max_entries: int = 1000000,
+                 min_words: int = 3, max_candidates: int = 64, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max_entries
+        # Very short inputs are too easy to match by accident
+        self.min_words = min_words
+        # Per band; bounds the work when many stored inputs share a band
+        self.max_candidates = max_candidates
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, (num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, (num_perm, 1), dtype=np.uint64)
+        self._mix = rng.integers(1, 1 << 63, self.rows, dtype=np.uint64) | np.uint64(1)
+        self._sigs = np.zeros((0, num_perm), np.uint32)
+        self._scopes = np.zeros(0, np.uint64)
+        self._keys = []
+        self._size = 0
+        self._next = 0
+        self._seq = 0
+        self._sorted = [(np.zeros(0, np.uint64), np.zeros(0, np.int64))] * bands
+        self._recent = {}  # (band, band hash) -> [(slot, seq), ...] added since the last rebuild
+        self._recent_count = 0
+        self._rebuilding = False
+        self._lock = threading.Lock()
+        # A match only becomes a hit once the caller has a response to serve for it
+        self.stats = {"lookups": 0, "matches": 0, "hits": 0, "added": 0, "rebuilds": 0}
+
+    def signature(self, words: set) -> np.ndarray:
+        """MinHash of a word set: one minimum per random hash function."""
+        hashes = np.fromiter((zlib.crc32(w.encode()) for w in words), np.uint64, len(words))
+        return ((self._a * hashes + self._b) % np.uint64(_PRIME)).min(axis=1).astype(np.uint32)
+
+    def _band_hashes(self, sigs: np.ndarray, scopes: np.ndarray) -> np.ndarray:
+        """``(n, bands)`` uint64 hashes of each band of each signature, salted with its scope."""
+        grouped = sigs.reshape(len(sigs), self.bands, self.rows).astype(np.uint64)
+        with np.errstate(over="ignore"):
+            mixed = (grouped * self._mix).sum(axis=2, dtype=np.uint64)
+            return mixed ^ (scopes[:, None] * np.uint64(0x9E3779B97F4A7C15)) ^ np.arange(self.bands, dtype=np.uint64)
+
+    def _candidates(self, band_hashes) -> set:
+        found = set()
+        for band, value in enumerate(band_hashes):
+            hashes, slots = self._sorted[band]
+            lo, hi = np.searchsorted(hashes, value), np.searchsorted(hashes, value, side="right")
+            # Equal hashes are ordered by slot, i.e. by age until the ring buffer wraps
+            if hi > lo:
+                found.update(slots[max(lo, hi - self.max_candidates):hi].tolist())
+            found.update(slot for slot, _ in self._recent.get((band, int(value)), ())[-self.max_candidates:])
+        return found
+
+    def _best(self, sig: np.ndarray, scope: int, band_hashes, exclude: str = None):
+        candidates = [slot for slot in self._candidates(band_hashes) if self._keys[slot] != exclude]
+        if not candidates:
+            return None, 0.0
+        slots = np.fromiter(candidates, np.int64, len(candidates))
+        similarity = (self._sigs[slots] == sig).mean(axis=1)
+        # Slots may have been reused by the ring buffer since they were indexed
+        similarity[self._scopes[slots] != np.uint64(scope)] = 0.0
+        best = int(similarity.argmax())
+        return int(slots[best]), float(similarity[best])
+
+    def lookup(self, text: str, scope: str, exclude: str = None):
+        """The key stored for the most similar earlier input in ``scope``, or None.
+
+        ``exclude`` skips one key, normally the input's own exact key. Call
+        ``record_hit`` if a response is then served for the key.
+        """
+        words = tokens(text)
+        with self._lock:
+            self.stats["lookups"] += 1
+        if len(words) < self.min_words:
+            return None
+        sig = self.signature(words)
+        scope = scope_hash(scope)
+        band_hashes = self._band_hashes(sig[None], np.array([scope], np.uint64))[0]
+        with self._lock:
+            slot, similarity = self._best(sig, scope, band_hashes, exclude)
+            if slot is None or similarity < self.threshold:
+                return None
+            self.stats["matches"] += 1
+            return self._keys[slot]
+
+    def record_hit(self):
+        with self._lock:
+            self.stats["hits"] += 1
+
+    def add(self, text: str, scope: str, key: str):
+        """Index ``text`` under ``scope``; ``key`` is what ``lookup`` returns for its near-duplicates."""
+        words = tokens(text)
+        if len(words) < self.min_words:
+            return
+        sig = self.signature(words)
+        scope = scope_hash(scope)
+        band_hashes = self._band_hashes(sig[None], np.array([scope], np.uint64))[0]
+        with self._lock:
+            slot, similarity = self._best(sig, scope, band_hashes)
+            if slot is not None and similarity == 1.0 and self._keys[slot] == key:
+                return
+            self._insert(sig, scope, band_hashes, key)
+
+    def _insert(self, sig, scope: int, band_hashes, key: str):
+        slot = self._next
+        if slot >= len(self._sigs):
+            self._grow()
+        self._sigs[slot] = sig
+        self._scopes[slot] = scope
+        if slot == len(self._keys):
+            self._keys.append(key)
+        else:
+            self._keys[slot] = key
+        self._seq += 1
+        for band, value in enumerate(band_hashes):
+            self._recent.setdefault((band, int(value)), []).append((slot, self._seq))
+        self._recent_count += 1
+        self._next = (slot + 1) % self.max_entries
+        self._size = max(self._size, slot + 1)
+        self.stats["added"] += 1
+        if not self._rebuilding and self._recent_count >= max(4096, self._size // 8):
+            self._rebuilding = True
+            threading.Thread(target=self._rebuild, daemon=True, name="semantic-rebuild").start()
+
+    def _grow(self):
+        capacity = min(self.max_entries, max(1024, 2 * len(self._sigs)))
+        sigs = np.zeros((capacity, self.num_perm), np.uint32)
+        scopes = np.zeros(capacity, np.uint64)
+        sigs[:len(self._sigs)] = self._sigs
+        scopes[:len(self._scopes)] = self._scopes
+        self._sigs, self._scopes = sigs, scopes
+
+    def _rebuild(self):
+        """Fold recent entries into the sorted band arrays, without holding the lock while sorting."""
+        try:
+            with self._lock:
+                size, seq = self._size, self._seq
+                sigs, scopes = self._sigs[:size].copy(), self._scopes[:size].copy()
+            hashes = self._band_hashes(sigs, scopes)
+            rebuilt = []
+            for band in range(self.bands):
+                order = np.argsort(hashes[:, band], kind="stable")
+                rebuilt.append((hashes[order, band], order.astype(np.int64)))
+            with self._lock:
+                self._sorted = rebuilt
+                # Entries added while sorting stay in the recent dict until the next rebuild
+                recent = {}
+                for band_key, entries in self._recent.items():
+                    kept = [(slot, s) for slot, s in entries if s > seq]
+                    if kept:
+                        recent[band_key] = kept
+                self._recent = recent
+                self._recent_count = self._seq - seq
+                self.stats["rebuilds"] += 1
+        finally:
+            self._rebuilding = False
+
+    def __len__(self):
+        return self._size
+
+    def summary(self) -> dict:
+        with self._lock:
+            total = self.stats["lookups"]
+            return {**self.stats, "entries": self._size, "pending_index": self._recent_count,
+                    "hit_rate": round(self.stats["hits"] / total, 3) if total else 0.0}
@@ -0,0 +1,92 @@
+"""Coalescing of identical in-flight calls.
+
+When many users send the same popular prompt at once, or one user clicks
+twice, each request would otherwise make its own model call. ``SingleFlight``
+lets the first caller for a key (the leader) do the work while later callers
+with the same key wait for its result. Partial results the leader publishes
+while streaming are forwarded to every waiter, and a waiter that joins late
+immediately receives the latest one. Exceptions are shared the same way.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.partial = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self.lock:
+            self.subscribers.append(callback)
+            partial = self.partial
+        if partial is not None:
+            _notify(callback, partial)
+
+    def publish(self, partial):
+        with self.lock:
+            self.partial = partial
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            _notify(callback, partial)
+
+
+def _notify(callback, partial):
+    # One waiter's broken callback must not fail the leader's request
+    try:
+        callback(partial)
+    except Exception:
+        logger.exception("partial update callback failed")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "followers": 0}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def do(self, key, fn, on_update=None) -> tuple:
+        """Run ``fn(publish)`` once per key among concurrent callers.
+
+        Returns ``(result, shared)``, where ``shared`` is True for callers that
+        received another caller's result. ``publish(partial)`` passes partial
+        results to the ``on_update`` of every caller.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats["leaders"] += 1
+            else:
+                self.stats["followers"] += 1
+        if on_update is not None:
+            flight.subscribe(on_update)
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn(flight.publish)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # Unregister before waking waiters so that later callers start a new flight
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
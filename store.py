@@ -0,0 +1,362 @@
+"""Persistent store of generated results, shared across sessions, processes and restarts.
+
+Every response the model produces is recorded with its context hash, cache
+key, mode and the emotion/theme bucket of the input, and can be looked up by
+any of them. Two backends are available:
+
+* ``SQLiteStore`` (default): one WAL-mode database file, safe for several
+  worker processes on the same host;
+* ``RedisStore``: any server speaking the Redis protocol (``redis://``
+  URLs), for workers on different hosts. Only basic string and sorted-set
+  commands are used, so small stand-ins such as
+  ``benchmarks/fake_redis.py`` work too.
+
+``ResultStore`` keeps writes off the request path: ``add`` only queues the
+record, and a background thread writes queued records in batches and
+periodically compacts the backend (dropping records older than
+``max_age_seconds`` and the oldest beyond ``max_records``).
+"""
+import json
+import logging
+import queue
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("context_hash", "cache_key", "mode", "emotion", "theme", "created", "payload")
+
+
+def make_record(context_hash: str, cache_key: str, mode: str, emotion: str, theme: str, payload: dict) -> dict:
+    return {"context_hash": context_hash, "cache_key": cache_key, "mode": mode, "emotion": emotion,
+            "theme": theme, "created": time.time(), "payload": payload}
+
+
+class SQLiteStore:
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " id INTEGER PRIMARY KEY, context_hash TEXT NOT NULL, cache_key TEXT NOT NULL, mode TEXT NOT NULL,"
+            " emotion TEXT NOT NULL, theme TEXT NOT NULL, created REAL NOT NULL, payload TEXT NOT NULL)"
+        )
+        for name, columns in (("context", "context_hash, created"), ("key", "cache_key, created"),
+                              ("bucket", "emotion, theme, created"), ("created", "created")):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS results_{name} ON results ({columns})")
+
+    def write_many(self, records: list):
+        rows = [(r["context_hash"], r["cache_key"], r["mode"], r["emotion"], r["theme"], r["created"],
+                 json.dumps(r["payload"], separators=(",", ":"))) for r in records]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO results (context_hash, cache_key, mode, emotion, theme, created, payload)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _select(self, where: str, args: tuple, mode: str, limit: int, since: float) -> list:
+        if mode is not None:
+            where += " AND mode = ?"
+            args += (mode,)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(FIELDS)} FROM results WHERE {where} AND created >= ?"
+                " ORDER BY created DESC LIMIT ?", args + (since, limit)).fetchall()
+        return [{**dict(zip(FIELDS, row)), "payload": json.loads(row[-1])} for row in rows]
+
+    def by_context(self, context_hash: str, mode: str = None, limit: int = 10, since: float = 0.0) -> list:
+        return self._select("context_hash = ?", (context_hash,), mode, limit, since)
+
+    def by_key(self, cache_key: str, limit: int = 10, since: float = 0.0) -> list:
+        return self._select("cache_key = ?", (cache_key,), None, limit, since)
+
+    def by_bucket(self, emotion: str, theme: str = None, mode: str = None, limit: int = 10,
+                  since: float = 0.0) -> list:
+        if theme is None:
+            return self._select("emotion = ?", (emotion,), mode, limit, since)
+        return self._select("emotion = ? AND theme = ?", (emotion, theme), mode, limit, since)
+
+    def compact(self, max_age_seconds: float, max_records: int) -> int:
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM results WHERE created < ?",
+                                         (time.time() - max_age_seconds,)).rowcount
+            removed += self._conn.execute(
+                "DELETE FROM results WHERE id IN (SELECT id FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (max_records,)).rowcount
+            # Fold the WAL back into the database so it does not keep growing
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return max(removed, 0)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class RespClient:
+    """Minimal Redis protocol client: pipelined commands over one socket."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, password: str = None,
+                 timeout: float = 5.0):
+        self._address = (host, port)
+        self._db = db
+        self._password = password
+        self._timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection(self._address, timeout=self._timeout)
+        self._file = self._sock.makefile("rb")
+        setup = ([("AUTH", self._password)] if self._password else []) + ([("SELECT", self._db)] if self._db else [])
+        if setup:
+            self._send(setup)
+
+    def _send(self, commands: list) -> list:
+        out = bytearray()
+        for command in commands:
+            out += b"*%d\r\n" % len(command)
+            for arg in command:
+                arg = arg if isinstance(arg, bytes) else str(arg).encode()
+                out += b"$%d\r\n%s\r\n" % (len(arg), arg)
+        self._sock.sendall(out)
+        # Read every reply before raising, so an error leaves the connection in sync
+        replies = [self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RuntimeError):
+                raise reply
+        return replies
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            if int(rest) < 0:
+                return None
+            data = self._file.read(int(rest) + 2)
+            return data[:-2]
+        if kind == b"*":
+            return None if int(rest) < 0 else [self._read() for _ in range(int(rest))]
+        raise ConnectionError(f"Unexpected reply: {line!r}")
+
+    def pipeline(self, commands: list) -> list:
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._send(commands)
+            except (OSError, ConnectionError):
+                # Drop the connection; the next call reconnects
+                self.close()
+                raise
+
+    def execute(self, *command):
+        return self.pipeline([command])[0]
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+        self._sock = self._file = None
+
+
+class RedisStore:
+    """Records as JSON strings, with sorted sets (scored by creation time) as indexes."""
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", prefix: str = "motivator:results"):
+        parsed = urlparse(url)
+        self.client = RespClient(parsed.hostname or "127.0.0.1", parsed.port or 6379,
+                                 int((parsed.path or "/0").lstrip("/") or 0), parsed.password)
+        self.prefix = prefix
+
+    def _indexes(self, record: dict) -> list:
+        p = self.prefix
+        return [f"{p}:all", f"{p}:context:{record['context_hash']}", f"{p}:key:{record['cache_key']}",
+                f"{p}:emotion:{record['emotion']}", f"{p}:bucket:{record['emotion']}:{record['theme']}"]
+
+    def write_many(self, records: list):
+        first = self.client.execute("INCRBY", f"{self.prefix}:id", len(records)) - len(records) + 1
+        commands = []
+        for record_id, record in enumerate(records, first):
+            commands.append(("SET", f"{self.prefix}:r:{record_id}", json.dumps(record, separators=(",", ":"))))
+            commands += [("ZADD", index, record["created"], record_id) for index in self._indexes(record)]
+        self.client.pipeline(commands)
+
+    def _select(self, index: str, mode: str, limit: int, since: float) -> list:
+        # Mode is filtered after fetching, so read a few extra ids when it is set
+        count = limit if mode is None else limit * 4
+        ids = self.client.execute("ZREVRANGEBYSCORE", f"{self.prefix}:{index}", "+inf", since, "LIMIT", 0, count)
+        if not ids:
+            return []
+        records = [json.loads(raw) for raw in self.client.execute("MGET", *(f"{self.prefix}:r:{i.decode()}"
+                                                                            for i in ids)) if raw]
+        return [r for r in records if mode is None or r["mode"] == mode][:limit]
+
+    def by_context(self, context_hash: str, mode: str = None, limit: int = 10, since: float = 0.0) -> list:
+        return self._select(f"context:{context_hash}", mode, limit, since)
+
+    def by_key(self, cache_key: str, limit: int = 10, since: float = 0.0) -> list:
+        return self._select(f"key:{cache_key}", None, limit, since)
+
+    def by_bucket(self, emotion: str, theme: str = None, mode: str = None, limit: int = 10,
+                  since: float = 0.0) -> list:
+        index = f"emotion:{emotion}" if theme is None else f"bucket:{emotion}:{theme}"
+        return self._select(index, mode, limit, since)
+
+    def compact(self, max_age_seconds: float, max_records: int) -> int:
+        all_index = f"{self.prefix}:all"
+        old = self.client.execute("ZRANGEBYSCORE", all_index, "-inf", f"({time.time() - max_age_seconds}")
+        total = self.client.execute("ZCARD", all_index) - len(old)
+        if total > max_records:
+            old += self.client.execute("ZRANGE", all_index, len(old), len(old) + total - max_records - 1)
+        removed = 0
+        for start in range(0, len(old), 500):
+            ids = [i.decode() for i in old[start:start + 500]]
+            raws = self.client.execute("MGET", *(f"{self.prefix}:r:{i}" for i in ids))
+            commands = [("DEL", *(f"{self.prefix}:r:{i}" for i in ids))]
+            for record_id, raw in zip(ids, raws):
+                indexes = self._indexes(json.loads(raw)) if raw else [all_index]
+                commands += [("ZREM", index, record_id) for index in indexes]
+            removed += self.client.pipeline(commands)[0]
+        return removed
+
+    def __len__(self):
+        return self.client.execute("ZCARD", f"{self.prefix}:all")
+
+
+class ResultStore:
+    def __init__(self, backend, batch_size: int = 64, flush_seconds: float = 1.0, max_pending: int = 10000,
+                 max_age_seconds: float = 7 * 86400, max_records: int = 100000, compact_seconds: float = 600.0):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_age_seconds = max_age_seconds
+        self.max_records = max_records
+        self.compact_seconds = compact_seconds
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "write_errors": 0, "compacted": 0, "lookups": 0}
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._idle = threading.Condition()
+        self._lock = threading.Lock()
+        self._last_compaction = time.monotonic()
+        threading.Thread(target=self._run, daemon=True, name="result-store").start()
+
+    def add(self, record: dict):
+        """Queue a record for the background writer; never blocks the caller."""
+        try:
+            self._pending.put_nowait(record)
+        except queue.Full:
+            # Losing a record only costs a future cache hit
+            self._count("dropped")
+            return
+        self._count("queued")
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._pending.get(timeout=self.flush_seconds)]
+            except queue.Empty:
+                batch = []
+            while batch and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            if time.monotonic() - self._last_compaction >= self.compact_seconds:
+                self._last_compaction = time.monotonic()
+                self.compact()
+
+    def _write(self, batch: list):
+        try:
+            self.backend.write_many(batch)
+            self._count("written", len(batch))
+        except Exception as e:
+            self._count("write_errors")
+            logger.warning("result store write of %d records failed: %s", len(batch), e)
+        finally:
+            with self._idle:
+                for _ in batch:
+                    self._pending.task_done()
+                self._idle.notify_all()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every queued record has been written; False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def compact(self) -> int:
+        try:
+            removed = self.backend.compact(self.max_age_seconds, self.max_records)
+        except Exception as e:
+            logger.warning("result store compaction failed: %s", e)
+            return 0
+        self._count("compacted", removed)
+        return removed
+
+    def _lookup(self, method: str, *args, since: float = None, **kwargs) -> list:
+        self._count("lookups")
+        # Records past max_age_seconds may not be compacted yet but are never served
+        since = since if since is not None else time.time() - self.max_age_seconds
+        try:
+            return getattr(self.backend, method)(*args, since=since, **kwargs)
+        except Exception as e:
+            # A store outage should cost cache hits, not requests
+            logger.warning("result store lookup failed: %s", e)
+            return []
+
+    def by_context(self, context_hash: str, mode: str = None, limit: int = 10, since: float = None) -> list:
+        return self._lookup("by_context", context_hash, mode=mode, limit=limit, since=since)
+
+    def by_key(self, cache_key: str, limit: int = 10, since: float = None) -> list:
+        return self._lookup("by_key", cache_key, limit=limit, since=since)
+
+    def by_bucket(self, emotion: str, theme: str = None, mode: str = None, limit: int = 10,
+                  since: float = None) -> list:
+        return self._lookup("by_bucket", emotion, theme=theme, mode=mode, limit=limit, since=since)
+
+    def summary(self) -> dict:
+        try:
+            records = len(self.backend)
+        except Exception:
+            records = None
+        with self._lock:
+            return {**self.stats, "pending": self._pending.qsize(), "records": records}
+
+
+def create_store(kind: str = "sqlite", location: str = "results.sqlite3", **options):
+    """A ``ResultStore`` on ``kind`` ("sqlite" or "redis"), or None for "off"."""
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        return ResultStore(SQLiteStore(location), **options)
+    if kind == "redis":
+        return ResultStore(RedisStore(location), **options)
+    raise ValueError(f"Unknown result store: {kind}")
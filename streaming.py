@@ -0,0 +1,142 @@
+"""Incremental extraction of top-level JSON fields from a streamed response.
+
+The model streams one JSON object in arbitrary chunks. ``JSONFieldStream``
+scans each chunk once, tracking strings, escapes and nesting depth, and
+reports top-level fields as soon as they can be decoded:
+
+* a finished field yields ``(key, value, True)``;
+* a top-level string that is still being written yields its decoded prefix
+  as ``(key, text, False)`` so long text can be shown while it is typed;
+* a top-level array yields ``(key, items_so_far, False)`` each time one of
+  its elements is complete, e.g. one quote at a time.
+"""
+import json
+
+
+def _decode_partial_string(raw: str) -> str:
+    """Decode the body of an unterminated JSON string, dropping a cut-off escape."""
+    # An escape sequence is at most six characters (\uXXXX), so trimming the
+    # tail a character at a time finds a decodable prefix quickly.
+    for end in range(len(raw), max(len(raw) - 6, 0) - 1, -1):
+        try:
+            return json.loads(f'"{raw[:end]}"')
+        except ValueError:
+            continue
+    return ""
+
+
+class JSONFieldStream:
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._element_start = None
+        self._items = None
+        self._string_value = False
+
+    def feed(self, chunk: str) -> list:
+        """Consume a chunk and return the field events it completed."""
+        events = []
+        self.buffer += chunk
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key_start is not None:
+                        self._key = json.loads(buf[self._key_start:i + 1])
+                        self._key_start = None
+                continue
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = i
+                    elif self._value_start is None:
+                        self._value_start = i
+                        self._string_value = True
+                elif self._depth == 2 and self._element_start is None and self._items is not None:
+                    self._element_start = i
+            elif ch in "{[":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i
+                    self._items = [] if ch == "[" else None
+                elif self._depth == 2 and self._items is not None and self._element_start is None:
+                    self._element_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 2 and self._items is not None and self._element_start is not None:
+                    self._finish_element(buf[self._element_start:i], events)
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_field(self._value(buf, i), events)
+                    self._started = False
+                    self._pos = len(buf)
+                    return events
+            elif ch == ",":
+                if self._depth == 1:
+                    self._finish_field(self._value(buf, i), events)
+                elif self._depth == 2 and self._items is not None and self._element_start is not None:
+                    self._finish_element(buf[self._element_start:i], events)
+            elif ch == ":" or ch.isspace():
+                pass
+            elif self._depth == 1 and self._key is not None and self._value_start is None:
+                # Bare literal: number, true, false or null
+                self._value_start = i
+            elif self._depth == 2 and self._items is not None and self._element_start is None:
+                self._element_start = i
+        self._pos = len(buf)
+
+        if self._in_string and self._string_value and self._depth == 1 and self._value_start is not None:
+            events.append((self._key, _decode_partial_string(buf[self._value_start + 1:]), False))
+        return events
+
+    def _value(self, buf: str, end: int):
+        return buf[self._value_start:end] if self._value_start is not None else None
+
+    def _finish_element(self, raw: str, events: list):
+        self._element_start = None
+        try:
+            self._items.append(json.loads(raw))
+        except ValueError:
+            return
+        events.append((self._key, list(self._items), False))
+
+    def _finish_field(self, raw, events: list):
+        key = self._key
+        self._key = None
+        self._value_start = None
+        self._element_start = None
+        self._items = None
+        self._string_value = False
+        if key is None or raw is None:
+            return
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        self.fields[key] = value
+        events.append((key, value, True))
+
+    def snapshot(self) -> dict:
+        """Fields completed so far."""
+        return dict(self.fields)
@@ -0,0 +1,65 @@
+"""An in-process stand-in for the Gemini client, for tests that drive ``Generator``."""
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from benchmarks.fake_gemini import PAYLOADS
+
+
+def payload_text(prompt: str, **fields) -> str:
+    """A valid JSON answer for the prompt's ``MODE:`` line, with ``fields`` overridden."""
+    match = re.search(r"MODE:\s*(\w+)", prompt)
+    shape = match.group(1) if match and match.group(1) in PAYLOADS else "message"
+    return json.dumps({**PAYLOADS[shape], **fields})
+
+
+def response(text: str):
+    usage = SimpleNamespace(prompt_token_count=100, cached_content_token_count=0, candidates_token_count=50)
+    return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+class FakeModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents: str, config=None):
+        text, delay = self._client.answer(model, contents)
+        time.sleep(delay)
+        return response(text)
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        text, delay = self._client.answer(model, contents)
+        stream = {"model": model, "chunks": 0, "closed": False}
+        self._client.streams.append(stream)
+        size = max(1, len(text) // self._client.chunks)
+        try:
+            for start in range(0, len(text), size):
+                time.sleep(delay / self._client.chunks)
+                stream["chunks"] += 1
+                yield response(text[start:start + size])
+        finally:
+            stream["closed"] = True
+
+
+class FakeClient:
+    """Answers with ``answer(model, prompt, call)`` -> ``(text, seconds)``; by default a valid payload at once.
+
+    ``calls`` lists every ``(model, prompt)`` in order and ``streams`` records
+    how many chunks each streamed call delivered and whether it was closed.
+    """
+
+    def __init__(self, answer=None, chunks: int = 4):
+        self._answer = answer or (lambda model, prompt, call: (payload_text(prompt), 0.0))
+        self.chunks = chunks
+        self.calls = []
+        self.streams = []
+        self._lock = threading.Lock()
+        self.models = FakeModels(self)
+
+    def answer(self, model: str, prompt: str) -> tuple:
+        with self._lock:
+            self.calls.append((model, prompt))
+            call = len(self.calls)
+        return self._answer(model, prompt, call)
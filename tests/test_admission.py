@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fakes import FakeClient
+from admission import BATCH, INTERACTIVE, AdmissionController, MemoryBuckets, SQLiteBuckets
+from api import create_app
+from generation import Generator
+
+
+class RecordingBuckets(MemoryBuckets):
+    """Memory buckets that record the bucket names of every charge, and can be slow, like a busy SQLite file."""
+
+    def __init__(self, delay: float = 0.0):
+        super().__init__()
+        self.delay = delay
+        self.charged = []
+
+    def acquire(self, specs: list, dry_run: bool = False) -> float:
+        time.sleep(self.delay)
+        wait = super().acquire(specs, dry_run)
+        if wait == 0 and not dry_run:
+            self.charged.append([name for name, _, _, _ in specs])
+        return wait
+
+
+def test_a_session_that_has_spent_its_bucket_is_denied_without_touching_others():
+    admission = AdmissionController(session_rate=0, session_capacity=1000)
+    assert admission.admit(800, session="a") is None
+    assert admission.admit(800, session="a") == "session"
+    assert admission.admit(800, session="b") is None
+    assert admission.stats["denied_session"] == 1
+
+
+def test_buckets_in_sqlite_are_shared_between_controllers(tmp_path):
+    path = str(tmp_path / "admission.sqlite3")
+    first = AdmissionController(SQLiteBuckets(path), session_rate=0, session_capacity=1000)
+    second = AdmissionController(SQLiteBuckets(path), session_rate=0, session_capacity=1000)
+    assert first.admit(800, session="a") is None
+    assert second.admit(800, session="a") == "session"
+
+
+def test_when_the_global_bucket_is_empty_interactive_requests_go_first():
+    admission = AdmissionController(global_rate=1000, global_capacity=100, max_wait=5)
+    assert admission.admit(100) is None
+    order = []
+
+    def admit(priority):
+        assert admission.admit(100, priority=priority) is None
+        order.append(priority)
+
+    with ThreadPoolExecutor(3) as pool:
+        batch = [pool.submit(admit, BATCH) for _ in range(2)]
+        time.sleep(0.02)
+        interactive = pool.submit(admit, INTERACTIVE)
+        for future in batch + [interactive]:
+            future.result()
+    assert order[0] == INTERACTIVE
+    assert admission.stats["queued"] == 3
+
+
+def test_a_full_queue_and_a_long_wait_are_denied():
+    admission = AdmissionController(global_rate=1, global_capacity=100, max_queue=1, max_wait=0.2)
+    assert admission.admit(100) is None
+    with ThreadPoolExecutor(1) as pool:
+        waiting = pool.submit(admission.admit, 100)
+        time.sleep(0.05)
+        assert admission.admit(100) == "queue_full"
+        assert waiting.result() == "timeout"
+    assert admission.queue_depth() == 0
+
+
+def test_the_queue_lock_is_not_held_while_the_buckets_are_read():
+    admission = AdmissionController(RecordingBuckets(delay=0.3))
+    with ThreadPoolExecutor(1) as pool:
+        admitted = pool.submit(admission.admit, 100)
+        time.sleep(0.1)
+        started = time.perf_counter()
+        assert admission.queue_depth() == 1
+        assert time.perf_counter() - started < 0.1
+        assert admitted.result() is None
+
+
+def test_batch_items_are_charged_to_the_callers_session():
+    buckets = RecordingBuckets()
+    generator = Generator(FakeClient(), admission=AdmissionController(buckets))
+    client = create_app(generator).test_client()
+    response = client.post("/generate/batch", json={"items": [{"text": f"Stressed about exam {i}"}
+                                                              for i in range(3)]},
+                           headers={"X-Session-Id": "client-1"})
+
+    assert response.status_code == 200
+    assert all("result" in item for item in response.get_json()["results"])
+    assert buckets.charged == [["global", "session:client-1"]] * 3
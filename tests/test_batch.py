@@ -0,0 +1,21 @@
+import json
+
+from batch import load_checkpoint
+from generation import is_fallback
+
+
+def test_fallback_results_are_not_checkpointed(tmp_path):
+    output = tmp_path / "results.jsonl"
+    records = [
+        {"key": "done", "result": {"type": "message", "motivation": "..."}},
+        {"key": "fell_back", "result": {"type": "message", "fallback": True}, "fallback": True},
+        {"key": "failed", "error": "no model response"},
+    ]
+    output.write_text("".join(json.dumps(r) + "\n" for r in records))
+    assert load_checkpoint(str(output)) == {"done"}
+
+
+def test_is_fallback_checks_both_halves():
+    assert is_fallback({"type": "both", "message": {"fallback": True}, "quote": {"quotes": []}})
+    assert not is_fallback({"type": "both", "message": {}, "quote": {}})
+    assert not is_fallback(None)
@@ -0,0 +1,37 @@
+import pytest
+
+from cache import MemoryBackend, ResponseCache, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    return ResponseCache(variants_per_key=2, backend=backend)
+
+
+def test_variants_are_served_once_the_key_is_full(cache):
+    cache.put("k", {"motivation": "one"})
+    assert cache.get("k") is None
+    cache.put("k", {"motivation": "two"})
+    assert [cache.get("k")["motivation"] for _ in range(3)] == ["one", "two", "one"]
+
+
+def test_mutating_a_served_payload_leaves_the_cached_entry_alone(cache):
+    payload = {"motivation": "one", "tags": ["a"]}
+    cache.put("k", payload)
+    cache.put("k", {"motivation": "two", "tags": []})
+    payload["tags"].append("changed by the caller after put")
+
+    served = cache.get("k")
+    served["tags"].append("annotation")
+    cache.peek("k")["motivation"] = "changed through peek"
+
+    assert cache.get("k")["motivation"] == "two"
+    assert cache.get("k") == {"motivation": "one", "tags": ["a"]}
+
+
+def test_expired_entries_are_not_served(cache):
+    cache.ttl_seconds = 0
+    cache.put("k", {"motivation": "one"})
+    cache.put("k", {"motivation": "two"})
+    assert cache.peek("k") is None
@@ -0,0 +1,84 @@
+import threading
+from datetime import date, datetime
+
+from digest import Digest, build_day, build_digest, digest_path, latest_digest, prune, seconds_until, write_digest
+from generation import GenerationError, GenerationSettings
+from warm_pool import bucket
+
+DAY = date(2026, 3, 14)
+TEXT = "So stressed about work"
+PROFILE = bucket(TEXT)
+
+
+class StubGenerator:
+    """``generate_warm`` numbers its payloads per text and fails for ``failing`` texts."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def ready(self):
+        return True
+
+    def generate_warm(self, text, mode, settings):
+        if text in self.failing:
+            raise GenerationError("no model response")
+        with self._lock:
+            n = self.counts[text, mode] = self.counts.get((text, mode), 0) + 1
+        return {"type": mode, "text": text, "n": n % 2}
+
+
+def test_payloads_round_trip_and_one_seed_keeps_one_variant(tmp_path):
+    payloads = {(PROFILE, "message"): [{"motivation": f"variant {i}"} for i in range(3)],
+                (PROFILE, "quote"): [{"quotes": [{"quote": "Onward", "author": "Anon"}]}]}
+    path = digest_path(DAY, str(tmp_path))
+    write_digest(path, build_digest(payloads, {"date": DAY.isoformat()}))
+    digest = Digest.open(path)
+
+    assert digest.variants(PROFILE, "message") == 3
+    assert [digest.get(PROFILE, "message", i) for i in range(3)] == payloads[PROFILE, "message"]
+    picks = {digest.pick(TEXT, "message", seed="session-1")[0]["motivation"] for _ in range(5)}
+    assert len(picks) == 1
+    both = digest.inspiration(TEXT, "both", seed="session-1")
+    assert both["quote"] == payloads[PROFILE, "quote"][0]
+
+
+def test_a_missing_profile_falls_back_to_its_emotion_then_to_neutral(tmp_path):
+    emotion, energy, _ = PROFILE
+    payloads = {((emotion, energy, "general"), "message"): [{"motivation": "emotion only"}],
+                (("neutral", "medium", "general"), "quote"): [{"quotes": []}]}
+    digest = Digest(build_digest(payloads, {"date": DAY.isoformat()}))
+
+    assert digest.pick(TEXT, "message") == ({"motivation": "emotion only"}, "emotion")
+    assert digest.pick(TEXT, "quote") == ({"quotes": []}, "default")
+    assert Digest(build_digest({}, {"date": DAY.isoformat()})).inspiration(TEXT, "both") is None
+
+
+def test_a_day_is_built_from_every_profile_without_duplicates_or_failures(tmp_path):
+    generator = StubGenerator(failing={"I'm feeling sad about work and low on energy"})
+    report = build_day(generator, DAY, GenerationSettings(), str(tmp_path), variants=3, concurrency=4)
+    digest = latest_digest(DAY, str(tmp_path))
+
+    assert report["failed"] == 2 * 3
+    # Each text alternates between two payloads, so the third variant is a duplicate
+    assert digest.variants(PROFILE, "message") == 2
+    assert digest.variants(("sad", "low", "work"), "quote") == 0
+    assert digest.pick("So sad about work", "quote")[1] == "emotion"
+    assert digest.meta["ok"] + report["duplicates"] + report["failed"] == 162 * 2 * 3
+
+
+def test_latest_digest_serves_yesterdays_while_todays_is_built_and_old_ones_are_pruned(tmp_path):
+    for day in (date(2026, 3, 1), date(2026, 3, 13)):
+        write_digest(digest_path(day, str(tmp_path)), build_digest({}, {"date": day.isoformat()}))
+    (tmp_path / "notes.txt").write_text("kept")
+
+    assert latest_digest(DAY, str(tmp_path)).day == "2026-03-13"
+    assert latest_digest(date(2026, 3, 20), str(tmp_path)) is None
+    assert prune(str(tmp_path), keep_days=7, today=DAY) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["2026-03-13.digest", "notes.txt"]
+
+
+def test_seconds_until_the_next_run():
+    assert seconds_until("03:30", datetime(2026, 3, 14, 3, 0)) == 1800
+    assert seconds_until("03:30", datetime(2026, 3, 14, 4, 30)) == 23 * 3600
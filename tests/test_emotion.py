@@ -0,0 +1,24 @@
+from emotion import analyze_user_emotion
+
+
+def test_detects_emotions_energy_and_themes_in_keyword_order():
+    result = analyze_user_emotion("So worried and exhausted, my boss keeps piling on work")
+    assert result["primary_emotion"] == "anxious"
+    assert result["all_emotions"] == ["anxious", "tired"]
+    assert result["energy_level"] == "low"
+    assert result["themes"] == ["work"]
+    assert not result["is_greeting"]
+
+
+def test_keywords_match_inside_words_and_across_overlaps():
+    # "mad" and "down" share the "d", as they would in a plain substring scan
+    result = analyze_user_emotion("madown")
+    assert result["all_emotions"] == ["sad", "angry"]
+    assert analyze_user_emotion("Feeling distressed")["all_emotions"] == ["anxious"]
+    assert analyze_user_emotion("my relationship")["themes"] == ["relationships"]
+
+
+def test_greetings_only_count_in_short_messages():
+    assert analyze_user_emotion("Hello!")["is_greeting"]
+    assert not analyze_user_emotion("Hello, I have a long question about my exam")["is_greeting"]
+    assert analyze_user_emotion("Nothing to report")["primary_emotion"] == "neutral"
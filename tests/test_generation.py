@@ -0,0 +1,59 @@
+import time
+from dataclasses import replace
+
+from fakes import FakeClient, payload_text
+from generation import GenerationSettings, Generator, genai_sdk
+from resilience import RequestExecutor
+from routing import ModelRouter
+
+# The SDK import takes most of a second; done up front so it does not count against attempt timeouts
+genai_sdk()
+SETTINGS = GenerationSettings(model="gemini-2.5-flash", mode="message")
+
+
+def test_partials_from_a_timed_out_attempt_stop_once_the_retry_starts():
+    def answer(model, prompt, call):
+        if call == 1:
+            # Streams its first chunk in time, then runs past the attempt timeout
+            return payload_text(prompt, motivation="SLOW " * 40), 1.6
+        return payload_text(prompt, motivation="FAST " * 40), 0.0
+
+    client = FakeClient(answer, chunks=8)
+    generator = Generator(client, request_executor=RequestExecutor(attempt_timeout=0.3, max_attempts=2,
+                                                                   base_delay=0))
+    partials = []
+    data = generator.generate("My week has been rough at home", SETTINGS, on_update=partials.append)
+    # Give the abandoned stream time to produce the rest of its chunks
+    time.sleep(1.5)
+
+    assert data["motivation"].startswith("FAST")
+    texts = [p.get("motivation", "") for p in partials]
+    assert any(t.startswith("SLOW") for t in texts)
+    first_fast = next(i for i, t in enumerate(texts) if t.startswith("FAST"))
+    assert not any(t.startswith("SLOW") for t in texts[first_fast:])
+
+
+def slow_first_model(slow_model):
+    def answer(model, prompt, call):
+        if model == slow_model:
+            return payload_text(prompt, motivation="SLOW " * 40), 1.6
+        return payload_text(prompt, motivation="FAST " * 40), 0.0
+    return answer
+
+
+def test_a_model_that_misses_its_deadline_has_its_stream_closed():
+    client = FakeClient(slow_first_model("gemini-2.5-pro"), chunks=8)
+    generator = Generator(client, router=ModelRouter(slo_seconds=0.6),
+                          request_executor=RequestExecutor(attempt_timeout=5))
+
+    for on_update in (lambda partial: None, None):
+        client.streams.clear()
+        data = generator.generate("Worried and exhausted, my boss and my family both need more from me",
+                                  replace(SETTINGS, model="auto"), on_update=on_update)
+        time.sleep(0.5)
+
+        assert data["motivation"].startswith("FAST")
+        # Blocking requests with a deadline are streamed too, so the abandoned one can be closed
+        slow = next(s for s in client.streams if s["model"] == "gemini-2.5-pro")
+        assert slow["closed"]
+        assert slow["chunks"] < client.chunks
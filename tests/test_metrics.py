@@ -0,0 +1,30 @@
+from metrics import Registry
+
+
+def collector(value):
+    return lambda: [("motivator_circuit_open", "gauge", "1 while the upstream circuit breaker is open.",
+                     [({}, value)])]
+
+
+def test_collector_registered_again_under_its_key_replaces_the_old_one():
+    registry = Registry()
+    registry.register_collector(collector(0), key="generator")
+    registry.register_collector(collector(1), key="generator")
+
+    text = registry.render()
+    assert text.count("# TYPE motivator_circuit_open gauge") == 1
+    assert "motivator_circuit_open 1" in text
+
+
+def test_counter_families_are_named_without_total_and_samples_with_it():
+    registry = Registry()
+    registry.counter("motivator_fallbacks", "Responses served by the local fallback.", ["reason"]).inc(reason="parse")
+    registry.register_collector(lambda: [("motivator_model_retries", "counter", "Model request executor retries.",
+                                          [({}, 2)])])
+
+    lines = registry.render().splitlines()
+    assert "# TYPE motivator_fallbacks counter" in lines
+    assert 'motivator_fallbacks_total{reason="parse"} 1' in lines
+    assert "# TYPE motivator_model_retries counter" in lines
+    assert "motivator_model_retries_total 2" in lines
+    assert not any(line.startswith("# TYPE") and line.split()[2].endswith("_total") for line in lines)
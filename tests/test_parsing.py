@@ -0,0 +1,44 @@
+import json
+
+from parsing import parse_loose_json, response_schema, validate_payload
+
+PAYLOAD = {"type": "message", "motivation": "Keep {going}", "steps": ["one", "two"],
+           "quotes": [{"quote": "Onward", "author": "Anon"}]}
+
+
+def test_objects_are_found_in_fences_and_prose():
+    text = json.dumps(PAYLOAD)
+    assert parse_loose_json(f"```json\n{text}\n```") == PAYLOAD
+    assert parse_loose_json(f"Sure! Here it is: {text} Let me know {{if}} it helps.") == PAYLOAD
+    assert parse_loose_json("no object {here} at all") is None
+    assert parse_loose_json("") is None
+
+
+def test_truncated_output_is_repaired():
+    text = json.dumps(PAYLOAD)
+    # Cut inside a string value: the string and containers are closed
+    cut = text[:text.index("two") + 1]
+    assert parse_loose_json(cut) == {"type": "message", "motivation": "Keep {going}", "steps": ["one", "t"]}
+    # Cut inside a key: the last complete value is kept
+    cut = text[:text.index('"quotes"') + 4]
+    assert parse_loose_json(cut) == {k: PAYLOAD[k] for k in ("type", "motivation", "steps")}
+
+
+def test_malformed_fields_are_dropped_and_required_ones_enforced():
+    data, problems = validate_payload({"motivation": " Go ", "steps": "just one", "mantra": 7,
+                                       "quotes": ["Bare quote", {"author": "No quote"}],
+                                       "daily_affirmation": ""}, "message")
+    assert data == {"type": "message", "motivation": "Go", "steps": ["just one"], "mantra": "7",
+                    "quotes": [{"quote": "Bare quote", "author": "Unknown"}]}
+    assert len(problems) == 2
+
+    data, problems = validate_payload({"reflection": "Nice"}, "quote")
+    assert data is None and "missing required field(s): quotes" in problems
+    assert validate_payload(["not", "an", "object"], "message")[0] is None
+
+
+def test_response_schema_follows_the_payload_schema():
+    schema = response_schema("quote")
+    assert schema["required"] == ["quotes"]
+    assert schema["propertyOrdering"] == ["quotes", "reflection", "theme", "application"]
+    assert schema["properties"]["quotes"]["items"]["required"] == ["quote", "author"]
@@ -0,0 +1,57 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from prompt_cache import PromptCache
+
+
+class FakeCaches:
+    def __init__(self, delays=None, fail=()):
+        self.delays = delays or {}
+        self.fail = set(fail)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def create(self, model, config):
+        with self._lock:
+            self.calls.append(model)
+        time.sleep(self.delays.get(model, 0))
+        if model in self.fail:
+            raise ValueError("content too small to cache")
+        return SimpleNamespace(name=f"cachedContents/{model}-{len(self.calls)}")
+
+
+def prompt_cache(caches, **kwargs):
+    return PromptCache(SimpleNamespace(caches=caches), **kwargs)
+
+
+def test_concurrent_first_requests_share_one_upload():
+    caches = FakeCaches(delays={"flash": 0.1})
+    cache = prompt_cache(caches)
+    with ThreadPoolExecutor(8) as pool:
+        names = list(pool.map(lambda _: cache.get("flash", "system"), range(8)))
+    assert caches.calls == ["flash"]
+    assert len(set(names)) == 1
+    assert cache.get("flash", "system") == names[0]
+
+
+def test_a_slow_upload_does_not_hold_up_other_models():
+    caches = FakeCaches(delays={"slow": 0.5})
+    cache = prompt_cache(caches)
+    with ThreadPoolExecutor(2) as pool:
+        slow = pool.submit(cache.get, "slow", "system")
+        time.sleep(0.05)
+        started = time.perf_counter()
+        assert cache.get("fast", "system")
+        assert time.perf_counter() - started < 0.25
+        assert slow.result()
+
+
+def test_refused_model_is_sent_inline_until_retry_after():
+    caches = FakeCaches(fail={"lite"})
+    cache = prompt_cache(caches, retry_after=60)
+    assert cache.get("lite", "system") is None
+    assert cache.get("lite", "system") is None
+    assert caches.calls == ["lite"]
+    assert cache.stats["failures"] == 1
@@ -0,0 +1,67 @@
+import gzip
+
+import pytest
+
+from fakes import FakeClient, payload_text
+from generation import GenerationSettings, Generator, genai_sdk
+from replay import Recorder, RecordingClient, ReplayClient, ReplayMiss, prompt_key, read_log, run_pipeline
+
+genai_sdk()
+SETTINGS = GenerationSettings(model="gemini-2.5-flash", mode="message")
+TEXTS = ["My week has been rough at home", "Excited to start my new job"]
+
+
+def record(path, answer=None) -> tuple:
+    client = FakeClient(answer)
+    recorder = Recorder(str(path))
+    generator = Generator(RecordingClient(client, recorder), seed=7)
+    # The first request is streamed, the second is not
+    results = [generator.generate(text, SETTINGS, on_update=on_update)
+               for text, on_update in zip(TEXTS, (lambda partial: None, None))]
+    recorder.close()
+    return client, results
+
+
+def test_a_recorded_run_replays_offline_with_the_same_results(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    client, recorded = record(path)
+    records = list(read_log(str(path)))
+    assert len(records) == len(client.calls) == 2
+    assert "chunks" in records[0] and "raw" in records[1]
+    # The system instruction is logged once and referred to by digest afterwards
+    with gzip.open(path, "rt") as f:
+        assert sum('"system":' in line for line in f) == 1
+    assert all(r["config"]["system_instruction"].keys() == {"ref"} for r in records)
+
+    replay = ReplayClient.open(str(path))
+    replayed = [Generator(replay, seed=7).generate(text, SETTINGS) for text in TEXTS]
+    assert replayed == recorded
+    assert replay.stats == {"replayed": 2, "misses": 0}
+
+
+def test_prompts_recorded_several_times_replay_in_turn_for_any_model():
+    records = [{"model": "gemini-2.5-pro", "key": prompt_key("p"), "prompt": "p", "raw": f"answer {i}",
+                "seconds": 0} for i in range(2)]
+    replay = ReplayClient(records)
+    answers = [replay.models.generate_content("gemini-2.5-flash", "p").text for _ in range(3)]
+    assert answers == ["answer 0", "answer 1", "answer 0"]
+    with pytest.raises(ReplayMiss):
+        replay.models.generate_content("gemini-2.5-flash", "never recorded")
+    assert replay.stats == {"replayed": 3, "misses": 1}
+
+
+def test_a_record_cut_off_by_a_crash_ends_the_log(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    record(path)
+    with gzip.open(path, "at") as f:
+        f.write('{"v": 1, "prompt": "cut o')
+    assert len(list(read_log(str(path)))) == 2
+
+
+def test_recorded_responses_run_through_the_parser_and_renderers(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    record(path, lambda model, prompt, call: (
+        "Here you go:\n" + payload_text(prompt) if call == 1 else '{"motivation": "cut', 0.0))
+    (first, timings), (second, _) = [run_pipeline(r) for r in read_log(str(path))]
+    assert first["type"] == "message" and set(timings) == {"parse", "validate", "render"}
+    assert second == {"type": "message", "motivation": "cut"}
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from resilience import AttemptTimeout, CircuitBreaker, CircuitOpenError, DeadlineExceeded, RequestExecutor
+
+
+def test_half_open_trial_that_misses_its_deadline_frees_the_trial_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+    executor = RequestExecutor(attempt_timeout=5, max_attempts=1, breaker=breaker)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+
+    with pytest.raises(DeadlineExceeded):
+        executor.execute(lambda: time.sleep(0.5), hedge=False, timeout=0.05)
+
+    # The next request is let through as a new trial instead of short-circuiting forever
+    assert executor.execute(lambda: "ok", hedge=False) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_short_circuits():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=60)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        RequestExecutor(breaker=breaker).execute(lambda: "ok")
+
+
+def test_attempt_timeout_reports_the_configured_timeout():
+    executor = RequestExecutor(attempt_timeout=0.2, max_attempts=1, hedge=True, hedge_min_samples=1)
+    # A hedge after 100 ms shortens the waits inside the attempt, not the attempt's timeout
+    executor.latency.record(0.1)
+    with pytest.raises(AttemptTimeout, match=r"within 0\.2s"):
+        executor.execute(lambda: time.sleep(0.5))
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+def half_open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    return breaker
+
+
+def test_cancelled_half_open_trial_does_not_close_the_breaker():
+    breaker = half_open_breaker()
+    executor = RequestExecutor(max_attempts=1, breaker=breaker)
+
+    def cancelled():
+        raise RuntimeError("cancelled by the user")
+
+    with pytest.raises(RuntimeError):
+        executor.execute(cancelled, hedge=False)
+    assert breaker.state == "half-open"
+    # The trial slot is free again for the next request
+    assert executor.execute(lambda: "ok", hedge=False) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_client_error_from_the_upstream_closes_the_breaker():
+    breaker = half_open_breaker()
+    executor = RequestExecutor(max_attempts=1, breaker=breaker)
+
+    def bad_request():
+        raise HTTPError(400)
+
+    with pytest.raises(HTTPError):
+        executor.execute(bad_request, hedge=False)
+    assert breaker.state == "closed"
+
+
+def test_timed_out_attempt_is_told_to_stop_before_the_retry():
+    executor = RequestExecutor(attempt_timeout=0.1, max_attempts=2, base_delay=0)
+    calls = []
+
+    def request(stop):
+        calls.append(stop)
+        if len(calls) == 1:
+            # The first attempt hangs until the executor gives up on it
+            assert stop.wait(1)
+            return "late"
+        return "ok"
+
+    assert executor.execute(request, hedge=False, stoppable=True) == "ok"
+    assert len(calls) == 2
+    assert calls[0].is_set()
+    assert calls[0] is not calls[1]
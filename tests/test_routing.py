@@ -0,0 +1,38 @@
+from routing import AUTO_MODEL, DEFAULT_TIERS, ModelRouter, input_complexity
+
+LITE, FLASH, PRO = DEFAULT_TIERS
+
+
+def test_inputs_are_graded_by_length_emotions_and_themes():
+    assert input_complexity("hello") == "greeting"
+    assert input_complexity("I feel a bit sad today") == "simple"
+    assert input_complexity("I'm anxious about my job interview") == "normal"
+    assert input_complexity("Worried and exhausted, my boss and my family both need more from me") == "complex"
+
+
+def test_more_demanding_inputs_go_to_more_capable_tiers():
+    router = ModelRouter()
+    assert router.route("hello", AUTO_MODEL).local
+    assert router.route("I feel a bit sad today", AUTO_MODEL).models == (LITE,)
+    normal = router.route("I'm anxious about my job interview", AUTO_MODEL)
+    assert normal.models == (FLASH, LITE)
+    assert normal.deadline == router.slo_seconds / 2
+    complex_ = router.route("Worried and exhausted, my boss and my family both need more from me", AUTO_MODEL)
+    assert complex_.models == (PRO, LITE)
+
+
+def test_a_tier_over_its_slo_is_skipped_until_it_is_probed():
+    router = ModelRouter(slo_seconds=1.0, min_samples=1, probe_every=3)
+    router.observe(PRO, 5.0)
+    text = "Worried and exhausted, my boss and my family both need more from me"
+    picks = [router.route(text, AUTO_MODEL).models[0] for _ in range(3)]
+    assert picks == [FLASH, FLASH, PRO]
+
+
+def test_explicit_model_keeps_the_fastest_tier_as_its_deadline_fallback():
+    router = ModelRouter(slo_seconds=10.0, min_samples=1)
+    router.observe(LITE, 2.0)
+    route = router.route("I'm anxious about my job interview", PRO)
+    assert route.models == (PRO, LITE)
+    assert route.deadline == 8.0
+    assert router.route("anything", LITE).models == (LITE,)
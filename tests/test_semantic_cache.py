@@ -0,0 +1,85 @@
+import json
+from dataclasses import replace
+
+from fakes import FakeClient, payload_text
+from cache import ResponseCache
+from generation import GenerationSettings, Generator, genai_sdk
+from history import ResponseHistory
+from semantic_cache import SemanticCache
+from store import create_store
+
+genai_sdk()
+QUOTES = GenerationSettings(model="gemini-2.5-flash", mode="quote")
+FIRST = "I am so tired of my job and my boss Jennifer"
+REWORDED = "I am so tired of my job and my boss"
+
+
+def echoing_answers(model, prompt, call):
+    """Quote payloads whose free text repeats the user's words, as the system prompt asks."""
+    words = prompt.split('USER\'S EXACT WORDS: "', 1)[1].split('"', 1)[0]
+    text = json.loads(payload_text(prompt, reflection=f'You said "{words}".'))
+    text["quotes"] = [dict(q, context=f"For when {words}") for q in text["quotes"]]
+    return json.dumps(text), 0.0
+
+
+def semantic_generator(client, **kwargs) -> Generator:
+    return Generator(client, semantic_cache=SemanticCache(), quote_retrieval="off", **kwargs)
+
+
+def test_a_match_only_counts_as_a_hit_once_served():
+    cache = SemanticCache()
+    cache.add(FIRST, "scope", "key:first")
+    assert cache.lookup(REWORDED, "scope") == "key:first"
+    assert cache.lookup(REWORDED, "another scope") is None
+    summary = cache.summary()
+    assert (summary["lookups"], summary["matches"], summary["hits"], summary["hit_rate"]) == (2, 1, 0, 0.0)
+
+    cache.record_hit()
+    assert cache.summary()["hit_rate"] == 0.5
+
+
+def test_reworded_quote_requests_get_the_quotes_without_the_first_users_words():
+    client = FakeClient(echoing_answers)
+    generator = semantic_generator(client)
+    generator.generate(FIRST, QUOTES)
+    data = generator.generate(REWORDED, QUOTES)
+
+    assert len(client.calls) == 1
+    assert data["quotes"] and "Jennifer" not in json.dumps(data)
+    assert set(data) == {"type", "quotes"}
+    assert all(set(q) <= {"quote", "author", "category"} for q in data["quotes"])
+    assert generator.semantic_cache.stats["hits"] == 1
+
+
+def test_reworded_message_requests_are_generated_afresh():
+    client = FakeClient(echoing_answers)
+    generator = semantic_generator(client)
+    generator.generate(FIRST, replace(QUOTES, mode="message"))
+    generator.generate(REWORDED, replace(QUOTES, mode="message"))
+    assert len(client.calls) == 2
+    assert generator.semantic_cache.stats["hits"] == 0
+
+
+def test_a_neighbour_evicted_from_the_response_cache_is_read_from_the_store(tmp_path):
+    client = FakeClient(echoing_answers)
+    store = create_store("sqlite", str(tmp_path / "results.sqlite3"))
+    generator = semantic_generator(client, response_cache=ResponseCache(max_entries=1), result_store=store)
+    generator.generate(FIRST, QUOTES)
+    generator.generate("Nothing in common with the earlier text at all today", QUOTES)
+    store.flush()
+
+    data = generator.generate(REWORDED, QUOTES)
+    assert len(client.calls) == 2
+    assert data["quotes"] and "Jennifer" not in json.dumps(data)
+
+
+def test_quotes_the_user_has_already_seen_are_not_served_again():
+    client = FakeClient(echoing_answers)
+    generator = semantic_generator(client)
+    history = ResponseHistory()
+    generator.generate(FIRST, QUOTES, history)
+    generator.generate(REWORDED, QUOTES, history)
+    assert len(client.calls) == 1
+    # Served once already, so the same user asking again needs a new response
+    generator.generate(REWORDED, QUOTES, history)
+    assert len(client.calls) == 2
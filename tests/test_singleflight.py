@@ -0,0 +1,109 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from fakes import FakeClient, payload_text
+from generation import (GenerationCancelled, GenerationError, GenerationSettings, Generator, create_context_hash,
+                        genai_sdk, is_fallback)
+from history import ResponseHistory
+from singleflight import SingleFlight
+
+genai_sdk()
+SETTINGS = GenerationSettings(model="gemini-2.5-flash", mode="message")
+TEXT = "My week has been rough at home"
+
+
+def slow_answers(seconds: float, text=None):
+    return lambda model, prompt, call: (text or payload_text(prompt, motivation=f"answer {call}"), seconds)
+
+
+def coalescing_generator(client) -> Generator:
+    return Generator(client, single_flight=SingleFlight(), coalesce_shuffle=False)
+
+
+def test_leader_result_partials_and_errors_reach_every_waiter():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def leader_fn(publish):
+        publish({"motivation": "So"})
+        started.set()
+        release.wait(1)
+        return "done"
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", leader_fn)
+        started.wait(1)
+        follower = pool.submit(flight.do, "key", lambda publish: "not called", seen.append)
+        time.sleep(0.05)
+        release.set()
+        assert leader.result() == ("done", False)
+        assert follower.result() == ("done", True)
+    # A late joiner gets the latest partial straight away
+    assert seen == [{"motivation": "So"}]
+    assert flight.in_flight() == 0
+
+    def failing(publish):
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        flight.do("key", failing)
+
+
+def test_identical_concurrent_requests_share_one_model_call():
+    client = FakeClient(slow_answers(0.3))
+    generator = coalescing_generator(client)
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: generator.generate(TEXT, SETTINGS), range(4)))
+    assert len(client.calls) == 1
+    assert all(r["motivation"] == "answer 1" for r in results)
+    assert generator.single_flight.stats == {"leaders": 1, "followers": 3}
+
+
+def test_callers_that_refuse_the_fallback_do_not_share_a_flight_with_those_that_accept_it():
+    client = FakeClient(slow_answers(0.3, text="I'm sorry, but I can't help with that request."))
+    generator = coalescing_generator(client)
+    with ThreadPoolExecutor(2) as pool:
+        batch = pool.submit(generator.generate, TEXT, SETTINGS, fallback_ok=False)
+        time.sleep(0.05)
+        interactive = pool.submit(generator.generate, TEXT, SETTINGS)
+        with pytest.raises(GenerationError):
+            batch.result()
+        # The interactive request gets its fallback, not the batch owner's error
+        assert is_fallback(interactive.result())
+    assert len(client.calls) == 2
+
+
+def test_a_waiter_whose_leader_is_cancelled_generates_on_its_own():
+    client = FakeClient(slow_answers(0.8), chunks=8)
+    generator = coalescing_generator(client)
+    cancel = threading.Event()
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(generator.generate, TEXT, SETTINGS, on_update=lambda partial: None, cancel=cancel)
+        time.sleep(0.1)
+        waiter = pool.submit(generator.generate, TEXT, SETTINGS, on_update=lambda partial: None)
+        time.sleep(0.1)
+        cancel.set()
+        with pytest.raises(GenerationCancelled):
+            leader.result()
+        assert waiter.result()["motivation"] == "answer 2"
+    assert len(client.calls) == 2
+
+
+def test_a_waiter_that_has_seen_the_shared_response_gets_a_new_one():
+    client = FakeClient(slow_answers(0.3))
+    generator = coalescing_generator(client)
+    history = ResponseHistory()
+    history.add(create_context_hash(TEXT), generator.generate("warm up the payload shape", SETTINGS))
+    client.calls.clear()
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(generator.generate, TEXT, SETTINGS)
+        time.sleep(0.05)
+        waiter = pool.submit(generator.generate, TEXT, SETTINGS, history)
+        assert leader.result()["motivation"] == "answer 1"
+        # The shared answer is a repeat for this history, so it is generated again
+        assert waiter.result()["motivation"] == "answer 2"
+    assert len(client.calls) == 2
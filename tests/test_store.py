@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from benchmarks.fake_redis import FakeRedis
+from store import RedisStore, ResultStore, SQLiteStore, make_record
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        yield SQLiteStore(str(tmp_path / "results.sqlite3"))
+        return
+    with FakeRedis() as server:
+        yield RedisStore(server.url)
+
+
+def record(key: str, emotion: str = "sad", theme: str = "work", mode: str = "message", age: float = 0.0, n=0):
+    data = make_record(f"ctx-{key}", key, mode, emotion, theme, {"motivation": f"{key} {n}"})
+    data["created"] -= age
+    return data
+
+
+def test_records_are_found_by_each_index_newest_first(backend):
+    backend.write_many([record("a", n=1, age=2), record("a", n=2, age=1), record("b", emotion="happy", mode="quote")])
+
+    assert [r["payload"]["motivation"] for r in backend.by_key("a")] == ["a 2", "a 1"]
+    assert len(backend.by_context("ctx-a", mode="message")) == 2
+    assert [r["cache_key"] for r in backend.by_bucket("happy")] == ["b"]
+    assert backend.by_bucket("sad", "work", mode="quote") == []
+    assert len(backend.by_key("a", limit=1, since=time.time() - 1.5)) == 1
+
+
+def test_compaction_drops_old_records_and_the_oldest_beyond_the_limit(backend):
+    backend.write_many([record("old", age=100)] + [record("k", n=n, age=10 - n) for n in range(3)])
+    assert backend.compact(max_age_seconds=50, max_records=2) == 2
+    assert [r["payload"]["motivation"] for r in backend.by_key("k")] == ["k 2", "k 1"]
+    assert backend.by_key("old") == []
+
+
+def test_writes_are_queued_off_the_caller_and_flushed_in_batches(tmp_path):
+    store = ResultStore(SQLiteStore(str(tmp_path / "results.sqlite3")), flush_seconds=0.05)
+    for n in range(5):
+        store.add(record("a", n=n, age=5 - n))
+    assert store.flush()
+
+    assert len(store.by_key("a")) == 5
+    assert store.summary()["written"] == 5
+    # Records past max_age_seconds are never served, even before compaction
+    store.max_age_seconds = 2.5
+    assert [r["payload"]["motivation"] for r in store.by_key("a")] == ["a 4", "a 3"]
+
+
+def test_a_full_queue_drops_records_instead_of_blocking(tmp_path):
+    store = ResultStore(SQLiteStore(str(tmp_path / "results.sqlite3")), max_pending=1, flush_seconds=60)
+    store._pending.put(record("blocked"))
+    store.add(record("a"))
+    assert store.stats["dropped"] == 1
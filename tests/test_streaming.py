@@ -0,0 +1,38 @@
+import json
+
+from streaming import JSONFieldStream
+
+PAYLOAD = {"motivation": "Say \"hi\" \\ café {not a brace}", "steps": ["one", "two, three"],
+           "quotes": [{"quote": "Keep going", "author": "Anon"}], "count": 3, "done": True}
+
+
+def feed_in_chunks(text: str, size: int) -> tuple:
+    stream = JSONFieldStream()
+    events = []
+    for start in range(0, len(text), size):
+        events += stream.feed(text[start:start + size])
+    return stream, events
+
+
+def test_every_field_is_decoded_whatever_the_chunk_size():
+    text = "```json\n" + json.dumps(PAYLOAD, ensure_ascii=False) + "\n```"
+    for size in (1, 2, 3, 7, 64, len(text)):
+        stream, events = feed_in_chunks(text, size)
+        assert stream.snapshot() == PAYLOAD
+        assert [key for key, _, complete in events if complete] == list(PAYLOAD)
+
+
+def test_a_string_being_written_is_reported_as_a_decoded_prefix():
+    stream = JSONFieldStream()
+    assert stream.feed('{"motivation": "You said \\"ti') == [("motivation", 'You said "ti', False)]
+    # A cut-off escape is held back until the rest arrives
+    assert stream.feed("red\\u00") == [("motivation", 'You said "tired', False)]
+    assert stream.feed('e9", ') == [("motivation", 'You said "tiredé', True)]
+
+
+def test_array_elements_are_reported_one_at_a_time():
+    stream = JSONFieldStream()
+    events = stream.feed('{"quotes": [{"quote": "One", "author": "A"}, {"quote": "Tw')
+    assert events == [("quotes", [{"quote": "One", "author": "A"}], False)]
+    events = stream.feed('o", "author": "B"}]}')
+    assert events[-1] == ("quotes", [{"quote": "One", "author": "A"}, {"quote": "Two", "author": "B"}], True)
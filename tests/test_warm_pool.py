@@ -0,0 +1,71 @@
+import threading
+import time
+
+from generation import GenerationSettings
+from warm_pool import WarmPool, bucket, bucket_text
+
+AUTO = GenerationSettings(model="auto")
+
+
+class Refills:
+    """A ``generate`` for the pool that numbers its payloads and records the texts it was asked for."""
+
+    def __init__(self):
+        self.texts = []
+        self._lock = threading.Lock()
+
+    def __call__(self, text, mode, settings):
+        with self._lock:
+            self.texts.append(text)
+            return {"type": mode, "motivation": f"pooled {len(self.texts)}"}
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+def test_only_inputs_whose_words_are_all_in_the_bucket_text_are_served():
+    pool = WarmPool(Refills())
+    assert pool.eligible("I'm anxious about school", AUTO)
+    assert pool.eligible("I'm so tired", AUTO)
+    # "exam" and "tomorrow" would be replaced by whatever the bucket text says
+    assert not pool.eligible("I'm anxious about my exam tomorrow", AUTO)
+    assert not pool.eligible("I'm anxious about school", GenerationSettings(model="gemini-2.5-flash"))
+    assert not pool.eligible("hello there", AUTO)
+
+
+def test_an_empty_bucket_is_refilled_and_each_entry_served_once():
+    refills = Refills()
+    pool = WarmPool(refills, per_key=2)
+    text = "I'm anxious about school"
+    assert pool.take(text, "message", AUTO) is None
+    wait_for(lambda: pool.summary()["entries"] == 2)
+    assert refills.texts == [bucket_text(bucket(text))] * 2
+
+    served = [pool.take(text, "message", AUTO)["motivation"] for _ in range(2)]
+    assert served == ["pooled 1", "pooled 2"]
+    assert pool.stats["hits"] == 2 and pool.stats["misses"] == 1
+
+
+def test_entries_a_user_has_seen_stay_for_other_users():
+    pool = WarmPool(Refills(), per_key=1)
+    text = "I'm anxious about school"
+    pool.take(text, "message", AUTO)
+    wait_for(lambda: pool.summary()["entries"] == 1)
+
+    assert pool.take(text, "message", AUTO, seen=lambda payload: True) is None
+    assert pool.take(text, "message", AUTO)["motivation"] == "pooled 1"
+
+
+def test_expired_entries_are_dropped():
+    pool = WarmPool(Refills(), per_key=1, ttl_seconds=0.05)
+    text = "I'm anxious about school"
+    pool.take(text, "message", AUTO)
+    wait_for(lambda: pool.summary()["entries"] == 1)
+    time.sleep(0.1)
+
+    assert pool.take(text, "message", AUTO) is None
+    assert pool.stats["expired"] == 1
@@ -0,0 +1,156 @@
+"""Pre-generated responses for generic inputs.
+
+``analyze_user_emotion`` reduces an input to a small bucket (primary
+emotion, energy, main theme). Pooled responses are written for a
+representative text of the bucket ("I'm feeling anxious about school"),
+and the model quotes that text back as if the user had written it. So
+``WarmPool`` only serves inputs whose words, apart from filler, all appear
+in that text ("anxious about school", but not "anxious about my exam
+tomorrow"). For those it keeps a few fresh responses per (bucket, mode,
+tone, length) and hands one out instantly. Every entry is served once;
+taking one, or finding the pool empty or expired, schedules a background
+refill on a small dedicated pool. Only buckets that real requests have asked
+for are kept warm, up to ``max_keys`` of them.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from emotion import THEME_INDICATORS, analyze_user_emotion
+from routing import AUTO_MODEL
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no detail beyond the bucket itself
+FILLER_WORDS = frozenset("""
+a about all am an and any are as at be been being but by can could did do does doing feel feeling feels felt
+for from get getting go going got had has have having he her him his how i i'm im is it it's its just kind
+like lot me much my myself need not now of oh on or really right so some still than that the them then there
+these they this to today too up very was way we were what when which who why will with would you your
+""".split())
+_WORD = re.compile(r"[a-z']+")
+
+
+def content_words(text: str) -> set:
+    return set(_WORD.findall(text.lower())) - FILLER_WORDS
+
+
+def bucket(user_text: str) -> tuple:
+    analysis = analyze_user_emotion(user_text)
+    return analysis["primary_emotion"], analysis["energy_level"], (analysis["themes"] or ["general"])[0]
+
+
+def bucket_text(key: tuple) -> str:
+    """A representative input for a bucket, used as the prompt when pre-generating."""
+    emotion, energy, theme = key
+    text = f"I'm feeling {emotion}" if emotion != "neutral" else "I could use some motivation"
+    if theme != "general":
+        text += f" about {THEME_INDICATORS[theme][0]}"
+    return text + {"high": ", and it's a lot right now", "low": " and low on energy", "medium": ""}[energy]
+
+
+class WarmPool:
+    def __init__(self, generate, per_key: int = 2, ttl_seconds: float = 3600.0, max_keys: int = 64,
+                 workers: int = 2, ready=lambda: True):
+        """``generate(text, mode, settings)`` returns a payload and raises instead of falling back."""
+        self.generate = generate
+        self.per_key = per_key
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.ready = ready
+        self._entries = OrderedDict()  # key -> deque of (created, payload), most recently requested last
+        self._settings = {}  # key -> settings to pre-generate with
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm-pool")
+        self.stats = {"hits": 0, "misses": 0, "ineligible": 0, "generated": 0, "expired": 0, "failures": 0}
+
+    @staticmethod
+    def key(user_text: str, mode: str, settings) -> tuple:
+        return bucket(user_text), mode, settings.tone, settings.length, settings.num_quotes
+
+    def eligible(self, user_text: str, settings) -> bool:
+        # An explicitly chosen model should produce the answer; greetings are answered locally anyway
+        if settings.model != AUTO_MODEL or analyze_user_emotion(user_text)["is_greeting"]:
+            return False
+        # A pooled response may quote the bucket text, so it must say nothing the user did not
+        return content_words(user_text) <= content_words(bucket_text(bucket(user_text)))
+
+    def take(self, user_text: str, mode: str, settings, seen=None):
+        """A pre-generated payload for this input, or None; schedules a refill either way.
+
+        ``seen(payload)`` tells whether the requesting user already received a payload.
+        """
+        if not self.eligible(user_text, settings):
+            self._count("ineligible")
+            return None
+        key = self.key(user_text, mode, settings)
+        now = time.time()
+        data = None
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries is None:
+                entries = self._entries[key] = deque()
+                self._settings[key] = settings
+                while len(self._entries) > self.max_keys:
+                    old, _ = self._entries.popitem(last=False)
+                    self._settings.pop(old, None)
+            self._entries.move_to_end(key)
+            skipped = []
+            while entries:
+                created, payload = entries.popleft()
+                if now - created > self.ttl_seconds:
+                    self.stats["expired"] += 1
+                elif seen is not None and seen(payload):
+                    skipped.append((created, payload))
+                else:
+                    data = payload
+                    break
+            # Entries this user has seen stay for other users
+            entries.extendleft(reversed(skipped))
+            self.stats["hits" if data is not None else "misses"] += 1
+        self._schedule(key)
+        return data
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _schedule(self, key: tuple):
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries is None or len(entries) >= self.per_key or key in self._refilling:
+                return
+            self._refilling.add(key)
+        self._pool.submit(self._refill, key)
+
+    def _refill(self, key: tuple):
+        bucket_key, mode = key[0], key[1]
+        try:
+            while self.ready():
+                with self._lock:
+                    entries = self._entries.get(key)
+                    settings = self._settings.get(key)
+                    if entries is None or len(entries) >= self.per_key:
+                        return
+                try:
+                    payload = self.generate(bucket_text(bucket_key), mode, settings)
+                except Exception as e:
+                    self._count("failures")
+                    logger.info("warm pool refill for %s failed: %s", key, e)
+                    return
+                with self._lock:
+                    if key in self._entries:
+                        self._entries[key].append((time.time(), payload))
+                        self.stats["generated"] += 1
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {**self.stats, "keys": len(self._entries),
+                    "entries": sum(len(entries) for entries in self._entries.values())}